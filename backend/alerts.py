@@ -1,47 +1,86 @@
 import os
 import datetime
-from . import mailer
+import threading
+from . import outbox
 from . import audit
+from . import dedupe
+from . import fileio
+from . import metrics
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 ALERTS_FILE = os.path.join(DATA_DIR, "alerts.csv")
 
-# Memory cache for deduping (reset on restart is fine for now)
-# Key: type+severity, Value: timestamp
-recent_alerts = {} 
+# Held while appending, so rotation never seals a file mid-write
+# (plus the file's advisory lock, for other workers)
+_file_lock = threading.Lock()
 
-def log_alert(type: str, severity: str, message: str, context: str = ""):
-    """
-    Log alert to CSV and optionally Dispatch email.
-    """
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    # 1. Dedupe (anti-spam)
-    # If same alert type sent in last 60 mins -> skip email (but log event? maybe skip both to reduce noise)
-    # Let's log all to CSV, but only email if not recently sent
-    dedupe_key = f"{type}:{severity}"
-    last_sent = recent_alerts.get(dedupe_key)
-    
-    should_email = True
-    if last_sent:
-        if (now - last_sent).total_seconds() < 3600: # 1 hour
-            should_email = False
-    
-    # 2. Log to CSV
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+def _write_row(now, type, severity, message, context):
     try:
-        with open(ALERTS_FILE, "a") as f:
+        with _file_lock, fileio.locked(ALERTS_FILE), open(ALERTS_FILE, "a") as f:
             # timestamp,type,severity,message
-            f.write(f"{now.isoformat()},{type},{severity},{message} - {context}\n")
+            row = f"{now.isoformat()},{type},{severity},{message} - {context}\n"
+            f.write(row)
+        metrics.io(ALERTS_FILE, written=len(row))
     except:
         pass
-        
-    # 3. Email dispatch (High severity only or Test)
-    if should_email and (severity in ["Warning", "Critical"] or type == "test"):
+
+def rotate(seal):
+    """Run seal() (which moves ALERTS_FILE away) between writes."""
+    with _file_lock, fileio.locked(ALERTS_FILE):
+        return seal()
+
+@metrics.timed("alerts.log_alert")
+def log_alert(type: str, severity: str, message: str, context: str = ""):
+    """
+    Log alert to CSV and optionally queue an email.
+    Delivery happens on the outbox worker, never in the caller.
+    Repeats are deduplicated and rate limited (see dedupe.py).
+    """
+    now = _now()
+
+    # 1. Dedupe / rate limit (anti-spam). Email only High severity or Test.
+    wants_email = severity in ["Warning", "Critical"] or type == "test"
+    write_row, send_email, ended = dedupe.check(type, severity, message, wants_email)
+    _report(ended)
+
+    # 2. Log to CSV
+    if write_row:
+        _write_row(now, type, severity, message, context)
+
+    # 3. Email dispatch
+    if send_email:
         subject = f"[SentinelMesh] {severity.upper()}: {type}"
         body = f"SentinelMesh Alert\n\nSeverity: {severity}\nType: {type}\n\nMessage: {message}\nContext: {context}\n\nTimestamp: {now.isoformat()}"
-        
-        mailer.send_email(subject, body)
-        recent_alerts[dedupe_key] = now
-        
+
+        outbox.enqueue(subject, body, immediate=(type == "test"))
+
         audit.log(f"Alert triggered: {type} ({severity})", "ALERT")
+
+def sweep():
+    """Report alert storms that have gone quiet. Called every analysis tick."""
+    _report(dedupe.sweep())
+
+def _report(ended):
+    """One "N suppressed" row (and email, if emails were held back) per finished storm."""
+    for storm in ended:
+        suppressed = max(storm["suppressed_rows"], storm["suppressed_emails"])
+        if not suppressed:
+            continue
+        message = f"{suppressed} suppressed: {storm['type']} ({storm['severity']})"
+        context = f"{storm['suppressed_rows']} rows / {storm['suppressed_emails']} emails held back from {_iso(storm['start'])} to {_iso(storm['end'])}"
+        _write_row(_now(), "suppressed", storm["severity"], message, context)
+        audit.log(f"Alert storm ended: {message}", "ALERT")
+
+        if storm["suppressed_emails"]:
+            subject = f"[SentinelMesh] {storm['severity'].upper()}: {storm['type']} ({suppressed} suppressed)"
+            body = (f"SentinelMesh Alert Summary\n\n{storm['type']} ({storm['severity']}) repeated while notifications were paused.\n\n"
+                    f"Suppressed rows: {storm['suppressed_rows']}\nSuppressed emails: {storm['suppressed_emails']}\n"
+                    f"From: {_iso(storm['start'])}\nTo: {_iso(storm['end'])}")
+            outbox.enqueue(subject, body)
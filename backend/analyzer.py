@@ -1,45 +1,76 @@
-import os
 import datetime
-import psutil
 from . import audit
 from . import baseline
+from . import config
+from . import connections
 from . import explain
+from . import metrics
+from . import series
 
-# Paths
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-HISTORY_FILE = os.path.join(DATA_DIR, "history.csv")
+# z-score mode ("analyzer_mode": "zscore" in environment.json)
+Z_THRESHOLD = 3.0
+Z_SEVERE = 6.0
 
 def get_metrics():
     """
     Collect active connection metrics from OS.
     Metadata only. No packet capture.
+    Shares one connection walk per tick (see connections.py).
     """
-    counts = {
-        "total": 0,
-        "dns": 0
+    snap = connections.snapshot()
+    return {
+        "total": snap["total"],
+        "dns": snap["dns"]
     }
-    try:
-        # Get connections (metadata only)
-        connections = psutil.net_connections(kind='inet')
-        counts["total"] = len(connections)
-        
-        # Count DNS (port 53)
-        for c in connections:
-            if c.raddr and (c.raddr.port == 53):
-                counts["dns"] += 1
-                
-    except Exception as e:
-        audit.log(f"Metrics collection failed: {str(e)}", "ERROR")
-        
-    return counts
 
+def score_ratio(metrics, learned):
+    """Fixed rules against the learning-window averages (default mode)."""
+    score = 0
+    anomalies = []
+    avg_conns = learned.get("connection_count_avg", 0)
+    
+    if avg_conns > 0:
+        # Anomaly: Total connections > 2x baseline
+        if metrics["total"] > (avg_conns * 2) and metrics["total"] > 10: # Threshold of 10 to ignore noise
+            score += 30
+            anomalies.append(f"Connection spike detected ({metrics['total']} > {int(avg_conns * 2)})")
+            
+        # Anomaly: DNS burst (heuristic: > 20 concurrent DNS connections is suspicious for a home network)
+        if metrics["dns"] > 20: 
+            score += 50
+            anomalies.append(f"High DNS traffic burst ({metrics['dns']} active queries)")
+    return score, anomalies
+
+def score_zscore(metrics, learned):
+    """
+    z-scores against the streaming baseline for this hour of the week.
+    Falls back to the ratio rules while the statistics are still thin.
+    """
+    z = baseline.zscores({"connections": metrics["total"], "dns": metrics["dns"]})
+    z_conn, conn_label = z["connections"]
+    z_dns, dns_label = z["dns"]
+    if z_conn is None or z_dns is None:
+        return score_ratio(metrics, learned)
+
+    score = 0
+    anomalies = []
+    if z_conn >= Z_THRESHOLD and metrics["total"] > 10: # Threshold of 10 to ignore noise
+        score += 50 if z_conn >= Z_SEVERE else 30
+        anomalies.append(f"Connection spike detected ({metrics['total']}, z={z_conn:.1f} vs {conn_label} baseline)")
+
+    if z_dns >= Z_THRESHOLD and metrics["dns"] > 5:
+        score += 50
+        anomalies.append(f"High DNS traffic burst ({metrics['dns']} active queries, z={z_dns:.1f} vs {dns_label} baseline)")
+    return score, anomalies
+
+@metrics.timed("analyzer.analyze")
 def analyze():
     """
     Analyze current metrics against baseline.
     Returns dict with risk score and explanations.
     """
     metrics = get_metrics()
-    base_data = baseline.load_baseline()
+    base_data = baseline.current()
     
     score = 0
     anomalies = []
@@ -47,18 +78,10 @@ def analyze():
     # 1. Baseline Comparison (if active)
     if base_data.get("status") == "active" or (not base_data.get("learning_mode") and base_data.get("created_at")):
         learned = base_data.get("learned_metrics", {})
-        avg_conns = learned.get("connection_count_avg", 0)
-        
-        if avg_conns > 0:
-            # Anomaly: Total connections > 2x baseline
-            if metrics["total"] > (avg_conns * 2) and metrics["total"] > 10: # Threshold of 10 to ignore noise
-                score += 30
-                anomalies.append(f"Connection spike detected ({metrics['total']} > {int(avg_conns * 2)})")
-                
-            # Anomaly: DNS burst (heuristic: > 20 concurrent DNS connections is suspicious for a home network)
-            if metrics["dns"] > 20: 
-                score += 50
-                anomalies.append(f"High DNS traffic burst ({metrics['dns']} active queries)")
+        if config.get("analyzer_mode", "ratio") == "zscore":
+            score, anomalies = score_zscore(metrics, learned)
+        else:
+            score, anomalies = score_ratio(metrics, learned)
     
     # Cap score
     score = min(score, 100)
@@ -87,11 +110,9 @@ def analyze():
     }
 
 def log_history(metrics, score, anomaly_count):
-    """Append to CSV history."""
+    """Append a sample to the binary history store (CSV via /export/history)."""
     try:
-        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        line = f"{now},{metrics['total']},{metrics['dns']},{score},{anomaly_count}\n"
-        with open(HISTORY_FILE, "a") as f:
-            f.write(line)
-    except:
-        pass
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        series.get_store().append(now, metrics["total"], metrics["dns"], score, anomaly_count)
+    except Exception as e:
+        audit.log(f"History write failed: {str(e)}", "ERROR")
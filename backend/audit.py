@@ -1,20 +1,181 @@
 import os
+import time
+import queue
+import atexit
 import datetime
+import threading
+from . import config
+from . import fileio
+from . import metrics
 
 # Define path relative to this file
 LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "audit.log")
 
-def log(event: str, level: str = "INFO"):
+# Group commit thresholds: write out once either is reached
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 0.5 # seconds
+
+# fsync policy ("audit_fsync" in environment.json):
+#   "never"    - leave it to the OS (default)
+#   "interval" - at most once every FSYNC_INTERVAL seconds
+#   "batch"    - after every group write
+FSYNC_INTERVAL = 5.0
+
+# Soft bound so a stuck disk can't eat memory. Callers wait up to
+# ENQUEUE_TIMEOUT for room, then the entry is counted as dropped.
+# Event-loop callers pass wait=False and drop at once instead.
+QUEUE_SIZE = 10000
+ENQUEUE_TIMEOUT = 1.0
+
+_queue = queue.SimpleQueue()
+_STOP = object()
+_thread = None
+_start_lock = threading.Lock()
+_write_lock = threading.Lock()
+_file = None
+_last_fsync = 0.0
+dropped = 0
+
+def log(event: str, level: str = "INFO", wait: bool = True):
     """
     Append-only, crash-safe logging to a local file.
+    Entries are queued and written in batches by a background thread.
+    wait=False never blocks (async handlers): a full queue drops the entry.
     """
+    global dropped
     try:
         timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
         entry = f"[{timestamp}] [{level}] {event}\n"
-        
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(entry)
-            
+
+        if _thread is None:
+            _start()
+        if _queue.qsize() >= QUEUE_SIZE and not (wait and _wait_for_room()):
+            dropped += 1
+            return
+        _queue.put(entry)
+
     except Exception:
         # ABSOLUTE RULE: Never crash the application because logging failed
         pass
+
+def flush(timeout: float = 5.0) -> bool:
+    """Block until everything logged so far is written."""
+    if _thread is None:
+        return True
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+def close(timeout: float = 5.0):
+    """Drain the queue and stop the writer (lifespan shutdown / exit)."""
+    global _thread
+    thread = _thread
+    if thread is None:
+        return
+    _queue.put(_STOP)
+    thread.join(timeout)
+    _thread = None
+
+def reopen():
+    """Close the current handle so the next write opens LOG_FILE afresh (after rotation)."""
+    with _write_lock:
+        _close_file()
+
+def rotate(seal):
+    """
+    Run seal() (which moves LOG_FILE away) with no write in progress, in
+    this process or any other worker (advisory lock). The next batch opens
+    a fresh LOG_FILE.
+    """
+    with _write_lock, fileio.locked(LOG_FILE):
+        _close_file()
+        return seal()
+
+def queue_depth() -> int:
+    return _queue.qsize()
+
+def _wait_for_room() -> bool:
+    deadline = time.monotonic() + ENQUEUE_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.01)
+        if _queue.qsize() < QUEUE_SIZE:
+            return True
+    return False
+
+def _start():
+    global _thread
+    with _start_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_writer, name="sentinelmesh-audit", daemon=True)
+        _thread.start()
+
+def _writer():
+    buf = []
+    size = 0
+    oldest = None
+    while True:
+        timeout = None if oldest is None else max(0.0, oldest + FLUSH_INTERVAL - time.monotonic())
+        try:
+            item = _queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        if isinstance(item, str):
+            buf.append(item)
+            size += len(item)
+            if oldest is None:
+                oldest = time.monotonic()
+            if size < FLUSH_BYTES and time.monotonic() - oldest < FLUSH_INTERVAL:
+                continue # Keep collecting
+
+        # Size/time threshold reached, or a flush/stop request
+        if buf:
+            _write("".join(buf))
+            buf, size, oldest = [], 0, None
+        if isinstance(item, threading.Event):
+            item.set()
+        elif item is _STOP:
+            with _write_lock:
+                _close_file()
+            return
+
+def _write(data: str):
+    global _file, _last_fsync
+    try:
+        with _write_lock, fileio.locked(LOG_FILE):
+            if _file is not None and _rotated():
+                _close_file() # Another worker sealed it: follow the new file
+            if _file is None:
+                _file = open(LOG_FILE, "a", encoding="utf-8")
+            _file.write(data)
+            _file.flush()
+            metrics.io(LOG_FILE, written=len(data))
+
+            policy = config.get("audit_fsync", "never")
+            now = time.monotonic()
+            if policy == "batch" or (policy == "interval" and now - _last_fsync >= FSYNC_INTERVAL):
+                os.fsync(_file.fileno())
+                _last_fsync = now
+    except Exception:
+        # Disk gone or read-only: drop this batch, retry opening next time
+        with _write_lock:
+            _close_file()
+
+def _rotated() -> bool:
+    """LOG_FILE no longer names the file we have open."""
+    try:
+        return os.stat(LOG_FILE).st_ino != os.fstat(_file.fileno()).st_ino
+    except OSError:
+        return True
+
+def _close_file():
+    global _file
+    if _file is not None:
+        try:
+            _file.close()
+        except Exception:
+            pass
+        _file = None
+
+atexit.register(close)
@@ -1,47 +1,224 @@
 import os
+import copy
 import json
+import time
+import atexit
 import datetime
-import subprocess
-import re
+import threading
 from . import audit
+from . import connections
+from . import fileio
+from . import fingerprint
+from . import metrics
+from . import stats
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 BASELINE_FILE = os.path.join(DATA_DIR, "baseline.json")
 
+# Coalesce saves: persist at most once per WRITE_DELAY seconds
+WRITE_DELAY = 2.0
+# Look for outside edits to baseline.json at most this often
+STAT_INTERVAL = 1.0
+# Set by users (possibly through another worker); kept when a write-behind
+# finds the file changed under it
+USER_FIELDS = ("environment_name",)
+
+# Streaming statistics (see stats.py), persisted separately
+STATS_FILE = os.path.join(DATA_DIR, "baseline_stats.json")
+STATS_SAVE_INTERVAL = 60.0
+
 def get_environment_fingerprint():
     """
     Generate a simple fingerprint for the current network environment.
     Uses the default gateway IP (e.g. router IP) as a proxy for 'Location'.
+    Cached; see fingerprint.py.
+    """
+    return fingerprint.get()
+
+class BaselineState:
+    """
+    Parsed baseline.json kept in memory.
+    Reloads only when the file's mtime/size changes (checked at most every
+    STAT_INTERVAL seconds). Saves are coalesced and written behind via
+    temp file + os.replace.
     """
-    try:
-        # Simple extraction of default gateway (Windows)
-        output = subprocess.check_output("ipconfig", shell=True).decode("utf-8", errors="ignore")
-        # Look for Default Gateway . . . . . . . . . : 192.168.1.1
-        match = re.search(r"Default Gateway.*: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})", output)
-        if match:
-            return match.group(1)
-    except:
-        pass
-    return "unknown_env"
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.doc = None
+        self.stamp = None
+        self.checked = 0.0
+        self.dirty = False
+        self.timer = None
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.doc is None or (not self.dirty and now - self.checked >= STAT_INTERVAL):
+                self.checked = now
+                stamp = fileio.file_stamp(self.path)
+                if self.doc is None or stamp != self.stamp:
+                    self.doc = self._read()
+                    self.stamp = stamp
+            return self.doc
+
+    @metrics.timed("baseline.read")
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def set(self, data):
+        with self.lock:
+            self.doc = data
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(WRITE_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            try:
+                with fileio.locked(self.path):
+                    self._keep_outside_edits()
+                    fileio.atomic_write_json(self.path, self.doc)
+                self.stamp = fileio.file_stamp(self.path)
+                self.checked = time.monotonic()
+                self.dirty = False
+            except Exception as e:
+                audit.log(f"Failed to save baseline: {str(e)}", "ERROR")
+
+    def _keep_outside_edits(self):
+        """Another process wrote since we read: carry its user fields over (same environment)."""
+        if fileio.file_stamp(self.path) == self.stamp:
+            return
+        disk = self._read()
+        if disk.get("environment_id") != self.doc.get("environment_id"):
+            return
+        for field in USER_FIELDS:
+            if field in disk:
+                self.doc[field] = disk[field]
+
+    def update(self, change):
+        """Read-modify-write against the file itself, under its lock (user edits)."""
+        with self.lock:
+            self.flush()
+            with fileio.locked(self.path):
+                doc = self._read()
+                if not change(doc):
+                    return False
+                fileio.atomic_write_json(self.path, doc)
+            self.doc = doc
+            self.stamp = fileio.file_stamp(self.path)
+            self.checked = time.monotonic()
+            return True
+
+_state = BaselineState(BASELINE_FILE)
+
+def current():
+    """Read-only view of the baseline. Do not mutate; use load_baseline() to edit."""
+    return _state.get()
 
 def load_baseline():
-    """Load baseline from JSON."""
-    if not os.path.exists(BASELINE_FILE):
-        return {}
-    try:
-        with open(BASELINE_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
+    """Load baseline (a private copy the caller may modify)."""
+    return copy.deepcopy(_state.get())
 
 def save_baseline(data):
-    """Save baseline to JSON."""
-    try:
-        with open(BASELINE_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        audit.log(f"Failed to save baseline: {str(e)}", "ERROR")
+    """Save baseline. Written to disk shortly after (coalesced)."""
+    _state.set(data)
+
+def flush():
+    """Write any pending baseline change now (shutdown)."""
+    _state.flush()
+    _stats.flush()
+
+class StatsState:
+    """The streaming baseline engine for the current environment."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.env_id = None
+        self.engine = None
+        self.saved = 0.0
+        self.dirty = False
+
+    def _load(self, env_id):
+        self.env_id = env_id
+        self.engine = stats.StreamingBaseline()
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("environment_id") == env_id:
+                self.engine = stats.StreamingBaseline.from_dict(data.get("metrics"))
+        except Exception:
+            pass # Missing or unreadable: start fresh
+
+    def engine_for(self, env_id):
+        if self.engine is None or self.env_id != env_id:
+            self._load(env_id)
+        return self.engine
+
+    def reset(self, env_id):
+        with self.lock:
+            self.env_id = env_id
+            self.engine = stats.StreamingBaseline()
+            self.dirty = True
+
+    def observe(self, env_id, values, ts):
+        with self.lock:
+            self.engine_for(env_id).observe(values, ts)
+            self.dirty = True
+            if time.monotonic() - self.saved >= STATS_SAVE_INTERVAL:
+                self._save()
+
+    def zscores(self, env_id, values, ts):
+        with self.lock:
+            engine = self.engine_for(env_id)
+            return {name: engine.zscore(name, x, ts) for name, x in values.items()}
+
+    def summary(self, env_id, ts):
+        with self.lock:
+            return self.engine_for(env_id).summary(ts)
+
+    def _save(self):
+        try:
+            fileio.atomic_write_json(self.path, {"environment_id": self.env_id, "metrics": self.engine.to_dict()}, indent=None)
+            self.dirty = False
+        except Exception as e:
+            audit.log(f"Failed to save baseline stats: {str(e)}", "ERROR")
+        self.saved = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty and self.engine is not None:
+                self._save()
+
+_stats = StatsState(STATS_FILE)
+
+def zscores(values: dict):
+    """
+    z-score of each metric against the matching hour-of-week bucket.
+    {name: (z, bucket label)}; (None, None) while a metric has too little data.
+    """
+    now = time.time()
+    return _stats.zscores(current().get("environment_id"), values, now)
+
+def get_stats_summary():
+    """Streaming statistics for the current hour-of-week, per metric."""
+    return _stats.summary(current().get("environment_id"), time.time())
 
 def reset_baseline(fingerprint, reason):
     """Archive old baseline and start new one."""
@@ -59,12 +236,15 @@ def reset_baseline(fingerprint, reason):
         "samples": []
     }
     save_baseline(new_baseline)
+    _stats.reset(fingerprint)
     return new_baseline
 
+@metrics.timed("baseline.update")
 def update(current_devices):
     """
     Update baseline with current scan results.
     Handles environment changes and learning mode.
+    Streaming statistics keep learning after the learning window.
     """
     fingerprint = get_environment_fingerprint()
     baseline = load_baseline()
@@ -72,9 +252,23 @@ def update(current_devices):
     # 1. Check environment
     if baseline.get("environment_id") != fingerprint:
         baseline = reset_baseline(fingerprint, "Environment changed")
+
+    # We track active device count AND connection counts
+    active_count = len([d for d in current_devices if d.get("status") == "active"])
+    
+    # Current connections (shared snapshot, no extra walk)
+    snap = connections.snapshot()
+    conn_count = snap["total"]
+
+    # Streaming model (every sample, O(1))
+    _stats.observe(fingerprint, {
+        "devices": active_count,
+        "connections": conn_count,
+        "dns": snap["dns"]
+    }, time.time())
         
     if not baseline.get("learning_mode"):
-        return # Already learned, just holding steady
+        return # Learning window done, running averages hold steady
         
     # 2. Check time (10 mins learning)
     created = datetime.datetime.fromisoformat(baseline["created_at"])
@@ -88,16 +282,6 @@ def update(current_devices):
         return
 
     # 3. Learn
-    # We track average active device count AND connection counts
-    active_count = len([d for d in current_devices if d.get("status") == "active"])
-    
-    # Get current connections (lightweight check just for learning)
-    try:
-        import psutil
-        conn_count = len(psutil.net_connections(kind='inet'))
-    except:
-        conn_count = 0
-
     metrics = baseline["learned_metrics"]
     count = metrics["sample_count"]
     
@@ -117,7 +301,7 @@ def update(current_devices):
 
 def get_status():
     """Return status string for health check."""
-    baseline = load_baseline()
+    baseline = current()
     if not baseline:
         return "inactive"
     if baseline.get("learning_mode"):
@@ -126,7 +310,7 @@ def get_status():
 
 def get_environment_info():
     """Get current environment details."""
-    baseline = load_baseline()
+    baseline = current()
     env_id = baseline.get("environment_id", "unknown")
     name = baseline.get("environment_name")
     
@@ -141,13 +325,19 @@ def get_environment_info():
 
 def set_environment_name(name):
     """Set simple label for current environment."""
-    baseline = load_baseline()
-    if not baseline:
-         return False
-         
-    old_name = baseline.get("environment_name")
-    baseline["environment_name"] = name
-    save_baseline(baseline)
-    
-    audit.log(f"Environment named: '{name}' (was: {old_name})", "USER")
+    old = {}
+
+    def rename(baseline):
+        if not baseline:
+            return False
+        old["name"] = baseline.get("environment_name")
+        baseline["environment_name"] = name
+        return True
+
+    if not _state.update(rename):
+        return False
+
+    audit.log(f"Environment named: '{name}' (was: {old['name']})", "USER")
     return True
+
+atexit.register(flush)
@@ -0,0 +1,37 @@
+import os
+import json
+
+# Paths
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+ENV_FILE = os.path.join(DATA_DIR, "environment.json")
+
+# Cached config + the (mtime, size) it was read at
+_cache = {}
+_stamp = None
+
+def load_config():
+    """
+    Load local settings from environment.json.
+    Re-reads only when the file changes on disk.
+    """
+    global _cache, _stamp
+    try:
+        st = os.stat(ENV_FILE)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        _cache, _stamp = {}, None
+        return _cache
+
+    if stamp != _stamp:
+        try:
+            with open(ENV_FILE, "r") as f:
+                _cache = json.load(f)
+        except:
+            _cache = {}
+        _stamp = stamp
+    return _cache
+
+def get(key, default=None):
+    """Return a single setting, falling back to default."""
+    value = load_config().get(key)
+    return default if value is None else value
@@ -0,0 +1,91 @@
+import time
+import socket
+import datetime
+import ipaddress
+import threading
+from collections import Counter
+import psutil
+from . import audit
+from . import config
+from . import metrics
+
+# One psutil.net_connections walk per validity window, shared by
+# analyzer, baseline learning and the /connections endpoint.
+# Override with "connections_ttl" in environment.json.
+DEFAULT_TTL = 5.0
+
+# Keep the per-port / per-prefix breakdowns small
+TOP_N = 20
+
+FAMILIES = {socket.AF_INET: "IPv4", socket.AF_INET6: "IPv6"}
+TYPES = {socket.SOCK_STREAM: "TCP", socket.SOCK_DGRAM: "UDP"}
+
+_lock = threading.Lock()
+_snapshot = None
+_taken = 0.0
+
+def _prefix(ip: str) -> str:
+    """Group remote peers by network: /24 for IPv4, /48 for IPv6."""
+    if ":" in ip:
+        return str(ipaddress.ip_network(f"{ip}/48", strict=False))
+    return ip.rsplit(".", 1)[0] + ".0/24"
+
+def summarize(conns):
+    """Single pass over psutil connection tuples -> aggregate counts."""
+    by_state = Counter()
+    by_port = Counter()
+    by_prefix = Counter()
+    by_kind = Counter()
+    listening = set()
+    dns = 0
+
+    for c in conns:
+        by_state[c.status] += 1
+        by_kind[f"{FAMILIES.get(c.family, str(c.family))}/{TYPES.get(c.type, str(c.type))}"] += 1
+        if c.status == psutil.CONN_LISTEN and c.laddr:
+            listening.add(c.laddr.port)
+        if c.raddr:
+            by_port[c.raddr.port] += 1
+            by_prefix[_prefix(c.raddr.ip)] += 1
+            if c.raddr.port == 53:
+                dns += 1
+
+    return {
+        "total": len(conns),
+        "dns": dns,
+        "by_state": dict(by_state),
+        "by_remote_port": {str(port): n for port, n in by_port.most_common(TOP_N)},
+        "by_remote_prefix": dict(by_prefix.most_common(TOP_N)),
+        "by_family_type": dict(by_kind),
+        "listening": by_state.get(psutil.CONN_LISTEN, 0),
+        "listening_ports": sorted(listening)
+    }
+
+@metrics.timed("connections.collect")
+def collect():
+    """Walk the OS connection table once (metadata only) and summarize it."""
+    try:
+        conns = psutil.net_connections(kind='inet')
+        summary = summarize(conns)
+        summary["ok"] = True
+    except Exception as e:
+        audit.log(f"Metrics collection failed: {str(e)}", "ERROR")
+        summary = summarize([])
+        summary["ok"] = False
+    summary["collected_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return summary
+
+def get_ttl() -> float:
+    try:
+        return float(config.get("connections_ttl", DEFAULT_TTL))
+    except (TypeError, ValueError):
+        return DEFAULT_TTL
+
+def snapshot():
+    """Latest connection summary, re-collected only when older than the TTL."""
+    global _snapshot, _taken
+    with _lock:
+        if _snapshot is None or time.monotonic() - _taken >= get_ttl():
+            _snapshot = collect()
+            _taken = time.monotonic()
+        return _snapshot
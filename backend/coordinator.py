@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import threading
+from . import audit
+from . import devicestore
+from . import fileio
+from . import outbox
+from . import presence
+from . import scheduler
+from . import series
+from . import stream
+
+# Several API workers (uvicorn --workers N) share data/. Exactly one of
+# them, the leader, holds data/.collector.lock and collects: scheduler
+# ticks, outbox delivery, discovery, log maintenance. After every pass it
+# publishes what endpoints need to data/collector.json.
+#
+# The other workers (followers) only serve reads. They poll collector.json,
+# tail the device journal (full reload only after a compaction), reload the
+# presence index when it changed, and feed their own /stream clients. Every ELECTION_INTERVAL they try the
+# lock again, so one of them takes over when the leader exits or dies
+# (the OS drops the lock with the process).
+#
+# With a single worker, that worker is the leader and nothing changes.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+LOCK_FILE = os.path.join(DATA_DIR, ".collector.lock")
+STATE_FILE = os.path.join(DATA_DIR, "collector.json")
+
+POLL_INTERVAL = 1.0 # Followers: check collector.json this often
+ELECTION_INTERVAL = 5.0 # Followers: retry the collector lock this often
+HEARTBEAT = 10.0 # Leader: rewrite collector.json at least this often
+STALE_AFTER = 3 * HEARTBEAT # Followers: leader presumed gone after this
+
+_lock = None # FileLock while we are the leader
+_thread = None
+_stop = threading.Event()
+_read_only = False
+_published = None # (state without heartbeat, time written), leader
+_followed = {} # file -> stamp last seen, follower
+_state = {}
+role = None # "leader" | "follower"
+
+def _try_lead() -> bool:
+    global _lock
+    lock = fileio.FileLock(LOCK_FILE)
+    if not lock.acquire(blocking=False):
+        return False
+    _lock = lock
+    return True
+
+def _lead():
+    global role
+    role = "leader"
+    outbox.start()
+    scheduler.start(read_only=_read_only, on_pass=publish_state)
+    audit.log(f"Collector leader elected (pid {os.getpid()})", "SYSTEM")
+
+def publish_state():
+    """Leader: write collector.json when the state changed (or the heartbeat is due)."""
+    global _published
+    state = scheduler.export_state()
+    now = time.time()
+    if _published and _published[0] == state and now - _published[1] < HEARTBEAT:
+        return
+    try:
+        fileio.atomic_write_json(STATE_FILE, dict(state, pid=os.getpid(), heartbeat=now), indent=None)
+        _published = (state, now)
+    except Exception as e:
+        audit.log(f"Failed to publish collector state: {str(e)}", "ERROR")
+
+def _changed(path) -> bool:
+    stamp = fileio.file_stamp(path)
+    if _followed.get(path, False) == stamp:
+        return False
+    _followed[path] = stamp
+    return True
+
+def sync():
+    """Follower: adopt the leader's latest state and data. Returns True if anything changed."""
+    global _state
+    if not _changed(STATE_FILE):
+        return False
+    try:
+        with open(STATE_FILE, "r") as f:
+            _state = json.load(f)
+    except (OSError, ValueError):
+        return False # Mid-replace or gone: next poll
+
+    store = devicestore.get_store()
+    changes, devices = None, None
+    device_files = (store.snapshot_path, store.journal_path)
+    if any([_changed(p) for p in device_files]):
+        if store.by_ip is None:
+            devices = store.all() # Not loaded yet: read it fresh
+        else:
+            changes = store.catch_up() # Only the journal lines appended since
+            if changes is None:
+                # Compacted: read the new snapshot in full
+                before = {d["ip"]: d for d in store.all()}
+                store = devicestore.reload()
+                changes = [d for d in store.all() if before.get(d["ip"]) != d]
+            devices = store.all()
+    if _changed(presence.get_store().path):
+        presence.reload()
+    series.get_store().invalidate() # New samples may sit in a new segment
+
+    scheduler.follow(_state, devices)
+    stream.publish_tick(scheduler.health_summary(), changes or None, store.count())
+    return True
+
+def _follow():
+    next_election = time.monotonic() + ELECTION_INTERVAL
+    while not _stop.wait(POLL_INTERVAL):
+        try:
+            sync()
+        except Exception as e:
+            audit.log(f"Collector state sync failed: {str(e)}", "ERROR")
+        if time.monotonic() >= next_election:
+            next_election = time.monotonic() + ELECTION_INTERVAL
+            if _try_lead():
+                # Take over from where the previous leader left the files
+                devicestore.reload()
+                presence.reload()
+                series.get_store().invalidate()
+                _lead()
+                return
+
+def start(read_only: bool = False):
+    """Collect if we win the election, otherwise follow the collector (lifespan startup)."""
+    global _thread, _read_only, role
+    _read_only = read_only
+    _stop.clear()
+    if _try_lead():
+        _lead()
+        return
+    role = "follower"
+    audit.log(f"Worker {os.getpid()} following the collector", "SYSTEM")
+    sync()
+    _thread = threading.Thread(target=_follow, name="sentinelmesh-follower", daemon=True)
+    _thread.start()
+
+def stop():
+    """Stop collecting or following; hand the collector lock back (lifespan shutdown)."""
+    global _thread, _lock, role
+    _stop.set()
+    if _thread:
+        _thread.join(POLL_INTERVAL * 2)
+        _thread = None
+    scheduler.stop()
+    outbox.stop()
+    if _lock is not None:
+        _lock.release()
+        _lock = None
+    role = None
+
+def collecting() -> bool:
+    """Is collection running somewhere (here, or a live leader)?"""
+    if role == "leader":
+        return scheduler.is_running()
+    heartbeat = _state.get("heartbeat")
+    return heartbeat is not None and time.time() - heartbeat < STALE_AFTER
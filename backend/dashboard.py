@@ -0,0 +1,69 @@
+import os
+import json
+import threading
+from . import history
+from . import timeline
+from . import baseline
+from . import scheduler
+from . import stream
+
+# One versioned snapshot of everything the dashboard shows.
+# Versions come from the stream's per-section generation counters, so an
+# unchanged dashboard is answered with 304 before anything is built.
+
+SECTIONS = ("health", "devices", "timeline", "history", "environment")
+
+# Distinguishes ETags across restarts (counters start from 0 again)
+BOOT_ID = os.urandom(4).hex()
+
+_cache_lock = threading.Lock()
+_cache = {} # sections tuple -> (etag, body bytes)
+
+def parse_sections(value: str = None):
+    """Comma list -> tuple of known sections (all by default). "versions" = none."""
+    if not value:
+        return SECTIONS
+    wanted = [s.strip() for s in value.split(",")]
+    return tuple(s for s in SECTIONS if s in wanted)
+
+def etag(sections) -> str:
+    """Strong ETag from the generation counters of the requested sections."""
+    versions = stream.versions
+    mask = sum(1 << SECTIONS.index(s) for s in sections)
+    counted = sections or SECTIONS # Versions-only view depends on every counter
+    return f'"{BOOT_ID}.{mask}.{"-".join(str(versions[s]) for s in counted)}"'
+
+def matches(if_none_match: str, tag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or tag in candidates
+
+def build(sections):
+    body = {"versions": dict(stream.versions)}
+    if "health" in sections:
+        body["health"] = scheduler.health_summary()
+    if "devices" in sections:
+        body["devices"] = list(scheduler.latest_devices())
+    if "timeline" in sections:
+        body["timeline"] = timeline.get_events(limit=20)
+    if "history" in sections:
+        body["history"] = history.query(bucket=10, limit=20)
+    if "environment" in sections:
+        body["environment"] = baseline.get_environment_info()
+    return body
+
+def render(sections):
+    """(etag, JSON bytes). Serialized once per version and shared by all clients."""
+    tag = etag(sections)
+    with _cache_lock:
+        cached = _cache.get(sections)
+        if cached and cached[0] == tag:
+            return cached
+    body = build(sections)
+    # Counters may have moved while building; tag with what we read first.
+    # A client holding this tag refetches on the next bump anyway.
+    data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    with _cache_lock:
+        _cache[sections] = (tag, data)
+    return tag, data
@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from . import audit
+from . import config
+from . import fileio
+
+# Alert deduplication and rate limiting, persisted to data/alert_state.json.
+#
+# Each alert is keyed by a content fingerprint (type, severity and the
+# message with numbers masked). Per key:
+#   - a token bucket limits rows written to alerts.csv
+#   - a sliding window limits emails
+# Anything held back is counted; once the key has been quiet for the quiet
+# period, one "N suppressed" summary is emitted.
+#
+# Settings in environment.json:
+#   alert_row_burst      rows allowed back to back (default 3)
+#   alert_row_interval   seconds to earn one more row (default 300)
+#   alert_email_limit    emails per key per window (default 1)
+#   alert_email_window   seconds (default 3600)
+#   alert_quiet_period   seconds without repeats that end a storm (default 600)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+STATE_FILE = os.path.join(DATA_DIR, "alert_state.json")
+
+DEFAULTS = {
+    "alert_row_burst": 3,
+    "alert_row_interval": 300,
+    "alert_email_limit": 1,
+    "alert_email_window": 3600,
+    "alert_quiet_period": 600
+}
+
+# Keys tracked at most (least recently seen are evicted first)
+MAX_KEYS = 1024
+
+# Same write-behind / reload cadence as baseline.json
+WRITE_DELAY = 2.0
+STAT_INTERVAL = 1.0
+
+def setting(name: str) -> float:
+    try:
+        return max(float(config.get(name, DEFAULTS[name])), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULTS[name]
+
+def fingerprint(type: str, severity: str, message: str) -> str:
+    """Stable key for 'the same alert': numbers (scores, counts) don't count."""
+    text = f"{type}\x00{severity}\x00{re.sub(r'[0-9]+', '#', message.strip().lower())}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def new_entry(type, severity, now):
+    return {
+        "type": type,
+        "severity": severity,
+        "tokens": setting("alert_row_burst"),
+        "refilled": now,
+        "sent": [], # Email timestamps inside the window (at most alert_email_limit)
+        "last": now,
+        "suppressed_rows": 0,
+        "suppressed_emails": 0,
+        "storm_start": None
+    }
+
+class AlertLimiter:
+    """
+    Keys live in an OrderedDict in least-recently-seen order, so eviction
+    and storm expiry only ever look at the front: every check is O(1).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.keys = None # fingerprint -> entry
+        self.storms = None # fingerprints with suppressions, same order
+        self.evicted = [] # Summaries of storms whose key was evicted, emitted by the next _expire
+        self.stamp = None
+        self.checked = 0.0
+        self.dirty = False
+        self.timer = None
+
+    def _load(self):
+        """(Re)load persisted state when the file changed (e.g. another worker)."""
+        now = time.monotonic()
+        if self.keys is not None and (self.dirty or now - self.checked < STAT_INTERVAL):
+            return
+        self.checked = now
+        stamp = fileio.file_stamp(self.path)
+        if self.keys is not None and stamp == self.stamp:
+            return
+        self.stamp = stamp
+        keys = {}
+        if stamp is not None:
+            try:
+                with open(self.path, "r") as f:
+                    keys = json.load(f).get("keys", {})
+            except Exception:
+                keys = {}
+        self.keys = OrderedDict(sorted(keys.items(), key=lambda kv: kv[1]["last"]))
+        self.storms = OrderedDict((k, None) for k, e in self.keys.items() if e["storm_start"] is not None)
+
+    def _touch(self):
+        self.dirty = True
+        if self.timer is None:
+            self.timer = threading.Timer(WRITE_DELAY, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            try:
+                with fileio.locked(self.path):
+                    self._merge_outside()
+                    fileio.atomic_write_json(self.path, {"keys": self.keys}, indent=None)
+                self.stamp = fileio.file_stamp(self.path)
+                self.checked = time.monotonic()
+                self.dirty = False
+            except Exception as e:
+                audit.log(f"Failed to save alert state: {str(e)}", "ERROR")
+
+    def _merge_outside(self):
+        """Another worker saved since we loaded: keep whichever side saw each key last."""
+        if fileio.file_stamp(self.path) == self.stamp:
+            return
+        try:
+            with open(self.path, "r") as f:
+                theirs = json.load(f).get("keys", {})
+        except Exception:
+            return
+        merged = dict(self.keys)
+        for key, entry in theirs.items():
+            if key not in merged or entry["last"] > merged[key]["last"]:
+                merged[key] = entry
+        self.keys = OrderedDict(sorted(merged.items(), key=lambda kv: kv[1]["last"]))
+        while len(self.keys) > MAX_KEYS:
+            self.keys.popitem(last=False)
+        self.storms = OrderedDict((k, None) for k, e in self.keys.items() if e["storm_start"] is not None)
+
+    def check(self, type: str, severity: str, message: str, wants_email: bool, now: float = None):
+        """
+        Decide one alert. Returns (write_row, send_email, summaries), where
+        summaries are storms (of any key) that have just ended.
+        """
+        now = time.time() if now is None else now
+        key = fingerprint(type, severity, message)
+        with self.lock:
+            self._load()
+            summaries = self._expire(now)
+
+            entry = self.keys.get(key)
+            if entry is None:
+                entry = self.keys[key] = new_entry(type, severity, now)
+                if len(self.keys) > MAX_KEYS:
+                    self._evict()
+            else:
+                self.keys.move_to_end(key)
+            entry["last"] = now
+
+            # Token bucket: CSV rows
+            burst = setting("alert_row_burst")
+            interval = setting("alert_row_interval")
+            if interval > 0:
+                entry["tokens"] = min(burst, entry["tokens"] + (now - entry["refilled"]) / interval)
+            else:
+                entry["tokens"] = burst
+            entry["refilled"] = now
+            write_row = entry["tokens"] >= 1
+            if write_row:
+                entry["tokens"] -= 1
+
+            # Sliding window: emails (only for alerts that get recorded)
+            send_email = False
+            if wants_email and write_row:
+                window = setting("alert_email_window")
+                limit = int(setting("alert_email_limit"))
+                sent = [t for t in entry["sent"] if now - t < window]
+                if len(sent) < limit:
+                    sent.append(now)
+                    send_email = True
+                entry["sent"] = sent
+
+            held_email = wants_email and not send_email
+            if not write_row:
+                entry["suppressed_rows"] += 1
+            if held_email:
+                entry["suppressed_emails"] += 1
+            if (held_email or not write_row) and entry["storm_start"] is None:
+                entry["storm_start"] = now
+            if entry["storm_start"] is not None:
+                self.storms[key] = None
+                self.storms.move_to_end(key)
+
+            self._touch()
+            return write_row, send_email, summaries
+
+    def sweep(self, now: float = None):
+        """Storms that ended since the last call (call periodically)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._load()
+            summaries = self._expire(now)
+            if summaries:
+                self._touch()
+            return summaries
+
+    def _expire(self, now):
+        quiet = setting("alert_quiet_period")
+        ended, self.evicted = self.evicted, []
+        while self.storms:
+            key = next(iter(self.storms))
+            entry = self.keys.get(key)
+            if entry is not None and now - entry["last"] < quiet:
+                break # Everything behind it was seen more recently
+            del self.storms[key]
+            if entry is None:
+                continue
+            ended.append(self._summary(entry))
+        return ended
+
+    def _summary(self, entry):
+        summary = {
+            "type": entry["type"],
+            "severity": entry["severity"],
+            "suppressed_rows": entry["suppressed_rows"],
+            "suppressed_emails": entry["suppressed_emails"],
+            "start": entry["storm_start"],
+            "end": entry["last"]
+        }
+        entry["suppressed_rows"] = entry["suppressed_emails"] = 0
+        entry["storm_start"] = None
+        return summary
+
+    def _evict(self):
+        # Least recently seen key; a storm in progress ends here and its
+        # summary goes out with the next batch of expired storms
+        key, entry = self.keys.popitem(last=False)
+        if key in self.storms:
+            del self.storms[key]
+            self.evicted.append(self._summary(entry))
+
+_limiter = AlertLimiter(STATE_FILE)
+
+def check(type: str, severity: str, message: str, wants_email: bool):
+    return _limiter.check(type, severity, message, wants_email)
+
+def sweep():
+    return _limiter.sweep()
+
+def flush():
+    _limiter.flush()
+
+atexit.register(flush)
@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import heapq
+import datetime
+import threading
+from . import audit
+from . import fileio
+from . import metrics
+
+# Device store: devices.json (compacted snapshot, still a plain JSON list)
+# plus devices.journal, an append-only JSON-lines log of changes since.
+# Scans append only what changed; the journal is folded back into
+# devices.json once it outgrows the snapshot (in bytes: one "seen" line can
+# list every present device). Indexed in memory by IP and MAC.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEVICES_FILE = os.path.join(DATA_DIR, "devices.json")
+JOURNAL_FILE = os.path.join(DATA_DIR, "devices.journal")
+
+# Compact once the journal is at least this big and bigger than the snapshot
+COMPACT_MIN_BYTES = 256 * 1024
+
+# last_seen of unchanged devices is persisted at most this often (seconds).
+# In memory it is always current; after a crash it may lag by this much.
+SEEN_PERSIST_INTERVAL = 60.0
+
+MAX_PAGE = 1000
+
+# Status aging: active until ACTIVE_FOR seconds after last_seen, then idle,
+# archived after ARCHIVE_AFTER. Each device has one pending transition in a
+# min-heap keyed by its due time, so only devices that are due get touched.
+ACTIVE_FOR = 300
+ARCHIVE_AFTER = 7 * 86400
+
+def status_at(last_seen_ts: float, now: float) -> str:
+    # >= so a device is never still active at its own due time
+    age = now - last_seen_ts
+    if age >= ARCHIVE_AFTER:
+        return "archived"
+    if age >= ACTIVE_FOR:
+        return "idle"
+    return "active"
+
+def next_transition(status: str, last_seen_ts: float):
+    """When the given status runs out, or None (archived is final)."""
+    if status == "active":
+        return last_seen_ts + ACTIVE_FOR
+    if status == "idle":
+        return last_seen_ts + ARCHIVE_AFTER
+    return None
+
+def seen_ts(device) -> float:
+    """Numeric last_seen (stored as last_seen_ts; parsed once for older records)."""
+    ts = device.get("last_seen_ts")
+    if ts is None:
+        try:
+            ts = datetime.datetime.fromisoformat(device["last_seen"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            ts = 0.0
+        device["last_seen_ts"] = ts
+    return ts
+
+class DeviceStore:
+    """
+    Device dicts are never changed once stored, only replaced, so lists
+    handed out by all() / query() can be serialized on other threads while
+    a scan applies its changes.
+    """
+
+    def __init__(self, snapshot_path=DEVICES_FILE, journal_path=JOURNAL_FILE):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.lock = threading.RLock()
+        self.by_ip = None # ip -> device (insertion order = discovery order)
+        self.by_mac = {} # mac -> set of ips
+        self.journal = None
+        self.journal_bytes = 0 # Journal size as of our last write or read
+        self.snapshot_bytes = 0
+        self.snapshot_stamp = None # Of the snapshot we loaded or wrote (catch_up)
+        self.pending_seen = {} # ip -> (last_seen, last_seen_ts) not yet journaled
+        self.seen_flushed = 0.0
+        self.heap = [] # (due, ip)
+        self.due = {} # ip -> due time of its live heap entry
+
+    # --- Loading ---
+
+    def _load(self):
+        if self.by_ip is not None:
+            return
+        self.by_ip = {}
+        self.by_mac = {}
+        self.snapshot_bytes = 0
+        self.snapshot_stamp = fileio.file_stamp(self.snapshot_path)
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+            self.snapshot_bytes = len(data)
+            for device in json.loads(data):
+                self._index(device)
+        except Exception:
+            pass # Missing or unreadable: start empty
+
+        self.journal_bytes = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break # Torn last line from a crash
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self._apply(entry)
+                    self.journal_bytes += len(line)
+        except OSError:
+            pass
+
+        self.heap, self.due = [], {}
+        for ip, device in self.by_ip.items():
+            due = next_transition(device.get("status"), seen_ts(device))
+            if due is not None:
+                self.heap.append((due, ip))
+                self.due[ip] = due
+        heapq.heapify(self.heap)
+
+    def _apply(self, entry):
+        if entry.get("op") == "upsert":
+            self._index(entry["device"])
+        elif entry.get("op") == "seen":
+            for ip in entry["ips"]:
+                device = self.by_ip.get(ip)
+                if device is not None:
+                    self.by_ip[ip] = dict(device, last_seen=entry["time"], last_seen_ts=entry.get("ts"))
+
+    def catch_up(self):
+        """
+        Apply the journal lines another process appended since we last read
+        it (a worker that does not collect). Returns the devices that changed,
+        or None when the snapshot was rewritten (compaction): reload() then.
+        """
+        with self.lock:
+            self._load()
+            if fileio.file_stamp(self.snapshot_path) != self.snapshot_stamp:
+                return None
+            changed = {}
+            try:
+                with open(self.journal_path, "rb") as f:
+                    if f.seek(0, os.SEEK_END) < self.journal_bytes:
+                        return None # Truncated by a compaction
+                    f.seek(self.journal_bytes)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break # Still being written: next time
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break
+                        self._apply(entry)
+                        self.journal_bytes += len(line)
+                        for ip in entry["ips"] if entry.get("op") == "seen" else (entry["device"]["ip"],):
+                            changed[ip] = None
+            except OSError:
+                return None if self.journal_bytes else []
+            except (KeyError, TypeError):
+                return None # Not a line boundary after all
+            # Compacted while we read: the lines may be from the new journal
+            if fileio.file_stamp(self.snapshot_path) != self.snapshot_stamp:
+                return None
+            devices = [self.by_ip[ip] for ip in changed if ip in self.by_ip]
+            for device in devices:
+                self._schedule(device)
+            return devices
+
+    def _index(self, device):
+        ip = device["ip"]
+        old = self.by_ip.get(ip)
+        if old is not None and old.get("mac") != device.get("mac"):
+            self._unindex_mac(old.get("mac"), ip)
+        self.by_ip[ip] = device
+        if device.get("mac"):
+            self.by_mac.setdefault(device["mac"].lower(), set()).add(ip)
+
+    def _unindex_mac(self, mac, ip):
+        if not mac:
+            return
+        ips = self.by_mac.get(mac.lower())
+        if ips:
+            ips.discard(ip)
+            if not ips:
+                del self.by_mac[mac.lower()]
+
+    # --- Journal ---
+
+    def _write(self, entries):
+        if not entries:
+            return
+        try:
+            if self.journal is None:
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+                self.journal = open(self.journal_path, "a", encoding="utf-8")
+            data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+            self.journal.write(data)
+            self.journal.flush()
+            size = len(data.encode("utf-8"))
+            metrics.io(self.journal_path, written=size)
+            self.journal_bytes += size
+        except Exception as e:
+            audit.log(f"Failed to save devices: {str(e)}", "ERROR")
+            self._close_journal()
+            return
+        if self.journal_bytes >= max(COMPACT_MIN_BYTES, self.snapshot_bytes):
+            self.compact()
+
+    def _close_journal(self):
+        if self.journal is not None:
+            try:
+                self.journal.close()
+            except Exception:
+                pass
+            self.journal = None
+
+    def compact(self):
+        """Fold the journal into devices.json (atomic) and start a new journal."""
+        with self.lock:
+            self._load()
+            self._flush_seen(force=True, write=False)
+            try:
+                fileio.atomic_write_json(self.snapshot_path, list(self.by_ip.values()))
+                self.snapshot_bytes = os.path.getsize(self.snapshot_path)
+                self.snapshot_stamp = fileio.file_stamp(self.snapshot_path)
+                self._close_journal()
+                with open(self.journal_path, "w"):
+                    pass
+                self.journal_bytes = 0
+            except Exception as e:
+                audit.log(f"Failed to save devices: {str(e)}", "ERROR")
+
+    def _flush_seen(self, now_mono=None, force=False, write=True):
+        """Journal buffered last_seen updates (grouped by timestamp)."""
+        if not self.pending_seen:
+            return
+        now_mono = time.monotonic() if now_mono is None else now_mono
+        if not force and now_mono - self.seen_flushed < SEEN_PERSIST_INTERVAL:
+            return
+        by_time = {}
+        for ip, seen in self.pending_seen.items():
+            by_time.setdefault(seen, []).append(ip)
+        self.pending_seen = {}
+        self.seen_flushed = now_mono
+        if write:
+            self._write([{"op": "seen", "time": iso, "ts": ts, "ips": ips} for (iso, ts), ips in by_time.items()])
+
+    # --- Public API ---
+
+    def get(self, ip):
+        with self.lock:
+            self._load()
+            return self.by_ip.get(ip)
+
+    def by_mac_address(self, mac):
+        with self.lock:
+            self._load()
+            return [self.by_ip[ip] for ip in sorted(self.by_mac.get(mac.lower(), ()))]
+
+    def all(self):
+        with self.lock:
+            self._load()
+            return list(self.by_ip.values())
+
+    def count(self) -> int:
+        with self.lock:
+            self._load()
+            return len(self.by_ip)
+
+    def loaded_count(self):
+        """Devices in memory, or None if not loaded yet. Never loads or locks (/metrics)."""
+        by_ip = self.by_ip
+        return None if by_ip is None else len(by_ip)
+
+    def _schedule(self, device):
+        """Make sure the device's next transition is in the heap."""
+        ip = device["ip"]
+        due = next_transition(device.get("status"), seen_ts(device))
+        if due is None:
+            self.due.pop(ip, None)
+            return
+        current = self.due.get(ip)
+        if current is not None and current <= due:
+            return # Fires earlier and re-arms itself then
+        heapq.heappush(self.heap, (due, ip))
+        self.due[ip] = due
+
+    def apply_changes(self, upserts, seen=(), seen_at=None):
+        """
+        Persist one scan's change set.
+        upserts: new or changed device dicts (journaled right away).
+        seen: ips where only last_seen moved, to seen_at = (iso, epoch) (buffered).
+        """
+        with self.lock:
+            self._load()
+            for device in upserts:
+                device = dict(device)
+                seen_ts(device)
+                self._index(device)
+                self._schedule(device)
+                self.pending_seen.pop(device["ip"], None)
+            for ip in seen:
+                device = self.by_ip.get(ip)
+                if device is not None:
+                    self.by_ip[ip] = dict(device, last_seen=seen_at[0], last_seen_ts=seen_at[1])
+                    self.pending_seen[ip] = seen_at
+            self._write([{"op": "upsert", "device": d} for d in upserts])
+            self._flush_seen()
+
+    def expire(self, now: float = None):
+        """
+        Apply the status transitions that are due. O(due * log n).
+        Returns [(old_status, device)] for every device that changed.
+        """
+        now = time.time() if now is None else now
+        transitions = []
+        with self.lock:
+            self._load()
+            heap = self.heap
+            while heap and heap[0][0] <= now:
+                due, ip = heapq.heappop(heap)
+                if self.due.get(ip) != due:
+                    continue # Superseded by an earlier entry
+                del self.due[ip]
+                device = self.by_ip.get(ip)
+                if device is None:
+                    continue
+                status = status_at(seen_ts(device), now)
+                if status != device["status"]:
+                    old = device["status"]
+                    device = dict(device, status=status)
+                    self._index(device)
+                    transitions.append((old, device))
+                self._schedule(device) # Re-arm (seen again meanwhile, or next stage)
+            self._write([{"op": "upsert", "device": d} for _, d in transitions])
+        return transitions
+
+    def next_due(self):
+        """Time of the earliest pending transition, or None."""
+        with self.lock:
+            self._load()
+            return self.heap[0][0] if self.heap else None
+
+    def replace_all(self, devices):
+        """Replace the whole store (legacy save_devices) and compact."""
+        with self.lock:
+            self.by_ip, self.by_mac = {}, {}
+            self.pending_seen = {}
+            self.heap, self.due = [], {}
+            for device in devices:
+                self._index(device)
+                self._schedule(device)
+            self.compact()
+
+    def flush(self):
+        """Persist buffered last_seen updates (shutdown)."""
+        with self.lock:
+            if self.by_ip is not None:
+                self._flush_seen(force=True)
+
+    def query(self, status=None, mac=None, ip=None, q=None, offset=0, limit=None):
+        """
+        Filtered page of devices (discovery order) and the total match count.
+        mac: exact match (index), ip: exact or prefix ("10.0.3."), q: substring of ip/mac/vendor.
+        """
+        with self.lock:
+            self._load()
+            if mac:
+                candidates = self.by_mac_address(mac)
+            elif ip and ip in self.by_ip:
+                candidates = [self.by_ip[ip]]
+            else:
+                candidates = self.by_ip.values()
+
+            needle = q.lower() if q else None
+            statuses = set(status.split(",")) if status else None
+            matches = []
+            for d in candidates:
+                if statuses and d.get("status") not in statuses:
+                    continue
+                if ip and not d["ip"].startswith(ip):
+                    continue
+                if needle and not any(needle in str(d.get(k) or "").lower() for k in ("ip", "mac", "mac_vendor", "vendor")):
+                    continue
+                matches.append(d)
+
+        offset = max(0, offset)
+        end = None if limit is None else offset + min(max(limit, 0), MAX_PAGE)
+        return matches[offset:end], len(matches)
+
+    def modified(self):
+        """Newest mtime (epoch) of the snapshot or journal, or None."""
+        stamps = [fileio.file_stamp(p) for p in (self.snapshot_path, self.journal_path)]
+        stamps = [s[0] for s in stamps if s and s[1]]
+        return max(stamps) / 1e9 if stamps else None
+
+_store = DeviceStore()
+
+def get_store() -> DeviceStore:
+    return _store
+
+def reload() -> DeviceStore:
+    """Forget the in-memory store; the next use reads it back from disk (written by another worker)."""
+    global _store
+    old = _store
+    with old.lock:
+        old._close_journal()
+    _store = DeviceStore(old.snapshot_path, old.journal_path)
+    return _store
@@ -0,0 +1,272 @@
+import time
+import socket
+import asyncio
+import ipaddress
+import threading
+import psutil
+from . import audit
+from . import config
+from . import neighbors
+
+# Active discovery (opt-in, "active_discovery": true in environment.json).
+#
+# Passive scans only see hosts already in the OS neighbor table. A sweep
+# nudges every address of the local subnets so the kernel resolves them:
+# an empty UDP datagram per address (the kernel sends the ARP request),
+# plus optional TCP connects. While it runs, the neighbor table is
+# harvested every HARVEST_INTERVAL and new entries are handed to the
+# caller's merge as they appear.
+#
+# Settings in environment.json:
+#   discovery_subnets      CIDRs to sweep (default: IPv4 subnets of the local interfaces)
+#   discovery_rate         nudges per second, per subnet (default 10000)
+#   discovery_concurrency  probes in flight (default 256)
+#   discovery_tcp_ports    also TCP-connect these ports on each address (default none)
+#   discovery_interval     seconds between sweeps (scheduler, default 300)
+DEFAULTS = {
+    "discovery_rate": 10000,
+    "discovery_concurrency": 256
+}
+
+# Never sweep more than a /16 per subnet
+MIN_PREFIX = 16
+
+# UDP discard port: nobody listens, the datagram only has to leave
+NUDGE_PORT = 9
+
+HARVEST_INTERVAL = 0.5
+SETTLE_DELAY = 1.0 # Last ARP replies after the final nudge
+
+# TCP connect timeout bounds (adapted from observed connect times)
+TIMEOUT_MIN = 0.05
+TIMEOUT_MAX = 1.0
+
+def setting(name: str) -> float:
+    try:
+        return max(float(config.get(name, DEFAULTS[name])), 1.0)
+    except (TypeError, ValueError):
+        return DEFAULTS[name]
+
+def local_subnets():
+    """IPv4 networks of the local (non-loopback) interfaces."""
+    found = []
+    for addrs in psutil.net_if_addrs().values():
+        for addr in addrs:
+            if addr.family != socket.AF_INET or not addr.netmask:
+                continue
+            try:
+                net = ipaddress.ip_network(f"{addr.address}/{addr.netmask}", strict=False)
+            except ValueError:
+                continue
+            if not net.is_loopback and net.prefixlen < 32 and net not in found:
+                found.append(net)
+    return found
+
+def sweep_subnets():
+    """Configured or local subnets, narrowed to at most a /16 each."""
+    configured = config.get("discovery_subnets")
+    nets = []
+    for cidr in configured if configured else local_subnets():
+        try:
+            net = ipaddress.ip_network(str(cidr), strict=False)
+        except ValueError:
+            audit.log(f"Discovery: ignoring invalid subnet {cidr}", "ERROR")
+            continue
+        if net.version != 4:
+            continue
+        if net.prefixlen < MIN_PREFIX:
+            audit.log(f"Discovery: {net} is larger than /{MIN_PREFIX}, sweeping its first /{MIN_PREFIX}", "SYSTEM")
+            net = next(net.subnets(new_prefix=MIN_PREFIX))
+        nets.append(net)
+    return nets
+
+class RateLimiter:
+    """Token bucket for one subnet (async)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = min(rate, 64.0)
+        self.burst = self.tokens
+        self.stamp = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AdaptiveTimeout:
+    """Connect timeout from smoothed connect times (like TCP's RTO: srtt + 4 * rttvar)."""
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def observe(self, rtt: float):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    @property
+    def value(self) -> float:
+        if self.srtt is None:
+            return TIMEOUT_MAX / 2
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, self.srtt + 4 * self.rttvar))
+
+def _targets(nets):
+    """(subnet index, address) round-robin across subnets, generated lazily."""
+    iters = [(i, net.hosts()) for i, net in enumerate(nets)]
+    while iters:
+        alive = []
+        for i, hosts in iters:
+            host = next(hosts, None)
+            if host is not None:
+                alive.append((i, hosts))
+                yield i, str(host)
+        iters = alive
+
+class Sweep:
+    """
+    One sweep over some subnets.
+    on_found(batch) receives new {'ip', 'mac'} neighbor entries as they are
+    harvested (called from a worker thread). harvest() reads the neighbor
+    table; both are injectable for stand-ins.
+    """
+
+    def __init__(self, nets, on_found, harvest=None, rate=None, concurrency=None,
+                 tcp_ports=(), stop=None):
+        self.nets = nets
+        self.on_found = on_found
+        self.harvest = harvest or neighbors.get_neighbors
+        self.rate = rate or setting("discovery_rate")
+        self.concurrency = int(concurrency or setting("discovery_concurrency"))
+        self.tcp_ports = list(tcp_ports)
+        self.stop = stop or threading.Event()
+        self.timeout = AdaptiveTimeout()
+        self.known = set() # (ip, mac) already reported by this sweep
+        self.stats = {"subnets": [str(n) for n in nets], "probed": 0, "responded": 0, "found": 0}
+
+    def _nudge(self, sock, ip):
+        try:
+            sock.sendto(b"", (ip, NUDGE_PORT))
+        except (BlockingIOError, InterruptedError):
+            return False # Send buffer full: caller backs off
+        except OSError:
+            pass # Unreachable / refused from an earlier ICMP: still nudged
+        return True
+
+    async def _connect(self, ip, port):
+        start = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout.value)
+            writer.close()
+        except ConnectionRefusedError:
+            pass # RST: the host is there
+        except (asyncio.TimeoutError, OSError):
+            return False
+        self.timeout.observe(time.monotonic() - start)
+        return True
+
+    async def _worker(self, targets, limiters, sock):
+        for i, ip in targets:
+            if self.stop.is_set():
+                return
+            await limiters[i].take()
+            while not self._nudge(sock, ip):
+                await asyncio.sleep(0.01)
+            self.stats["probed"] += 1
+            for port in self.tcp_ports:
+                if await self._connect(ip, port):
+                    self.stats["responded"] += 1
+                    break
+
+    async def _harvest_once(self):
+        loop = asyncio.get_running_loop()
+        try:
+            entries = await loop.run_in_executor(None, self.harvest)
+        except Exception as e:
+            audit.log(f"Discovery harvest failed: {str(e)}", "ERROR")
+            return
+        batch = []
+        for entry in entries:
+            key = (entry["ip"], entry["mac"])
+            if key not in self.known:
+                self.known.add(key)
+                batch.append(entry)
+        if batch:
+            self.stats["found"] += len(batch)
+            await loop.run_in_executor(None, self.on_found, batch)
+
+    async def _harvester(self, done):
+        while not done.is_set():
+            await self._harvest_once()
+            try:
+                await asyncio.wait_for(done.wait(), HARVEST_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        start = time.monotonic()
+        targets = _targets(self.nets) # Shared generator: memory stays flat
+        limiters = [RateLimiter(self.rate) for _ in self.nets]
+        done = asyncio.Event()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            harvester = asyncio.ensure_future(self._harvester(done))
+            workers = [self._worker(targets, limiters, sock) for _ in range(self.concurrency)]
+            await asyncio.gather(*workers)
+            if not self.stop.is_set():
+                await asyncio.sleep(SETTLE_DELAY)
+            done.set()
+            await harvester
+            await self._harvest_once()
+        finally:
+            sock.close()
+        self.stats["seconds"] = round(time.monotonic() - start, 2)
+        return self.stats
+
+_thread = None
+_stop = threading.Event()
+_lock = threading.Lock()
+last_stats = None
+
+def _run(on_found):
+    global last_stats
+    try:
+        nets = sweep_subnets()
+        if not nets:
+            return
+        audit.log(f"Active discovery started: {', '.join(str(n) for n in nets)}", "SCANNER")
+        sweep = Sweep(nets, on_found, tcp_ports=config.get("discovery_tcp_ports", []), stop=_stop)
+        last_stats = asyncio.run(sweep.run())
+        audit.log(f"Active discovery complete: {last_stats['probed']} addresses in {last_stats['seconds']}s, "
+                  f"{last_stats['found']} neighbors", "SCANNER")
+    except Exception as e:
+        audit.log(f"Active discovery failed: {str(e)}", "ERROR")
+
+def start(on_found) -> bool:
+    """Start a background sweep unless one is running. Returns True if started."""
+    global _thread
+    with _lock:
+        if _thread and _thread.is_alive():
+            return False
+        _stop.clear()
+        _thread = threading.Thread(target=_run, args=(on_found,), name="sentinelmesh-discovery", daemon=True)
+        _thread.start()
+        return True
+
+def stop(timeout: float = 5.0):
+    """Cancel a running sweep."""
+    _stop.set()
+    if _thread:
+        _thread.join(timeout)
+
+def enabled() -> bool:
+    return bool(config.get("active_discovery", False))
@@ -1,31 +1,341 @@
 import os
-from fastapi.responses import FileResponse
+import io
+import csv
+import gzip
+import json
+import zlib
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from fastapi import HTTPException
 from . import audit
+from . import coordinator
+from . import series
+from . import segments
+from . import timeline
+from . import devicestore
+from . import offload
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 
-def get_file(resource: str):
+VALID_FILES = {
+    "devices": "devices.json",
+    "history": "history.csv",
+    "alerts": "alerts.csv",
+    "baseline": "baseline.json",
+    "audit": "audit.log"
+}
+
+# Line logs (segmented, see segments.py) support filters and formats
+LINE_LOGS = ("audit", "alerts")
+FORMATS = ("raw", "csv", "ndjson")
+
+# Output is produced in chunks of about this size (also the gzip flush unit)
+CHUNK_BYTES = 64 * 1024
+
+# Lines are time ordered; binary search stops narrowing below this many bytes
+SEEK_GRANULARITY = 4096
+
+class ExportOptions:
+    def __init__(self, since=None, until=None, source=None, format="raw", compress=None):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}'. Use one of: {', '.join(FORMATS)}")
+        if compress not in (None, "", "gzip"):
+            raise ValueError("Only gzip compression is supported")
+        self.since = since
+        self.until = until
+        self.sources = {s.strip().lower() for s in source.split(",")} if source else None
+        self.format = format
+        self.gzip = compress == "gzip"
+
+    @property
+    def filtered(self) -> bool:
+        return self.since is not None or self.until is not None or self.sources is not None
+
+# --- Record parsing / rendering ---
+
+def audit_record(line: str):
+    event = timeline.parse_audit_line(line)
+    if not event:
+        return None
+    return {"timestamp": event["timestamp"], "level": event["level"], "message": event["message"]}
+
+def alert_record(line: str):
+    row = next(csv.reader([line]), [])
+    if len(row) < 4 or row[0] == "timestamp":
+        return None
+    return {"timestamp": row[0], "type": row[1], "severity": row[2], "message": ",".join(row[3:])}
+
+# (parser, CSV columns, field matched by ?source=)
+RECORDS = {
+    "audit": (audit_record, ("timestamp", "level", "message"), "level"),
+    "alerts": (alert_record, ("timestamp", "type", "severity", "message"), "type")
+}
+
+def _csv_row(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(values)
+    return buf.getvalue()
+
+# --- Index-driven line reading ---
+
+def _line_start(f, pos):
+    """Offset of the first full line at or after pos."""
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+def seek_time(f, size, since, line_time) -> int:
+    """
+    Byte offset of the first line with time >= since in a time-ordered
+    plain file, by binary search over line starts (O(log n) reads).
+    """
+    lo, hi = 0, size
+    while hi - lo > SEEK_GRANULARITY:
+        mid = _line_start(f, (lo + hi) // 2)
+        if mid >= hi:
+            break
+        ts = None
+        while ts is None:
+            line = f.readline()
+            if not line:
+                break
+            ts = line_time(line.decode("utf-8", errors="replace"))
+        if ts is None or ts >= since:
+            hi = mid
+        else:
+            lo = mid
+    return _line_start(f, lo)
+
+def _lines_in_range(name, since, until):
+    """Raw lines of a log within [since, until), skipping segments by the manifest."""
+    log = segments.LOGS[name]
+    sources = [("segment", s) for s in segments.segments(name, since, until)]
+    sources.append(("active", log.path))
+    for kind, ref in sources:
+        try:
+            if kind == "segment":
+                f = segments.open_segment(ref)
+            else:
+                f = open(ref, "rb")
+        except OSError:
+            continue # Rotated or expired while exporting
+        with f:
+            if since is not None and not isinstance(f, gzip.GzipFile):
+                size = f.seek(0, os.SEEK_END)
+                f.seek(seek_time(f, size, since, log.line_time))
+            for line in f:
+                ts = log.line_time(line.decode("utf-8", errors="replace"))
+                if ts is not None:
+                    if since is not None and ts < since:
+                        continue
+                    if until is not None and ts >= until:
+                        return # Time ordered: nothing later matches
+                yield line
+
+def log_chunks(name, options: ExportOptions):
+    """Encoded output chunks for one line log."""
+    parse, columns, source_field = RECORDS[name]
+    if options.format == "csv":
+        yield _csv_row(columns).encode("utf-8")
+
+    buf, size = [], 0
+    for raw in _lines_in_range(name, options.since, options.until):
+        if options.format == "raw" and options.sources is None:
+            out = raw
+        else:
+            record = parse(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+            if record is None:
+                continue
+            if options.sources is not None and record[source_field].lower() not in options.sources:
+                continue
+            if options.format == "raw":
+                out = raw
+            elif options.format == "csv":
+                out = _csv_row([record[c] for c in columns]).encode("utf-8")
+            else:
+                out = (json.dumps(record) + "\n").encode("utf-8")
+        buf.append(out)
+        size += len(out)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+def history_chunks(options: ExportOptions):
+    store = series.get_store()
+    if options.format == "ndjson":
+        lines = (
+            json.dumps({"timestamp": series.to_iso(ts), "total": total, "dns": dns, "risk": score, "anomalies": anomalies}) + "\n"
+            for ts, total, dns, score, anomalies in store.iter_range(options.since, options.until)
+        )
+    else:
+        lines = store.iter_csv(options.since, options.until) # raw == csv
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+def gzip_stream(chunks):
+    """On-the-fly gzip (one compressor, chunk-sized output)."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+# --- Byte ranges over the raw log (sealed segments + active file) ---
+
+def raw_parts(name):
+    """[(segment or path, length)] making up the raw log, and an ETag for it."""
+    log = segments.LOGS[name]
+    parts = [(s, s["bytes"]) for s in segments.segments(name)]
+    try:
+        st = os.stat(log.path)
+        parts.append((log.path, st.st_size))
+        active = f"{st.st_ino}"
+    except OSError:
+        active = "0"
+    total = sum(length for _, length in parts)
+    first = os.path.basename(parts[0][0]["file"]).split(".")[0] if parts and isinstance(parts[0][0], dict) else active
+    return parts, total, f'"{first}-{total}"'
+
+def parse_range(header: str, total: int):
+    """Single 'bytes=a-b' range -> (start, end inclusive); None = ignore; ValueError = 416."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, total - length), total - 1
+        start = int(start)
+        end = int(end) if end else total - 1
+    except ValueError:
+        return None
+    if start >= total or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, total - 1)
+
+def raw_bytes(parts, start, end):
+    """Bytes start..end (inclusive) of the concatenated parts, in chunks."""
+    remaining = end - start + 1
+    offset = 0
+    for ref, length in parts:
+        if remaining <= 0:
+            return
+        if offset + length <= start:
+            offset += length
+            continue
+        try:
+            f = segments.open_segment(ref) if isinstance(ref, dict) else open(ref, "rb")
+        except OSError:
+            return
+        with f:
+            f.seek(max(0, start - offset)) # gzip seeks by decompressing forward
+            todo = min(remaining, length - max(0, start - offset))
+            while todo > 0:
+                chunk = f.read(min(CHUNK_BYTES, todo))
+                if not chunk:
+                    break
+                todo -= len(chunk)
+                remaining -= len(chunk)
+                yield chunk
+        offset += length
+        start = offset
+
+def raw_log_response(name, filename, range_header=None, if_range=None):
+    parts, total, etag = raw_parts(name)
+    headers = {"Accept-Ranges": "bytes", "ETag": etag, "Content-Disposition": f'attachment; filename="{filename}"'}
+    byte_range = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, total)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(total)
+        return StreamingResponse(offload.iterate(offload.io, raw_bytes(parts, 0, total - 1)), media_type="application/octet-stream", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(offload.iterate(offload.io, raw_bytes(parts, start, end)), status_code=206, media_type="application/octet-stream", headers=headers)
+
+# --- Entry point ---
+
+def _has_data(resource) -> bool:
+    if resource == "history":
+        return bool(series.get_store().segments())
+    if resource == "devices":
+        return devicestore.get_store().count() > 0
+    if resource in LINE_LOGS:
+        return bool(segments.segments(resource)) or os.path.exists(os.path.join(DATA_DIR, VALID_FILES[resource]))
+    return os.path.exists(os.path.join(DATA_DIR, VALID_FILES[resource]))
+
+def get_file(resource: str, options: ExportOptions = None, range_header: str = None, if_range: str = None):
     """
     Safely return a file for export.
+    Logs and history accept time range / source filters, csv or ndjson
+    output and gzip; an unfiltered raw log export supports Range requests.
     """
-    valid_files = {
-        "devices": "devices.json",
-        "history": "history.csv",
-        "alerts": "alerts.csv",
-        "baseline": "baseline.json",
-        "audit": "audit.log"
-    }
-    
-    if resource not in valid_files:
+    options = options or ExportOptions()
+    if resource not in VALID_FILES:
         raise HTTPException(status_code=404, detail="Resource not found")
-        
-    filename = valid_files[resource]
-    path = os.path.join(DATA_DIR, filename)
-    
-    if not os.path.exists(path):
+
+    filename = VALID_FILES[resource]
+
+    if not _has_data(resource):
         raise HTTPException(status_code=404, detail=f"No data available for {resource} yet.")
-        
+
+    if resource not in LINE_LOGS and resource != "history":
+        if options.filtered or options.format != "raw" or options.gzip:
+            raise HTTPException(status_code=400, detail=f"{resource} only supports a raw export.")
+        audit.log(f"Data exported: {resource}", "USER")
+        if resource == "devices":
+            if coordinator.role == "follower":
+                # Only the collector writes devices.json: render our (reloaded) copy instead
+                body = json.dumps(devicestore.get_store().all(), indent=2).encode("utf-8")
+                return Response(body, media_type="application/octet-stream",
+                                headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+            devicestore.get_store().compact() # Fold the journal in first
+        # FileResponse answers Range / If-Range itself
+        return FileResponse(os.path.join(DATA_DIR, filename), filename=filename, media_type='application/octet-stream')
+
     audit.log(f"Data exported: {resource}", "USER")
-    return FileResponse(path, filename=filename, media_type='application/octet-stream')
+
+    if resource in LINE_LOGS and not options.filtered and options.format == "raw" and not options.gzip:
+        return raw_log_response(resource, filename, range_header, if_range)
+
+    if resource == "history":
+        if options.sources is not None:
+            raise HTTPException(status_code=400, detail="history has no sources to filter on.")
+        chunks = history_chunks(options)
+    else:
+        chunks = log_chunks(resource, options)
+
+    stem = filename.rsplit(".", 1)[0]
+    if options.format == "ndjson":
+        filename, media_type = f"{stem}.ndjson", "application/x-ndjson"
+    elif options.format == "csv" or resource != "audit":
+        filename, media_type = f"{stem}.csv", "text/csv"
+    else:
+        media_type = "text/plain"
+    if options.gzip:
+        chunks = gzip_stream(chunks)
+        filename, media_type = f"{filename}.gz", "application/gzip"
+
+    return StreamingResponse(
+        offload.iterate(offload.io, chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
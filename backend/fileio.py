@@ -0,0 +1,103 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+from . import metrics
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Advisory locks between processes (uvicorn --workers N share data/).
+# A lock lives in a sidecar ".<name>.lock" next to the file it guards, so
+# it survives the file being atomically replaced or rotated away.
+
+def lock_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.lock")
+
+class FileLock:
+    """
+    Exclusive lock on a sidecar file (flock; msvcrt on Windows).
+    Also excludes other threads of this process, as each acquire opens its own handle.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                # LK_LOCK retries for ~10s only; loop until it sticks
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+@contextmanager
+def locked(path):
+    """Hold the advisory lock for `path` (blocking) around a write."""
+    lock = FileLock(lock_path(path))
+    lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+def atomic_write_json(path, data, indent=2):
+    """
+    Write JSON via temp file + os.replace.
+    Readers see either the old file or the new one, never a partial write.
+    Read-modify-write across processes: hold locked(path) around it.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            size = f.tell()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        metrics.io(path, written=size)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def file_stamp(path):
+    """(mtime_ns, size) of a file, or None if missing. Cheap change detector."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
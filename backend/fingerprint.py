@@ -0,0 +1,127 @@
+import re
+import sys
+import time
+import socket
+import struct
+import threading
+import subprocess
+from . import config
+from . import metrics
+from . import neighbors
+
+# Environment fingerprint = default gateway IP (optionally + gateway MAC).
+# Cached; the route table is re-read at most every CHECK_INTERVAL seconds and
+# the fingerprint is only recomputed when it changed (or every REFRESH_INTERVAL).
+
+PROC_ROUTE = "/proc/net/route"
+CHECK_INTERVAL = 1.0
+REFRESH_INTERVAL = 300.0
+UNKNOWN = "unknown_env"
+
+# RTF_UP | RTF_GATEWAY
+RTF_UP = 0x1
+RTF_GATEWAY = 0x2
+
+def parse_proc_route(text: str):
+    """Default gateway IP from /proc/net/route text (lowest metric wins), or None."""
+    best = None
+    for line in text.splitlines()[1:]: # Skip header
+        parts = line.split()
+        if len(parts) < 8:
+            continue
+        # Iface Destination Gateway Flags RefCnt Use Metric Mask ...
+        destination, gateway, flags, metric, mask = parts[1], parts[2], parts[3], parts[6], parts[7]
+        try:
+            if destination != "00000000" or mask != "00000000":
+                continue
+            if (int(flags, 16) & (RTF_UP | RTF_GATEWAY)) != (RTF_UP | RTF_GATEWAY):
+                continue
+            ip = socket.inet_ntoa(struct.pack("<I", int(gateway, 16)))
+            metric = int(metric)
+        except (ValueError, struct.error):
+            continue
+        if best is None or metric < best[0]:
+            best = (metric, ip)
+    return best[1] if best else None
+
+def parse_ipconfig(text: str):
+    """Default gateway from Windows `ipconfig` output, or None."""
+    # Look for Default Gateway . . . . . . . . . : 192.168.1.1
+    match = re.search(r"Default Gateway.*: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})", text)
+    return match.group(1) if match else None
+
+def gateway_mac(ip):
+    """MAC of the gateway from the neighbor table, or None."""
+    try:
+        for entry in neighbors.get_neighbors():
+            if entry["ip"] == ip:
+                return entry["mac"]
+    except Exception:
+        pass
+    return None
+
+class FingerprintProvider:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = None
+        self.route_raw = None
+        self.checked = 0.0
+        self.computed = 0.0
+
+    def _read_route(self):
+        """Raw route table text; None when unavailable (non-Linux)."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            with open(PROC_ROUTE, "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _compute(self, route_raw):
+        if route_raw is not None:
+            gateway = parse_proc_route(route_raw)
+        else:
+            try:
+                metrics.subprocess_run("ipconfig")
+                output = subprocess.check_output("ipconfig", shell=True, stderr=subprocess.DEVNULL).decode("utf-8", errors="ignore")
+                gateway = parse_ipconfig(output)
+            except Exception:
+                gateway = None
+
+        if not gateway:
+            return UNKNOWN
+        if config.get("fingerprint_include_mac", False):
+            mac = gateway_mac(gateway)
+            if mac:
+                return f"{gateway}@{mac}"
+        return gateway
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.value is not None and now - self.checked < CHECK_INTERVAL:
+                return self.value
+            self.checked = now
+
+            route_raw = self._read_route()
+            stale = now - self.computed >= REFRESH_INTERVAL
+            if self.value is None or stale or route_raw != self.route_raw:
+                self.value = self._compute(route_raw)
+                self.route_raw = route_raw
+                self.computed = now
+            return self.value
+
+    def invalidate(self):
+        with self.lock:
+            self.value = None
+
+_provider = FingerprintProvider()
+
+def get() -> str:
+    """Current environment fingerprint (cached)."""
+    return _provider.get()
+
+def invalidate():
+    """Force a recompute on the next call."""
+    _provider.invalidate()
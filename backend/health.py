@@ -9,8 +9,8 @@ def check_storage() -> str:
     try:
         if not os.path.exists(DATA_DIR):
             return "error"
-        # Try writing a temp file
-        test_file = os.path.join(DATA_DIR, ".health_test")
+        # Try writing a temp file (per process: workers check at the same time)
+        test_file = os.path.join(DATA_DIR, f".health_test-{os.getpid()}")
         with open(test_file, "w") as f:
             f.write("test")
         os.remove(test_file)
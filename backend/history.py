@@ -0,0 +1,127 @@
+import math
+import bisect
+import datetime
+import threading
+from collections import deque
+from . import audit
+from . import series
+
+# Recent samples kept in memory (24h at the default 10s analysis interval)
+RING_SIZE = 8640
+
+DEFAULT_LIMIT = 60
+MAX_LIMIT = 1000
+DEFAULT_WINDOW = 3600
+
+FIELDS = ("total", "dns", "risk")
+
+def parse_time(value):
+    """Accept epoch seconds or an ISO8601 string. Returns epoch seconds or None."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    dt = datetime.datetime.fromisoformat(str(value))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+class HistoryIndex:
+    """
+    Recent samples in a ring buffer; older windows are read from the
+    binary series store (binary search on timestamp, see series.py).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ring = deque(maxlen=RING_SIZE)
+        self.last_ts = None
+
+    def refresh(self):
+        """Pull samples appended since the last call."""
+        store = series.get_store()
+        if self.last_ts is None:
+            new = store.tail(RING_SIZE)
+        else:
+            new = store.read_after(self.last_ts)
+        if new:
+            self.ring.extend(new)
+            self.last_ts = new[-1][0]
+
+    def samples(self, since, until):
+        """Yield (ts, total, dns, score, anomalies) in [since, until), oldest first."""
+        ring = list(self.ring)
+        ring_start = ring[0][0] if ring else until
+        if since < ring_start:
+            yield from series.get_store().range(since, min(until, ring_start))
+        lo = bisect.bisect_left(ring, (since,))
+        for sample in ring[lo:]:
+            if sample[0] >= until:
+                break
+            yield sample
+
+    def query(self, since=None, until=None, bucket=None, limit=DEFAULT_LIMIT):
+        limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+        if bucket is not None and bucket <= 0:
+            raise ValueError("bucket must be a positive number of seconds")
+        until = until if until is not None else datetime.datetime.now(datetime.timezone.utc).timestamp()
+        if since is None:
+            since = until - (bucket * limit if bucket else DEFAULT_WINDOW)
+        if not bucket:
+            # Pick the smallest whole-second bucket that fits the window in `limit` points
+            bucket = max(1, math.ceil((until - since) / limit))
+        bucket = max(1, int(bucket))
+        # Only the newest `limit` buckets are returned: never read further back
+        since = max(since, (math.ceil(until / bucket) - limit) * bucket)
+
+        with self.lock:
+            self.refresh()
+            buckets = {}
+            for ts, total, dns, risk, _ in self.samples(since, until):
+                key = int(ts // bucket) * bucket
+                agg = buckets.get(key)
+                if agg is None:
+                    agg = buckets[key] = [0, [total, total, 0], [dns, dns, 0], [risk, risk, 0]]
+                agg[0] += 1
+                for slot, value in zip(agg[1:], (total, dns, risk)):
+                    if value < slot[0]:
+                        slot[0] = value
+                    if value > slot[1]:
+                        slot[1] = value
+                    slot[2] += value
+
+        points = []
+        for key in sorted(buckets)[-limit:]:
+            count, *aggs = buckets[key]
+            point = {"time": _iso(key), "count": count}
+            for name, (lo, hi, acc) in zip(FIELDS, aggs):
+                point[name] = {"min": lo, "max": hi, "avg": round(acc / count, 2)}
+            points.append(point)
+
+        return {
+            "since": _iso(since),
+            "until": _iso(until),
+            "bucket": bucket,
+            "points": points
+        }
+
+_index = HistoryIndex()
+
+def query(since=None, until=None, bucket=None, limit=DEFAULT_LIMIT):
+    """
+    Windowed, downsampled view of analyzer history.
+    Returns min/max/avg of total, dns and risk per `bucket` seconds,
+    at most `limit` buckets (newest kept; `since` is clamped to them).
+    """
+    try:
+        return _index.query(parse_time(since), parse_time(until), bucket, limit)
+    except ValueError:
+        raise
+    except Exception as e:
+        audit.log(f"History query failed: {str(e)}", "ERROR")
+        return {"since": None, "until": None, "bucket": bucket, "points": []}
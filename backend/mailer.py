@@ -1,46 +1,116 @@
-import os
-import json
+import time
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from . import audit
+from . import config
+from . import metrics
 
-# Paths
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-ENV_FILE = os.path.join(DATA_DIR, "environment.json")
+# One authenticated SMTP session, reused across sends.
+# Reconnects when settings change, when the server dropped us, or after
+# IDLE_TIMEOUT without traffic (most servers close idle sessions anyway).
+IDLE_TIMEOUT = 60.0 # seconds
+DEFAULT_TIMEOUT = 10.0
 
-def load_config():
-    """Load email config."""
-    try:
-        with open(ENV_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
+def _settings():
+    return (
+        config.get("smtp_server"),
+        config.get("smtp_port"),
+        config.get("sender_email"),
+        config.get("sender_password"),
+        bool(config.get("smtp_starttls", True)),
+        float(config.get("smtp_timeout", DEFAULT_TIMEOUT))
+    )
+
+def build_message(subject, body):
+    msg = MIMEText(body)
+    msg['Subject'] = subject
+    msg['From'] = config.get("sender_email")
+    msg['To'] = config.get("recipient_email")
+    return msg
+
+class SMTPSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server = None
+        self.settings = None
+        self.used = 0.0
+        self.connects = 0 # For diagnostics / benchmarks
+
+    def _connect(self, settings):
+        host, port, user, password, starttls, timeout = settings
+        server = smtplib.SMTP(host, port, timeout=timeout)
+        try:
+            if starttls:
+                server.starttls()
+            if password:
+                server.login(user, password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.settings = settings
+        self.connects += 1
+
+    def _close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+    @metrics.timed("mailer.send")
+    def send(self, msg):
+        """Send one message. Raises on failure (caller decides about retries)."""
+        with self.lock:
+            settings = _settings()
+            if self.server is not None and (settings != self.settings or time.monotonic() - self.used > IDLE_TIMEOUT):
+                self._close()
+            if self.server is None:
+                self._connect(settings)
+                self.server.send_message(msg)
+            else:
+                try:
+                    self.server.send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Pooled session went stale: reconnect once
+                    self.server = None
+                    self._connect(settings)
+                    self.server.send_message(msg)
+            self.used = time.monotonic()
+
+    def close_if_idle(self):
+        with self.lock:
+            if self.server is not None and time.monotonic() - self.used > IDLE_TIMEOUT:
+                self._close()
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+session = SMTPSession()
+
+def enabled() -> bool:
+    return bool(config.get("email_enabled"))
+
+def deliver(subject, body):
+    """Send through the pooled session. Raises on failure."""
+    session.send(build_message(subject, body))
+    audit.log(f"Email sent: {subject}", "MAILER")
 
 def send_email(subject, body):
     """
     Send email safely.
     Never crash. Logs result.
     """
-    config = load_config()
-    
-    if not config.get("email_enabled"):
+    if not enabled():
         return # Email disabled
-        
+
     try:
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = config.get("sender_email")
-        msg['To'] = config.get("recipient_email")
-        
-        server = smtplib.SMTP(config.get("smtp_server"), config.get("smtp_port"))
-        server.starttls()
-        server.login(config.get("sender_email"), config.get("sender_password"))
-        server.send_message(msg)
-        server.quit()
-        
-        audit.log(f"Email sent: {subject}", "MAILER")
+        deliver(subject, body)
         return True
-        
     except Exception as e:
         audit.log(f"Email failure: {str(e)}", "ERROR")
         return False
@@ -1,17 +1,30 @@
-from fastapi import FastAPI, Body
+import asyncio
+import time
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse, JSONResponse
 from datetime import datetime
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from backend import audit
 from backend import baseline
-from backend import analyzer
 from backend import alerts
 from backend import timeline
+from backend import connections
+from backend import coordinator
+from backend import dashboard
+from backend import dedupe
+from backend import devicestore
+from backend import presence
 from backend import exporter
+from backend import history
+from backend import metrics
+from backend import offload
 from backend import health
-from backend import scanner
-from backend import explain
+from backend import outbox
+from backend import scheduler
+from backend import segments
+from backend import stream
 
 # Global State
 READ_ONLY = False
@@ -25,9 +38,17 @@ async def lifespan(app: FastAPI):
         audit.log("System startup (READ-ONLY MODE)", "SYSTEM")
     else:
         audit.log("System startup", "SYSTEM")
+    stream.hub.attach(asyncio.get_running_loop())
+    coordinator.start(read_only=READ_ONLY) # Collect here, or follow the worker that does
     yield
     # Shutdown
+    coordinator.stop()
+    baseline.flush()
+    dedupe.flush()
+    devicestore.get_store().flush()
+    presence.get_store().close()
     audit.log("System shutdown", "SYSTEM")
+    audit.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -37,85 +58,219 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Content-Disposition", "X-Total-Count"],
 )
 
+if metrics.ENABLED:
+    app.add_middleware(metrics.HTTPMetrics)
+
+# Queue depths, sampled when /metrics is scraped. In-memory values only:
+# a scrape never waits on a file or a lock the scheduler may hold.
+metrics.gauge("audit_queue_depth", "Audit lines waiting for the writer thread.", audit.queue_depth)
+metrics.gauge("outbox_pending", "Emails waiting in the outbox.", outbox.backlog)
+metrics.gauge("stream_subscribers", "Connected /stream clients.", lambda: len(stream.hub.subscribers))
+metrics.gauge("devices_known", "Devices in the device store.", lambda: devicestore.get_store().loaded_count())
+metrics.gauge("io_pool_pending", "Jobs admitted to the I/O pool (running + queued).", lambda: offload.io.pending)
+metrics.gauge("system_pool_pending", "Jobs admitted to the subprocess/psutil pool.", lambda: offload.system.pending)
+
+# Handlers are async: blocking work goes to the bounded pools in offload.py,
+# never to the event loop or Starlette's shared threadpool. A full pool
+# answers 503; /status touches neither and stays live under any load.
+
+@app.exception_handler(offload.Overloaded)
+async def overloaded(request: Request, exc: offload.Overloaded):
+    return JSONResponse({"detail": f"Busy ({exc.pool}). Retry shortly."}, status_code=503,
+                        headers={"Retry-After": str(offload.RETRY_AFTER)})
+
+async def shared_json(key, pool, fn, *args) -> Response:
+    """fn(*args) as JSON from pool; identical concurrent requests (key) share one run."""
+    body = await offload.single_flight(key, pool, offload.render, fn, *args)
+    return Response(body, media_type="application/json")
+
 @app.get("/status")
-def status():
+async def status():
     return {
         "ok": True,
         "service": "sentinelmesh",
         "time": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format: hot-path latencies, file I/O, subprocesses, queue depths."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (metrics_enabled).")
+    text = await offload.single_flight(("metrics",), offload.io, metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
 @app.get("/")
-def health_check():
-    status = "ok"
-    risk_analysis = analyzer.analyze()
-    
-    # Trigger Alert if Risk is High
-    if risk_analysis["score"] >= 50 and not READ_ONLY: # Don't spam alerts if broken
-        severity = "Critical" if risk_analysis["score"] >= 80 else "Warning"
-        alerts.log_alert("High Risk", severity, risk_analysis["explanation"], f"Score: {risk_analysis['score']}")
-
-    explanations = {
-        "risk": risk_analysis["explanation"],
-        "data": explain.explain_missing_data("network_map"),
-        "state": explain.explain_status(status)
-    }
-    
-    audit.log("Health check with explanations generated")
-    
-    system_mode = "read-only" if READ_ONLY else "read-write"
-    
-    return {
-        "status": status,
-        "mode": system_mode,
-        "risk_score": risk_analysis["score"],
-        "risk_status": risk_analysis["status"],
-        "explanations": explanations
-    }
+async def health_check():
+    # Analysis (and alerting) runs on the scheduler; serve the latest result (in memory)
+    audit.log("Health check with explanations generated", wait=False)
+    return scheduler.health_summary()
+
+@app.get("/dashboard")
+async def get_dashboard(request: Request, sections: str = None):
+    """
+    Everything the dashboard needs in one versioned response.
+    ?sections=health,devices,... limits the body; ?sections=versions returns only versions.
+    Send If-None-Match to get 304 when nothing changed.
+    """
+    wanted = dashboard.parse_sections(sections)
+    tag = dashboard.etag(wanted)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if dashboard.matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    tag, body = await offload.single_flight(("dashboard", wanted), offload.io, dashboard.render, wanted)
+    headers["ETag"] = tag
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/stream")
+async def live_stream(request: Request):
+    """Server-Sent Events: one snapshot, then deltas as they happen."""
+    sub = stream.hub.subscribe() # Before the snapshot, so no delta falls in between
+    try:
+        first = await offload.io.run(stream.snapshot, scheduler.health_summary(), scheduler.latest_devices())
+    except offload.Overloaded:
+        stream.hub.unsubscribe(sub)
+        raise
+
+    async def events():
+        try:
+            yield first
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), timeout=stream.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is stream.RESYNC:
+                    sub.lagging = False
+                    message = await offload.io.run(stream.snapshot, scheduler.health_summary(), scheduler.latest_devices(), shed=False)
+                yield message
+        finally:
+            stream.hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.post("/alerts/test")
-def test_alert():
+async def test_alert():
     if READ_ONLY:
          return {"status": "Failed. System is Read-Only."}
-    alerts.log_alert("test", "Info", "Manual test requested", "User triggered")
+    await offload.io.run(alerts.log_alert, "test", "Info", "Manual test requested", "User triggered")
     return {"status": "Test alert dispatched"}
 
 @app.get("/timeline")
-def get_timeline(source: str = None):
-    audit.log(f"Timeline accessed (filter: {source})", "USER")
-    return timeline.get_events(source_filter=source)
+async def get_timeline(source: str = None, limit: int = 100):
+    audit.log(f"Timeline accessed (filter: {source})", "USER", wait=False)
+    return await shared_json(("timeline", source, limit), offload.io, timeline.get_events, limit, source)
+
+@app.get("/history")
+async def get_history(since: str = None, until: str = None, bucket: int = None, limit: int = 60):
+    if bucket is not None and bucket <= 0:
+        raise HTTPException(status_code=400, detail="bucket must be a positive number of seconds.")
+    try:
+        return await shared_json(("history", since, until, bucket, limit), offload.io, history.query, since, until, bucket, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time range. Use ISO8601 or epoch seconds.")
 
 @app.get("/export/{resource}")
-def export_data(resource: str):
-    return exporter.get_file(resource)
+async def export_data(request: Request, resource: str, since: str = None, until: str = None,
+                source: str = None, format: str = "raw", compress: str = None):
+    """
+    ?since / ?until: ISO8601 or epoch seconds. ?source: audit levels or alert types (comma list).
+    ?format=raw|csv|ndjson, ?compress=gzip. Unfiltered raw log exports support Range.
+    """
+    try:
+        options = exporter.ExportOptions(history.parse_time(since), history.parse_time(until), source, format, compress)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Streamed bodies are then produced chunk by chunk in the same pool (see exporter)
+    return await offload.io.run(exporter.get_file, resource, options, request.headers.get("range"), request.headers.get("if-range"))
 
-@app.get("/health")
-def self_check():
-    audit.log("Health self-check initiated")
+def _self_check():
     return {
         "storage": health.check_storage(),
         "audit": health.check_audit_log(),
         "baseline": health.check_baseline(),
-        "scanner": "inactive",
-        "last_scan": health.last_scan_time()
+        "scanner": "running" if coordinator.collecting() else "inactive",
+        "collector": coordinator.role,
+        "last_scan": health.last_scan_time(),
+        "archive": segments.usage()
     }
 
+@app.get("/health")
+async def self_check():
+    audit.log("Health self-check initiated", wait=False)
+    return await shared_json(("health",), offload.io, _self_check)
+
+def _device_page(status, mac, ip, q, offset, limit):
+    items, total = devicestore.get_store().query(status, mac, ip, q, offset, limit)
+    return offload.dumps(items), total
+
 @app.get("/devices")
-def get_devices():
-    devices = scanner.scan_devices()
-    baseline.update(devices)
-    return list(devices)
+async def get_devices(status: str = None, mac: str = None, ip: str = None,
+                      q: str = None, offset: int = 0, limit: int = None):
+    """
+    Known devices. Without parameters: all of them.
+    Filters: status (comma list), mac (exact), ip (exact or prefix), q (substring).
+    Paging: offset / limit (max 1000); the match count is in X-Total-Count.
+    """
+    if not any((status, mac, ip, q, offset, limit)):
+        return await shared_json(("devices",), offload.io, lambda: list(scheduler.latest_devices()))
+    key = ("devices", status, mac, ip, q, offset, limit)
+    body, total = await offload.single_flight(key, offload.io, _device_page, status, mac, ip, q, offset, limit)
+    return Response(body, media_type="application/json", headers={"X-Total-Count": str(total)})
+
+@app.get("/devices/{mac}/presence")
+async def get_presence(mac: str, since: str = None, until: str = None):
+    """
+    When a device (by MAC) was on the network: merged intervals and uptime %.
+    ?since / ?until: ISO8601 or epoch seconds (default: the last 7 days).
+    """
+    raw = presence.mac_bytes(mac)
+    if raw is None:
+        raise HTTPException(status_code=400, detail="Invalid MAC address.")
+    mac = raw.hex(":") # One form (aa:bb:cc:dd:ee:ff) for the cache key and both stores
+    try:
+        end = history.parse_time(until) or time.time()
+        start = history.parse_time(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time range. Use ISO8601 or epoch seconds.")
+    start = end - presence.DEFAULT_WINDOW if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="since must be before until.")
+    return await shared_json(("presence", mac, start, end), offload.io, _presence, mac, start, end)
+
+def _presence(mac, start, end):
+    store = presence.get_store()
+    devices = devicestore.get_store().by_mac_address(mac)
+    if not devices and not store.known(mac):
+        raise HTTPException(status_code=404, detail="Unknown device.")
+    running = [(d.get("session_start", devicestore.seen_ts(d)), None) for d in devices if d.get("status") == "active"]
+    return presence.presence(store, mac, start, end, running)
+
+@app.get("/connections")
+async def get_connections():
+    return await shared_json(("connections",), offload.system, connections.snapshot)
+
+@app.get("/baseline/stats")
+async def get_baseline_stats():
+    return await shared_json(("baseline_stats",), offload.io, baseline.get_stats_summary)
 
 @app.get("/environment")
-def get_env():
-    return baseline.get_environment_info()
+async def get_env():
+    return await shared_json(("environment",), offload.io, baseline.get_environment_info)
 
 class EnvNameRequest(BaseModel):
     name: str
 
+def _rename(name):
+    success = baseline.set_environment_name(name)
+    stream.environment_changed() # Takes the change-detection lock: not on the event loop
+    return success
+
 @app.post("/environment/name")
-def set_env_name(req: EnvNameRequest):
-    success = baseline.set_environment_name(req.name)
+async def set_env_name(req: EnvNameRequest):
+    success = await offload.io.run(_rename, req.name)
     return {"success": success, "name": req.name}
@@ -0,0 +1,189 @@
+import os
+import time
+import bisect
+import functools
+import threading
+from . import config
+
+# In-process instrumentation, exposed at /metrics in Prometheus text format.
+#
+#   @metrics.timed("scanner.scan_devices")   latency histogram per function
+#   metrics.io("audit.log", written=n)       bytes read / written per data file
+#   metrics.subprocess_run("arp")            processes spawned
+#   metrics.gauge(name, help, fn)            sampled at scrape time (queue depths)
+#
+# "metrics_enabled": false in environment.json turns it off (read once at
+# startup). Disabled, @timed returns the function itself and the counters
+# return at once, so instrumented calls cost (next to) nothing.
+PREFIX = "sentinelmesh"
+
+# Seconds. Covers sub-millisecond parses up to multi-second SMTP / sweeps
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENABLED = bool(config.get("metrics_enabled", True))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        try:
+            value = float(self.read())
+        except Exception:
+            return # Source unavailable (or None: not known yet): leave the sample out
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {value:g}"
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {} # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.series.get(labels)
+            if row is None:
+                row = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            items = sorted((labels, list(row)) for labels, row in self.series.items())
+        names = self.labelnames + ("le",)
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (f'{bound:g}' if bound != '+Inf' else bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {row[-1]:.6f}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+CALLS = register(Histogram(f"{PREFIX}_call_duration_seconds", "Latency of instrumented hot paths.", ("fn",)))
+ERRORS = register(Counter(f"{PREFIX}_call_errors_total", "Instrumented calls that raised.", ("fn",)))
+HTTP = register(Histogram(f"{PREFIX}_http_request_duration_seconds", "HTTP handler latency.", ("method", "route", "status")))
+BYTES_READ = register(Counter(f"{PREFIX}_file_read_bytes_total", "Bytes read per data file.", ("file",)))
+BYTES_WRITTEN = register(Counter(f"{PREFIX}_file_written_bytes_total", "Bytes written per data file.", ("file",)))
+SUBPROCESSES = register(Counter(f"{PREFIX}_subprocesses_total", "Processes spawned, by command.", ("command",)))
+
+def timed(name: str):
+    """Decorator: record call latency under fn=name. Identity when disabled."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        observe = CALLS.observe
+        clock = time.perf_counter
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                ERRORS.inc(name)
+                raise
+            finally:
+                observe(clock() - start, name)
+        return wrapper
+    return decorate
+
+def io(path: str, read: int = 0, written: int = 0):
+    """Count bytes read / written for a data file (labelled by file name)."""
+    if not ENABLED:
+        return
+    name = os.path.basename(path)
+    if read:
+        BYTES_READ.inc(name, amount=read)
+    if written:
+        BYTES_WRITTEN.inc(name, amount=written)
+
+def subprocess_run(command: str):
+    if ENABLED:
+        SUBPROCESSES.inc(command)
+
+class HTTPMetrics:
+    """
+    ASGI middleware: handler latency by route template (/devices/{mac}/presence,
+    not every MAC) up to the response start, so SSE streams count once.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                route = scope.get("route")
+                HTTP.observe(time.perf_counter() - start, scope["method"], getattr(route, "path", "unmatched"), str(status))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            route = scope.get("route")
+            HTTP.observe(time.perf_counter() - start, scope["method"], getattr(route, "path", "unmatched"), "500")
+            raise
+
+def gauge(name: str, help: str, read):
+    """Register a gauge sampled at scrape time (no cost between scrapes)."""
+    register(Gauge(f"{PREFIX}_{name}", help, read))
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import socket
+import struct
+import subprocess
+from . import config
+from . import metrics
+
+# Neighbor (ARP) table sources.
+# Every source returns a list of dicts: {'ip': str, 'mac': str}
+# "netlink" and "proc" are Linux-only and never spawn a process.
+# "arp" shells out to `arp -a` and is kept as the portable fallback.
+
+PROC_ARP = "/proc/net/arp"
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/neighbour.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_INCOMPLETE = 0x01
+NUD_FAILED = 0x20
+NUD_NOARP = 0x40
+
+NLMSGHDR = struct.Struct("=IHHII")
+NDMSG = struct.Struct("=BxxxiHBB")
+RTATTR = struct.Struct("=HH")
+
+# ATF_COM: entry is complete (has a hardware address)
+ATF_COM = 0x02
+
+# Windows: 192.168.1.1           ab-cd-ef-12-34-56     dynamic
+ARP_WINDOWS = re.compile(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+([a-fA-F0-9-]{17})\s+")
+# Linux/BSD: ? (192.168.1.1) at ab:cd:ef:12:34:56 [ether] on eth0
+ARP_UNIX = re.compile(r"\((\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\) at ([a-fA-F0-9:]{11,17})\b")
+
+def _keep(ip: str) -> bool:
+    """Filter out multicast/broadcast."""
+    return not (ip.startswith("224.") or ip.startswith("239.") or ip == "255.255.255.255")
+
+def _normalize_mac(mac: str) -> str:
+    """ab-cd-ef-1-2-3 / ab:cd:ef:1:2:3 -> AB:CD:EF:01:02:03"""
+    parts = re.split(r"[-:]", mac)
+    return ":".join(p.zfill(2) for p in parts).upper()
+
+def parse_arp_output(text: str):
+    """Parse `arp -a` output (Windows or Linux/BSD format)."""
+    devices = []
+    for line in text.splitlines():
+        match = ARP_WINDOWS.search(line) or ARP_UNIX.search(line)
+        if match:
+            ip = match.group(1)
+            if _keep(ip):
+                devices.append({"ip": ip, "mac": _normalize_mac(match.group(2))})
+    return devices
+
+def parse_proc_arp(text: str):
+    """
+    Parse /proc/net/arp.
+    IP address  HW type  Flags  HW address  Mask  Device
+    """
+    devices = []
+    for line in text.splitlines()[1:]: # Skip header
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        ip, flags, mac = parts[0], parts[2], parts[3]
+        try:
+            if not int(flags, 16) & ATF_COM:
+                continue # Incomplete entry
+        except ValueError:
+            continue
+        if _keep(ip):
+            devices.append({"ip": ip, "mac": mac.upper()})
+    return devices
+
+def parse_neigh_dump(data: bytes):
+    """Parse a stream of rtnetlink RTM_NEWNEIGH messages."""
+    devices = []
+    # Hot loop: bind lookups locally
+    unpack_hdr = NLMSGHDR.unpack_from
+    unpack_nd = NDMSG.unpack_from
+    unpack_attr = RTATTR.unpack_from
+    ntoa = socket.inet_ntoa
+    af_inet = socket.AF_INET
+    bad_state = NUD_INCOMPLETE | NUD_FAILED | NUD_NOARP
+    hdr_size = NLMSGHDR.size
+    nd_end = hdr_size + NDMSG.size
+
+    offset = 0
+    end = len(data)
+    while offset + hdr_size <= end:
+        msg_len, msg_type, _, _, _ = unpack_hdr(data, offset)
+        if msg_len < hdr_size:
+            break
+        if msg_type == RTM_NEWNEIGH:
+            family, _, state, _, _ = unpack_nd(data, offset + hdr_size)
+            if family == af_inet and not state & bad_state:
+                ip = mac = None
+                attr = offset + nd_end
+                msg_end = offset + msg_len
+                while attr + 4 <= msg_end:
+                    attr_len, attr_type = unpack_attr(data, attr)
+                    if attr_len < 4:
+                        break
+                    if attr_type == NDA_DST and attr_len == 8:
+                        ip = ntoa(data[attr + 4:attr + 8])
+                    elif attr_type == NDA_LLADDR and attr_len == 10:
+                        mac = data[attr + 4:attr + 10].hex(":").upper()
+                    attr += (attr_len + 3) & ~3
+                if ip and mac and _keep(ip):
+                    devices.append({"ip": ip, "mac": mac})
+        offset += (msg_len + 3) & ~3
+    return devices
+
+def read_arp_command():
+    """Run `arp -a` (fork + exec). Portable fallback."""
+    metrics.subprocess_run("arp")
+    output = subprocess.check_output(["arp", "-a"], stderr=subprocess.DEVNULL).decode("utf-8", errors="ignore")
+    return parse_arp_output(output)
+
+def read_proc_arp(path: str = PROC_ARP):
+    """Read the kernel ARP cache from procfs."""
+    with open(path, "r") as f:
+        return parse_proc_arp(f.read())
+
+def read_netlink():
+    """Dump the IPv4 neighbor table over rtnetlink (RTM_GETNEIGH)."""
+    if not hasattr(socket, "AF_NETLINK"):
+        raise OSError("netlink not supported on this platform")
+
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        sock.settimeout(1.0)
+        sock.bind((0, 0))
+        seq = 1
+        body = NDMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+        header = NLMSGHDR.pack(NLMSGHDR.size + len(body), RTM_GETNEIGH, NLM_F_REQUEST | NLM_F_DUMP, seq, 0)
+        sock.send(header + body)
+
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+            # Look at the last message header in this datagram for DONE/ERROR
+            if _dump_finished(data):
+                break
+        return parse_neigh_dump(b"".join(chunks))
+    finally:
+        sock.close()
+
+def _dump_finished(data: bytes) -> bool:
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        msg_len, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if msg_type == NLMSG_DONE:
+            return True
+        if msg_type == NLMSG_ERROR:
+            raise OSError("netlink neighbor dump failed")
+        if msg_len < NLMSGHDR.size:
+            break
+        offset += (msg_len + 3) & ~3
+    return False
+
+SOURCES = {
+    "netlink": read_netlink,
+    "proc": read_proc_arp,
+    "arp": read_arp_command
+}
+
+# Source picked by "auto" mode, remembered after the first success
+_active = None
+
+def auto_order():
+    """Cheapest-first source order for this platform (see benchmarks/bench_neighbors.py)."""
+    if sys.platform.startswith("linux"):
+        order = ["proc", "netlink", "arp"]
+        if not os.path.exists(PROC_ARP):
+            order.remove("proc")
+        return order
+    return ["arp"]
+
+def get_neighbors():
+    """
+    Read the neighbor table using the configured source.
+    Setting "neighbor_source": "auto" | "netlink" | "proc" | "arp"
+    Raises if no source is usable.
+    """
+    global _active
+    choice = config.get("neighbor_source", "auto")
+    if choice in SOURCES:
+        return SOURCES[choice]()
+
+    if _active:
+        try:
+            return SOURCES[_active]()
+        except Exception:
+            _active = None # Fall through and re-probe
+
+    error = None
+    for name in auto_order():
+        try:
+            devices = SOURCES[name]()
+            _active = name
+            return devices
+        except Exception as e:
+            error = e
+    raise error or OSError("no neighbor source available")
+
+def active_source():
+    """Name of the source auto mode settled on, if any."""
+    return _active
@@ -0,0 +1,132 @@
+import json
+import asyncio
+import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from . import config
+from . import metrics
+
+# Blocking work for the API handlers, kept off the event loop in two
+# bounded pools so one kind of load cannot starve the other (or /status):
+#   io     - file reads and JSON rendering (timeline, history, exports, devices, dashboard)
+#   system - psutil walks and subprocesses (connections)
+#
+# A pool admits at most workers + queue jobs. Past that, run() raises
+# Overloaded and the API answers 503 with Retry-After instead of letting
+# requests pile up. Identical concurrent requests share one run
+# (single_flight), so a burst of dashboards costs one read.
+#
+# Sizes in environment.json (read at startup):
+#   io_workers, io_queue          default 8 / 64
+#   system_workers, system_queue  default 2 / 16
+DEFAULTS = {
+    "io": (8, 64),
+    "system": (2, 16)
+}
+
+RETRY_AFTER = 1 # seconds, sent with 503
+
+SHED = metrics.register(metrics.Counter(f"{metrics.PREFIX}_requests_shed_total", "Requests refused (503) because a pool was full.", ("pool",)))
+
+class Overloaded(Exception):
+    """A pool is full: shed the request."""
+
+    def __init__(self, pool: str):
+        super().__init__(f"{pool} pool is full")
+        self.pool = pool
+
+class Pool:
+    """Thread pool with admission control. pending is only touched on the event loop."""
+
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.limit = workers + queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"sentinelmesh-{name}")
+        self.pending = 0 # Admitted and not finished (running + queued)
+
+    async def run(self, fn, *args, shed: bool = True):
+        """Run fn(*args) in the pool. shed=False always admits (work already promised to a client)."""
+        if shed and self.pending >= self.limit:
+            SHED.inc(self.name)
+            raise Overloaded(self.name)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+        finally:
+            self.pending -= 1
+
+def _size(name):
+    workers, queue = DEFAULTS[name]
+    try:
+        workers = max(int(config.get(f"{name}_workers", workers)), 1)
+        queue = max(int(config.get(f"{name}_queue", queue)), 0)
+    except (TypeError, ValueError):
+        pass
+    return workers, queue
+
+io = Pool("io", *_size("io"))
+system = Pool("system", *_size("system"))
+
+_flights = {} # key -> asyncio.Future of the run in progress
+_DONE = object()
+
+def _landed(key, flight):
+    if _flights.get(key) is flight:
+        del _flights[key]
+    if not flight.cancelled():
+        flight.exception() # Retrieved even if every caller went away
+
+async def single_flight(key, pool: Pool, fn, *args):
+    """
+    fn(*args) in pool, run once for all concurrent callers with the same key.
+    A caller that disconnects does not cancel the run for the others.
+    """
+    flight = _flights.get(key)
+    if flight is None:
+        flight = asyncio.ensure_future(pool.run(fn, *args))
+        _flights[key] = flight
+        flight.add_done_callback(functools.partial(_landed, key))
+    return await asyncio.shield(flight)
+
+def _close_after(close, step):
+    if not step.cancelled():
+        step.exception() # Retrieved: nobody awaits it any more
+    close()
+
+async def iterate(pool: Pool, iterator):
+    """
+    Drain a blocking iterator (a streamed response body) chunk by chunk in
+    pool. Never shed: the response has already started.
+    """
+    step = None
+    try:
+        while True:
+            # Shielded: a disconnect cancels the wait, not the next() running in the pool
+            step = asyncio.ensure_future(pool.run(next, iterator, _DONE, shed=False))
+            chunk = await asyncio.shield(step)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            # Client went away: release files now, or as soon as the
+            # in-flight next() returns (closing a running generator raises)
+            if step is not None and not step.done():
+                step.add_done_callback(functools.partial(_close_after, close))
+            else:
+                close()
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+def dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+def render(fn, *args) -> bytes:
+    """fn(*args) as JSON bytes (in the pool, so large bodies never block the event loop)."""
+    return dumps(fn(*args))
@@ -0,0 +1,283 @@
+import os
+import sys
+import csv
+import mmap
+import array
+import bisect
+import struct
+import threading
+from . import audit
+
+# Offline MAC vendor lookup (IEEE MA-L / MA-M / MA-S registries).
+#
+# The registries are compiled into data/oui.bin: sorted, non-overlapping
+# MAC ranges (MA-M and MA-S blocks carved out of the MA-L block they sit
+# in), so a longest-prefix match is one binary search over the range
+# starts. The file is memory-mapped on first lookup; nothing is loaded
+# at startup.
+#
+# A small seed (backend/oui_seed.csv) is compiled automatically. For the
+# full registries, download oui.csv, mam.csv and oui36.csv from IEEE and run
+#   python -m backend.oui build oui.csv mam.csv oui36.csv
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+TABLE_FILE = os.path.join(DATA_DIR, "oui.bin")
+SEED_FILE = os.path.join(os.path.dirname(__file__), "oui_seed.csv")
+
+# File layout (little-endian):
+#   header: magic "SMOU", version u16, flags u16, ranges u32, names u32
+#   starts u64[ranges], ends u64[ranges] (48-bit MAC values, inclusive)
+#   name index u32[ranges] (+ padding to 8 bytes)
+#   name offsets u32[names + 1], then the UTF-8 names back to back
+MAGIC = b"SMOU"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+FLAG_SEED = 0x1 # Built from the bundled seed (rebuilt when the seed changes)
+
+# Assignment hex digits -> prefix bits
+PREFIX_BITS = {6: 24, 7: 28, 9: 36}
+
+MAC_MAX = (1 << 48) - 1
+
+# Length of "AA:BB:CC", "AA:BB:CC:D", "AA:BB:CC:DD:E" (24, 28, 36 bit prefixes)
+BLOCK_CHARS = (8, 10, 13)
+
+def mac_value(mac: str):
+    """'AA:BB:CC:DD:EE:FF' (or '-' separated) -> int, None if not a MAC."""
+    digits = (mac or "").replace(":", "").replace("-", "")
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+# --- Building ---
+
+def read_registry(path):
+    """(start, end, vendor) for each row of an IEEE registry CSV."""
+    rows = []
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 3 or row[0] == "Registry":
+                continue
+            assignment = row[1].strip().upper()
+            bits = PREFIX_BITS.get(len(assignment))
+            if bits is None:
+                continue
+            try:
+                start = int(assignment, 16) << (48 - bits)
+            except ValueError:
+                continue
+            rows.append((start, start + (1 << (48 - bits)) - 1, row[2].strip()))
+    return rows
+
+def flatten(rows):
+    """
+    Nested prefix ranges -> sorted, disjoint (start, end, vendor) ranges where
+    the longest prefix wins. Registry blocks are either disjoint or nested.
+    """
+    out = []
+
+    def emit(start, end, vendor):
+        if start > end:
+            return
+        if out and out[-1][2] == vendor and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, vendor)
+        else:
+            out.append((start, end, vendor))
+
+    stack = []
+    cursor = 0
+    for start, end, vendor in sorted(rows, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][1] < start:
+            top = stack.pop()
+            emit(cursor, top[1], top[2])
+            cursor = top[1] + 1
+        if stack:
+            emit(cursor, start - 1, stack[-1][2])
+        stack.append((start, end, vendor))
+        cursor = start
+    while stack:
+        top = stack.pop()
+        emit(cursor, top[1], top[2])
+        cursor = top[1] + 1
+    return out
+
+def _le(values) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+def build(sources, dest=TABLE_FILE, flags=0) -> int:
+    """Compile IEEE registry CSVs into the binary table (atomic). Returns ranges."""
+    rows = []
+    for path in sources:
+        rows.extend(read_registry(path))
+    ranges = flatten(rows)
+
+    names, name_index = [], {}
+    for _, _, vendor in ranges:
+        if vendor not in name_index:
+            name_index[vendor] = len(names)
+            names.append(vendor)
+    blobs = [n.encode("utf-8") for n in names]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    index = _le(array.array("I", [name_index[v] for _, _, v in ranges]))
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, len(ranges), len(names)),
+        _le(array.array("Q", [r[0] for r in ranges])),
+        _le(array.array("Q", [r[1] for r in ranges])),
+        index,
+        b"\0" * (-len(index) % 8),
+        _le(array.array("I", offsets)),
+        b"".join(blobs)
+    ]
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".part"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp, dest)
+    return len(ranges)
+
+# --- Lookup ---
+
+class OUITable:
+    """Read-only view of a compiled table (mmap-backed)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, n, names = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unrecognized OUI table: {path}")
+        view = memoryview(self.map)
+        pos = HEADER.size
+        self.starts = self._array(view[pos:pos + 8 * n], "Q")
+        pos += 8 * n
+        self.ends = self._array(view[pos:pos + 8 * n], "Q")
+        pos += 8 * n
+        self.index = self._array(view[pos:pos + 4 * n], "I")
+        pos += 4 * n + (-4 * n % 8)
+        self.offsets = self._array(view[pos:pos + 4 * (names + 1)], "I")
+        self.blob = pos + 4 * (names + 1)
+        self.names = {} # Decoded on demand
+
+    @staticmethod
+    def _array(view, code):
+        if sys.byteorder == "little":
+            return view.cast(code) # Zero-copy
+        values = array.array(code, view.tobytes())
+        values.byteswap()
+        return values
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _name(self, i):
+        name = self.names.get(i)
+        if name is None:
+            start, end = self.offsets[i], self.offsets[i + 1]
+            name = self.names[i] = self.map[self.blob + start:self.blob + end].decode("utf-8")
+        return name
+
+    def find(self, value):
+        """(vendor or None, lo, hi): the answer holds for every MAC in [lo, hi]."""
+        starts = self.starts
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self._name(self.index[i]), starts[i], self.ends[i]
+        lo = self.ends[i] + 1 if i >= 0 else 0
+        hi = starts[i + 1] - 1 if i + 1 < len(starts) else MAC_MAX
+        return None, lo, hi
+
+    def lookup(self, mac: str):
+        value = mac_value(mac)
+        return None if value is None else self.find(value)[0]
+
+    def enrich(self, devices, field="mac_vendor"):
+        """
+        Set devices[i][field] in place. A MA-L / MA-M / MA-S block with a
+        single answer is resolved once, then served by MAC text prefix.
+        """
+        blocks = {}
+        for device in devices:
+            mac = (device.get("mac") or "").upper()
+            for chars in BLOCK_CHARS:
+                vendor = blocks.get(mac[:chars], blocks)
+                if vendor is not blocks:
+                    device[field] = vendor
+                    break
+            else:
+                value = mac_value(mac)
+                if value is None:
+                    device[field] = None
+                    continue
+                vendor, lo, hi = self.find(value)
+                for bits, chars in zip(PREFIX_BITS.values(), BLOCK_CHARS):
+                    size = 1 << (48 - bits)
+                    block = value & ~(size - 1)
+                    if lo <= block and block + size - 1 <= hi:
+                        blocks[mac[:chars]] = vendor
+                        break
+                device[field] = vendor
+        return devices
+
+_table = None
+_lock = threading.Lock()
+
+def _stale(path) -> bool:
+    """Missing, or compiled from an older copy of the seed."""
+    try:
+        with open(path, "rb") as f:
+            magic, version, flags, _, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            return True
+        return bool(flags & FLAG_SEED) and os.path.getmtime(SEED_FILE) > os.path.getmtime(path)
+    except (OSError, struct.error):
+        return True
+
+def get_table():
+    """The table, compiled from the seed and mapped on first use. None if unavailable."""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                try:
+                    if _stale(TABLE_FILE):
+                        build([SEED_FILE], TABLE_FILE, FLAG_SEED)
+                    _table = OUITable(TABLE_FILE)
+                except Exception as e:
+                    audit.log(f"OUI table unavailable: {str(e)}", "ERROR")
+                    _table = False
+    return _table or None
+
+def lookup(mac: str):
+    """Vendor of a MAC address, or None."""
+    table = get_table()
+    return table.lookup(mac) if table else None
+
+def enrich(devices):
+    """Set mac_vendor on each device dict (None when unknown)."""
+    table = get_table()
+    if table:
+        table.enrich(devices)
+    else:
+        for device in devices:
+            device["mac_vendor"] = None
+    return devices
+
+def reload():
+    """Forget the mapped table (after a rebuild)."""
+    global _table
+    with _lock:
+        _table = None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "build":
+        print("usage: python -m backend.oui build <registry.csv> [...]")
+        sys.exit(2)
+    count = build(sys.argv[2:])
+    print(f"Wrote {count} ranges to {TABLE_FILE}")
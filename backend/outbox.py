@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import itertools
+import threading
+from . import audit
+from . import config
+from . import mailer
+from .fileio import atomic_write_json
+
+# Durable outbound alert queue.
+# log_alert() only writes a small JSON file here; a background worker
+# delivers through the pooled SMTP session, retries with backoff and
+# collapses bursts into one digest email.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+OUTBOX_DIR = os.path.join(DATA_DIR, "outbox")
+FAILED_DIR = os.path.join(OUTBOX_DIR, "failed")
+
+# Burst window ("alert_digest_window" in environment.json, seconds).
+# Messages wait up to this long so a burst goes out as one email; 0 sends at once.
+DEFAULT_DIGEST_WINDOW = 60.0
+
+# Retry backoff: BACKOFF_BASE * 2^attempt, capped; gives up after MAX_ATTEMPTS
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 600.0
+MAX_ATTEMPTS = 8
+
+# Upper bound on messages folded into one digest
+DIGEST_MAX = 50
+
+# Other workers only write files here; the delivering process (the
+# collector leader, see coordinator.py) looks for them this often
+ADOPT_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+_pending = None # [(path, item)] oldest first, kept in sync with OUTBOX_DIR
+_seq = itertools.count()
+
+def get_digest_window() -> float:
+    try:
+        return max(float(config.get("alert_digest_window", DEFAULT_DIGEST_WINDOW)), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_DIGEST_WINDOW
+
+def _load():
+    """
+    Sync with OUTBOX_DIR: messages left over from a previous run or queued
+    by another worker appear, ones delivered elsewhere go. Lists the
+    directory every time (it holds a handful of files); its mtime is too
+    coarse to tell whether another worker just added one.
+    """
+    global _pending
+    if _pending is None:
+        _pending = []
+    try:
+        names = sorted(n for n in os.listdir(OUTBOX_DIR) if n.endswith(".json"))
+    except OSError:
+        names = []
+    on_disk = set(names)
+    _pending[:] = [(p, i) for p, i in _pending if os.path.basename(p) in on_disk]
+    known = {os.path.basename(p) for p, _ in _pending}
+    for name in names:
+        if name in known:
+            continue
+        path = os.path.join(OUTBOX_DIR, name)
+        try:
+            with open(path, "r") as f:
+                _pending.append((path, json.load(f)))
+        except (OSError, ValueError):
+            audit.log(f"Outbox: unreadable message {name} skipped", "ERROR")
+    _pending.sort(key=lambda entry: os.path.basename(entry[0]))
+
+def enqueue(subject: str, body: str, immediate: bool = False) -> bool:
+    """
+    Persist one outbound email and wake the worker. Never blocks on SMTP.
+    immediate=True skips the digest window (e.g. manual test alerts).
+    """
+    if not mailer.enabled():
+        return False
+    now = time.time()
+    item = {
+        "subject": subject,
+        "body": body,
+        "created": now,
+        "immediate": immediate,
+        "attempts": 0,
+        "next_attempt": now
+    }
+    # Name sorts by creation order
+    path = os.path.join(OUTBOX_DIR, f"{time.time_ns():020d}-{next(_seq) % 1000000:06d}.json")
+    try:
+        os.makedirs(OUTBOX_DIR, exist_ok=True)
+        atomic_write_json(path, item, indent=None)
+    except Exception as e:
+        audit.log(f"Outbox write failed: {str(e)}", "ERROR")
+        return False
+    with _lock:
+        _load()
+        if not any(p == path for p, _ in _pending):
+            _pending.append((path, item))
+    _wake.set()
+    return True
+
+def pending_count() -> int:
+    with _lock:
+        _load()
+        return len(_pending)
+
+def backlog():
+    """Messages queued as of the last sync, or None before the first (no I/O, no lock: /metrics)."""
+    pending = _pending
+    return None if pending is None else len(pending)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def compose(items):
+    """(subject, body) for a batch: the message itself, or one digest."""
+    if len(items) == 1:
+        return items[0]["subject"], items[0]["body"]
+    subject = f"[SentinelMesh] DIGEST: {len(items)} alerts"
+    parts = [f"SentinelMesh Alert Digest\n\n{len(items)} alerts since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(items[0]['created']))}"]
+    for item in items:
+        parts.append(f"--- {item['subject']} ---\n{item['body']}")
+    return subject, "\n\n".join(parts)
+
+def _due_batch(now: float):
+    """
+    Messages ready to go now, or ([], seconds to wait).
+    A batch leaves once its oldest message has waited the digest window
+    (or at once when any ready message is immediate).
+    """
+    ready = [(p, i) for p, i in _pending if i["next_attempt"] <= now]
+    next_retry = min((i["next_attempt"] for _, i in _pending if i["next_attempt"] > now), default=None)
+    if ready:
+        window = get_digest_window()
+        oldest = min(i["created"] for _, i in ready)
+        flush_at = oldest + window
+        if any(i["immediate"] for _, i in ready) or now >= flush_at:
+            return ready[:DIGEST_MAX], 0.0
+        wait = flush_at - now
+    else:
+        wait = None
+    if next_retry is not None:
+        wait = min(wait, next_retry - now) if wait is not None else next_retry - now
+    return [], wait
+
+def _deliver(batch):
+    items = [i for _, i in batch]
+    subject, body = compose(items)
+    try:
+        mailer.deliver(subject, body)
+    except Exception as e:
+        _failed(batch, e)
+        return
+    with _lock:
+        delivered = {p for p, _ in batch}
+        _pending[:] = [(p, i) for p, i in _pending if p not in delivered]
+    for path, _ in batch:
+        _remove(path)
+
+def _failed(batch, error):
+    attempts = max(i["attempts"] for _, i in batch) + 1
+    if attempts >= MAX_ATTEMPTS:
+        audit.log(f"Email failure: giving up after {attempts} attempts ({len(batch)} message(s) moved to outbox/failed): {str(error)}", "ERROR")
+        os.makedirs(FAILED_DIR, exist_ok=True)
+        with _lock:
+            dropped = {p for p, _ in batch}
+            _pending[:] = [(p, i) for p, i in _pending if p not in dropped]
+        for path, _ in batch:
+            try:
+                os.replace(path, os.path.join(FAILED_DIR, os.path.basename(path)))
+            except OSError:
+                _remove(path)
+        return
+
+    delay = min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+    audit.log(f"Email failure (attempt {attempts}, retry in {delay:.0f}s): {str(error)}", "ERROR")
+    retry_at = time.time() + delay
+    for path, item in batch:
+        item["attempts"] = attempts
+        item["next_attempt"] = retry_at
+        try:
+            atomic_write_json(path, item, indent=None)
+        except Exception:
+            pass # Retry state is best effort; the message itself is still on disk
+
+def _run():
+    while not _stop.is_set():
+        with _lock:
+            _load()
+            if _pending and not mailer.enabled():
+                # Email switched off: drop what is queued instead of sending later
+                audit.log(f"Outbox: email disabled, discarding {len(_pending)} queued message(s)", "MAILER")
+                for path, _ in _pending:
+                    _remove(path)
+                _pending.clear()
+            batch, wait = _due_batch(time.time())
+
+        if batch:
+            _deliver(batch)
+            continue
+
+        mailer.session.close_if_idle()
+        _wake.wait(ADOPT_INTERVAL if wait is None else min(max(wait, 0.05), ADOPT_INTERVAL))
+        _wake.clear()
+
+def start():
+    """Start the delivery worker (idempotent)."""
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="sentinelmesh-outbox", daemon=True)
+    _thread.start()
+
+def stop(timeout: float = 10.0):
+    """Stop the worker. Undelivered messages stay on disk for the next start."""
+    global _thread
+    if not _thread:
+        return
+    _stop.set()
+    _wake.set()
+    _thread.join(timeout)
+    _thread = None
+    mailer.session.close()
+
+def drain(timeout: float = 10.0) -> bool:
+    """Wait until the queue is empty (digest windows still apply)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pending_count() == 0:
+            return True
+        time.sleep(0.05)
+    return False
@@ -0,0 +1,186 @@
+import os
+import struct
+import bisect
+import datetime
+import threading
+from . import audit
+
+# Paths
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+PRESENCE_FILE = os.path.join(DATA_DIR, "presence.bin")
+
+# Per-device presence as sessions: one record per stretch a MAC was on the
+# network, written when the device goes idle. Scans in between only move
+# last_seen in the device store, so the file grows with state changes,
+# not with scans x devices.
+#
+# File layout (like history/*.seg):
+#   header: magic "SMPS", version u16, record size u16, 8 bytes reserved
+#   records: mac 6 bytes, start u32, end u32 (epoch seconds)
+# Records are appended in the order sessions end.
+MAGIC = b"SMPS"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+RECORD = struct.Struct("<6sII")
+
+DEFAULT_WINDOW = 7 * 86400
+
+def mac_bytes(mac: str):
+    """'AA:BB:CC:DD:EE:FF' (or '-' separated) -> 6 bytes, None if not a MAC."""
+    try:
+        raw = bytes.fromhex((mac or "").replace(":", "").replace("-", ""))
+    except ValueError:
+        return None
+    return raw if len(raw) == 6 else None
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+class PresenceStore:
+    """
+    Append-only session file plus an in-memory interval index:
+    mac -> (ends, starts), ordered by end so a window's first overlapping
+    session is found by binary search.
+    """
+
+    def __init__(self, path=PRESENCE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = None
+        self.file = None
+
+    def _load(self):
+        if self.index is not None:
+            return
+        self.index = {}
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) < HEADER.size:
+            return
+        magic, version, size = HEADER.unpack_from(data)
+        if magic != MAGIC or size != RECORD.size:
+            raise ValueError(f"Unrecognized presence format: {self.path}")
+        n = (len(data) - HEADER.size) // RECORD.size
+        body = memoryview(data)[HEADER.size:HEADER.size + n * RECORD.size]
+        for mac, start, end in RECORD.iter_unpack(body):
+            self._index(mac, start, end)
+
+    def _index(self, mac, start, end):
+        ends, starts = self.index.setdefault(mac, ([], []))
+        i = bisect.bisect_right(ends, end)
+        ends.insert(i, end)
+        starts.insert(i, start)
+
+    def _open(self):
+        if self.file is not None:
+            return self.file
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size < HEADER.size:
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        else:
+            # Drop a torn trailing record left by a crash
+            valid = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+            if valid != size:
+                os.truncate(self.path, valid)
+        self.file = open(self.path, "ab")
+        return self.file
+
+    def record(self, mac: str, start: float, end: float):
+        """Close a session: the MAC was present from start to end."""
+        raw = mac_bytes(mac)
+        if raw is None or start is None or end is None:
+            return
+        start, end = int(start), int(end + 0.999)
+        if end < start:
+            start = end
+        with self.lock:
+            try:
+                self._load()
+                f = self._open()
+                f.write(RECORD.pack(raw, start, end))
+                f.flush()
+            except Exception as e:
+                audit.log(f"Failed to save presence: {str(e)}", "ERROR")
+                self.close()
+                return
+            self._index(raw, start, end)
+
+    def sessions(self, mac: str, since: float, until: float):
+        """Closed sessions of a MAC overlapping [since, until), as (start, end)."""
+        raw = mac_bytes(mac)
+        with self.lock:
+            self._load()
+            ends, starts = self.index.get(raw, ((), ()))
+            lo = bisect.bisect_right(ends, since)
+            return [(starts[i], ends[i]) for i in range(lo, len(ends)) if starts[i] < until]
+
+    def known(self, mac: str) -> bool:
+        with self.lock:
+            self._load()
+            return mac_bytes(mac) in self.index
+
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except Exception:
+                pass
+            self.file = None
+
+def presence(store: PresenceStore, mac: str, since: float, until: float, open_sessions=()):
+    """
+    Intervals a MAC was on the network within [since, until) and its uptime.
+    open_sessions: (start, None) for sessions still running (device active now).
+    """
+    intervals = [(s, e, False) for s, e in store.sessions(mac, since, until)]
+    intervals += [(s, until, True) for s, _ in open_sessions if s < until]
+
+    # Clip to the window and merge overlaps (one MAC can hold several IPs)
+    merged = []
+    for start, end, running in sorted(intervals):
+        start, end = max(start, since), min(end, until)
+        if end < start:
+            continue
+        if merged and start <= merged[-1][1]:
+            last = merged[-1]
+            merged[-1] = (last[0], max(last[1], end), last[2] or running)
+        else:
+            merged.append((start, end, running))
+
+    online = sum(end - start for start, end, _ in merged)
+    return {
+        "mac": mac.upper(),
+        "since": _iso(since),
+        "until": _iso(until),
+        "uptime_percent": round(100.0 * online / (until - since), 2),
+        "online_seconds": round(online),
+        "intervals": [{"start": _iso(s), "end": _iso(e), "open": running} for s, e, running in merged]
+    }
+
+_store = PresenceStore()
+
+def get_store() -> PresenceStore:
+    return _store
+
+def reload() -> PresenceStore:
+    """Forget the in-memory index; the next use reads the file again (written by another worker)."""
+    global _store
+    old = _store
+    with old.lock:
+        old.close()
+    _store = PresenceStore(old.path)
+    return _store
@@ -1,61 +1,40 @@
 import os
-import json
-import subprocess
-import re
+import time
 import datetime
+import threading
 from . import audit
-import psutil
+from . import neighbors
+from . import devicestore
+from . import presence
+from . import oui
+from . import metrics
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-DEVICES_FILE = os.path.join(DATA_DIR, "devices.json")
+DEVICES_FILE = devicestore.DEVICES_FILE
+
+# When scan_devices() last ran, and devices changed since take_changes()
+last_scan = None
+_changes = []
+_merge_lock = threading.RLock() # Scans and discovery sweeps merge from different threads
 
 def load_devices():
-    """Load existing devices from JSON."""
-    if not os.path.exists(DEVICES_FILE):
-        return []
-    try:
-        with open(DEVICES_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return []
+    """All known devices (from the device store)."""
+    return devicestore.get_store().all()
 
 def save_devices(devices):
-    """Save devices to JSON."""
-    try:
-        with open(DEVICES_FILE, "w") as f:
-            json.dump(devices, f, indent=2)
-    except Exception as e:
-        audit.log(f"Failed to save devices: {str(e)}", "ERROR")
+    """Replace all devices (rewrites devices.json)."""
+    devicestore.get_store().replace_all(devices)
 
 def get_arp_table():
     """
     Get ARP table from OS (passive discovery).
     Returns list of dicts: {'ip': str, 'mac': str}
+    Source is pluggable, see neighbors.py.
     """
     devices = []
     try:
-        # Run arp -a
-        output = subprocess.check_output("arp -a", shell=True).decode("utf-8", errors="ignore")
-        
-        # Regex for IP and MAC (Windows format)
-        # Interface: 192.168.1.5 --- 0x10
-        #   Internet Address      Physical Address      Type
-        #   192.168.1.1           ab-cd-ef-12-34-56     dynamic
-        
-        # Pattern to capture IP and MAC
-        pattern = re.compile(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+([a-fA-F0-9-]{17})\s+")
-        
-        for line in output.splitlines():
-            match = pattern.search(line)
-            if match:
-                ip = match.group(1)
-                mac = match.group(2).replace("-", ":").upper()
-                # Filter out multicast/broadcast
-                if ip.startswith("224.") or ip.startswith("239.") or ip == "255.255.255.255":
-                    continue
-                devices.append({"ip": ip, "mac": mac})
-                
+        devices = neighbors.get_neighbors()
     except Exception as e:
         audit.log(f"ARP scan failed: {str(e)}", "ERROR")
         
@@ -63,81 +42,119 @@ def get_arp_table():
 
 def get_last_scan_time():
     """Return the timestamp of the last scan or 'never'."""
-    # We'll infer this from the audit log or metadata in future.
-    # For now, just return a simple state or check file mod time.
-    if os.path.exists(DEVICES_FILE):
-        try:
-            mtime = os.path.getmtime(DEVICES_FILE)
-            dt = datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc)
-            return dt.isoformat()
-        except:
-            pass
+    if last_scan is not None:
+        return last_scan
+    # Before the first scan of this run: last change on disk
+    modified = devicestore.get_store().modified()
+    if modified:
+        return datetime.datetime.fromtimestamp(modified, datetime.timezone.utc).isoformat()
     return "never"
 
+def _report(transitions):
+    """Emit aging transitions as events (stream + one audit line per kind)."""
+    counts = {}
+    for old, device in transitions:
+        if old == "active":
+            _close_session(device)
+        key = f"{old} -> {device['status']}"
+        counts[key] = counts.get(key, 0) + 1
+        _changes.append(device)
+    if counts:
+        summary = ", ".join(f"{n} {key}" for key, n in counts.items())
+        audit.log(f"Device status changed: {summary}", "SCANNER")
+
+def _close_session(device):
+    """Record the presence session that ended at the device's last_seen."""
+    end = devicestore.seen_ts(device)
+    presence.get_store().record(device.get("mac"), device.get("session_start", end), end)
+
+def age_devices() -> int:
+    """Apply due status transitions (cheap when nothing is due). Returns how many."""
+    with _merge_lock:
+        transitions = devicestore.get_store().expire()
+        _report(transitions)
+    return len(transitions)
+
+def take_changes():
+    """Devices changed (scan, discovery or aging) since the last call, for the live stream."""
+    global _changes
+    with _merge_lock:
+        changes, _changes = _changes, []
+    return changes
+
+@metrics.timed("scanner.scan_devices")
 def scan_devices():
     """
     Main scan logic.
-    1. Load existing devices.
-    2. Get current ARP table.
-    3. Merge and update timestamps.
-    4. Save.
-    5. Return full list.
+    1. Get current ARP table.
+    2. Merge into the device store (indexed by IP).
+    3. Persist only what changed; age out devices that are due.
+    4. Return full list.
     """
+    global last_scan
     audit.log("Device scan started", "SCANNER")
-    
-    known = {d["ip"]: d for d in load_devices()}
+
     current = get_arp_table()
-    
-    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    # Process found devices
-    for d in current:
-        ip = d["ip"]
-        mac = d["mac"]
-        
-        if ip in known:
-            known[ip]["last_seen"] = now
-            known[ip]["mac"] = mac # Update MAC if changed (rare)
-            known[ip]["status"] = "active"
-        else:
-            known[ip] = {
-                "ip": ip,
-                "mac": mac,
-                "first_seen": now,
-                "last_seen": now,
-                "status": "active"
-            }
-            
-    # Update status for devices NOT seen
-    # If not seen in 5 mins -> active (tolerance)
-    # If not seen in 24 hours -> idle
-    # If not seen in 7 days -> archived
-    
-    found_ips = set(d["ip"] for d in current)
-    result_list = []
-    
-    for ip, device in known.items():
-        if ip not in found_ips:
-            # Check how long since last_seen
-            try:
-                last = datetime.datetime.fromisoformat(device["last_seen"])
-                delta = datetime.datetime.now(datetime.timezone.utc) - last
-                
-                if delta.total_seconds() > 7 * 86400: # 7 days
-                    device["status"] = "archived"
-                elif delta.total_seconds() > 86400: # 24 hours
-                    device["status"] = "idle"
-                else:
-                    # Keep as active for a bit of tolerance, strictly if not in scan it might be just quiet
-                    # But prompt says "Active = seen in last 5 min".
-                    if delta.total_seconds() > 300: # 5 mins
-                         if device["status"] == "active":
-                             device["status"] = "idle" # Fallback to idle if > 5 mins
-            except:
-                pass
-        
-        result_list.append(device)
-        
-    save_devices(result_list)
-    audit.log(f"Device scan complete. Found {len(current)} active devices.", "SCANNER")
-    return result_list
+    changed = merge(current)
+    last_scan = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    audit.log(f"Device scan complete. Found {len(current)} active devices ({changed} changed).", "SCANNER")
+    return devicestore.get_store().all()
+
+@metrics.timed("scanner.merge")
+def merge(current) -> int:
+    """
+    Merge neighbor entries ({'ip', 'mac'}) into the device store: from a
+    scan, or streamed in by an active discovery sweep. Returns how many
+    devices changed.
+    """
+    with _merge_lock:
+        store = devicestore.get_store()
+        now_ts = time.time()
+        now = datetime.datetime.fromtimestamp(now_ts, datetime.timezone.utc).isoformat()
+
+        changed = []
+        seen = []
+        unresolved = [] # New or changed MACs that need a vendor lookup
+
+        # Process found devices
+        for d in current:
+            ip = d["ip"]
+            mac = d["mac"]
+            known = store.get(ip)
+
+            if known is None:
+                device = {
+                    "ip": ip,
+                    "mac": mac,
+                    "first_seen": now,
+                    "last_seen": now,
+                    "last_seen_ts": now_ts,
+                    "session_start": now_ts,
+                    "status": "active"
+                }
+                changed.append(device)
+                unresolved.append(device)
+            elif known["mac"] != mac or known["status"] != "active":
+                # Update MAC if changed (rare) / back from idle: a new presence session
+                if known["status"] == "active":
+                    _close_session(known)
+                device = dict(known, mac=mac, status="active", last_seen=now, last_seen_ts=now_ts, session_start=now_ts)
+                changed.append(device)
+                if known["mac"] != mac or "mac_vendor" not in known:
+                    unresolved.append(device)
+            elif "mac_vendor" not in known:
+                # Known from before vendor enrichment
+                device = dict(known, last_seen=now, last_seen_ts=now_ts)
+                changed.append(device)
+                unresolved.append(device)
+            else:
+                seen.append(ip)
+
+        oui.enrich(unresolved)
+        store.apply_changes(changed, seen, (now, now_ts))
+        _changes.extend(changed)
+
+        # Devices NOT seen age lazily: active -> idle after 5 min, archived after 7 days
+        _report(store.expire(now_ts))
+        return len(changed)
@@ -0,0 +1,229 @@
+import time
+import datetime
+import threading
+from . import audit
+from . import config
+from . import scanner
+from . import devicestore
+from . import discovery
+from . import baseline
+from . import analyzer
+from . import alerts
+from . import explain
+from . import stream
+from . import segments
+
+# Default tick intervals (seconds). Override in environment.json:
+# "scan_interval", "aging_interval", "discovery_interval", "baseline_interval",
+# "analysis_interval", "maintenance_interval"
+DEFAULT_INTERVALS = {
+    "scan": 30,
+    "aging": 5,
+    "discovery": 300,
+    "baseline": 30,
+    "analysis": 10,
+    "maintenance": 60
+}
+
+# Latest published results. Endpoints read this, never the collectors.
+_snapshot = {
+    "devices": None,
+    "analysis": None,
+    "scanned_at": None,
+    "analyzed_at": None
+}
+_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+_read_only = False
+
+def get_interval(task: str) -> float:
+    """Return configured interval for a tick, never below 1s."""
+    try:
+        value = float(config.get(f"{task}_interval", DEFAULT_INTERVALS[task]))
+    except (TypeError, ValueError):
+        value = DEFAULT_INTERVALS[task]
+    return max(value, 1.0)
+
+def _publish(**values):
+    """Swap new values into the snapshot."""
+    with _lock:
+        _snapshot.update(values)
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def scan_tick():
+    """Refresh the device list from the OS."""
+    devices = scanner.scan_devices()
+    _publish(devices=devices, scanned_at=_now())
+
+def aging_tick():
+    """Apply device status transitions that came due between scans."""
+    if scanner.age_devices() and _snapshot["devices"] is not None:
+        _publish(devices=scanner.load_devices())
+
+def _discovered(batch):
+    """Neighbors streamed in by an active discovery sweep (discovery thread)."""
+    if scanner.merge(batch):
+        _publish(devices=scanner.load_devices())
+
+def discovery_tick():
+    """Start an active subnet sweep in the background (opt-in, see discovery.py)."""
+    if _read_only or not discovery.enabled():
+        return
+    discovery.start(_discovered)
+
+def baseline_tick():
+    """Feed the latest device list into baseline learning."""
+    devices = _snapshot["devices"]
+    if devices is None:
+        return # Nothing scanned yet
+    baseline.update(devices)
+
+def analysis_tick():
+    """Score current metrics and raise alerts if needed."""
+    result = analyzer.analyze()
+
+    # Trigger Alert if Risk is High
+    if result["score"] >= 50 and not _read_only: # Don't spam alerts if broken
+        severity = "Critical" if result["score"] >= 80 else "Warning"
+        alerts.log_alert("High Risk", severity, result["explanation"], f"Score: {result['score']}")
+    if not _read_only:
+        alerts.sweep() # Summarize alert storms that went quiet
+
+    _publish(analysis=result, analyzed_at=_now())
+
+def maintenance_tick():
+    """Roll, compress and expire log segments (see segments.py)."""
+    if _read_only:
+        return
+    segments.maintain()
+
+# Order matters on the first pass: scan -> baseline -> analysis
+TASKS = {
+    "scan": scan_tick,
+    "aging": aging_tick,
+    "discovery": discovery_tick,
+    "baseline": baseline_tick,
+    "analysis": analysis_tick,
+    "maintenance": maintenance_tick
+}
+
+def _run(on_pass):
+    next_due = {name: 0.0 for name in TASKS}
+    while not _stop.is_set():
+        ran = set()
+        for name, tick in TASKS.items():
+            if _stop.is_set():
+                break
+            if time.monotonic() >= next_due[name]:
+                try:
+                    tick()
+                except Exception as e:
+                    # Never let one failed tick kill the collector
+                    audit.log(f"Scheduler {name} tick failed: {str(e)}", "ERROR")
+                next_due[name] = time.monotonic() + get_interval(name)
+                ran.add(name)
+
+        if ran:
+            # Push what changed to live dashboards (computed once for all clients)
+            changes = scanner.take_changes()
+            stream.publish_tick(health_summary(), changes or None, devicestore.get_store().count())
+            if on_pass:
+                on_pass()
+
+        wait = min(next_due.values()) - time.monotonic()
+        _stop.wait(max(wait, 0.05))
+
+def start(read_only: bool = False, on_pass=None):
+    """
+    Start background collection (idempotent).
+    on_pass() runs after every pass that ran a tick (the coordinator publishes state there).
+    """
+    global _thread, _read_only
+    _read_only = read_only
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(on_pass,), name="sentinelmesh-scheduler", daemon=True)
+    _thread.start()
+    audit.log("Collection scheduler started", "SYSTEM")
+
+def stop(timeout: float = 10.0):
+    """Stop background collection and wait for the current tick."""
+    global _thread
+    if not _thread:
+        return
+    _stop.set()
+    _thread.join(timeout)
+    _thread = None
+    discovery.stop()
+    audit.log("Collection scheduler stopped", "SYSTEM")
+
+def is_running() -> bool:
+    return bool(_thread and _thread.is_alive())
+
+def export_state() -> dict:
+    """What other workers need to serve reads (written by the coordinator)."""
+    with _lock:
+        return {
+            "analysis": _snapshot["analysis"],
+            "scanned_at": _snapshot["scanned_at"],
+            "analyzed_at": _snapshot["analyzed_at"],
+            "last_scan": scanner.last_scan,
+            "read_only": _read_only
+        }
+
+def follow(state: dict, devices=None):
+    """Adopt the collector's published state (worker that does not collect)."""
+    global _read_only
+    _read_only = bool(state.get("read_only"))
+    scanner.last_scan = state.get("last_scan")
+    values = {k: state.get(k) for k in ("analysis", "scanned_at", "analyzed_at")}
+    if devices is not None:
+        values["devices"] = devices
+    _publish(**values)
+
+def get_snapshot():
+    """Return a shallow copy of the latest published results."""
+    with _lock:
+        return dict(_snapshot)
+
+def latest_devices():
+    """Latest scanned devices, or the persisted list before the first scan."""
+    devices = _snapshot["devices"]
+    if devices is None:
+        return scanner.load_devices()
+    return devices
+
+def latest_analysis():
+    """Latest risk analysis, or a neutral placeholder before the first tick."""
+    result = _snapshot["analysis"]
+    if result is None:
+        return {
+            "score": 0,
+            "status": "Normal",
+            "explanation": "Collecting first sample.",
+            "metrics": {}
+        }
+    return result
+
+def health_summary():
+    """Payload for GET / and the live stream."""
+    status = "ok"
+    risk_analysis = latest_analysis()
+
+    explanations = {
+        "risk": risk_analysis["explanation"],
+        "data": explain.explain_missing_data("network_map"),
+        "state": explain.explain_status(status)
+    }
+
+    return {
+        "status": status,
+        "mode": "read-only" if _read_only else "read-write",
+        "risk_score": risk_analysis["score"],
+        "risk_status": risk_analysis["status"],
+        "explanations": explanations
+    }
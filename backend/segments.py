@@ -0,0 +1,383 @@
+import os
+import json
+import gzip
+import time
+import queue
+import shutil
+import datetime
+import threading
+from . import audit
+from . import alerts
+from . import config
+from . import fileio
+from . import series
+
+# Segmented storage for the append-only text logs (audit.log, alerts.csv).
+#
+# The active file keeps its usual name, so writers and the timeline tail
+# only ever touch it. When it gets too big or too old it is sealed: moved
+# to data/archive/<log>/, recorded in the manifest with its time range,
+# and gzip-compressed by a background thread. Retention drops the oldest
+# sealed segments by age and total size. The binary history store is
+# already segmented; it only gets the retention pass.
+#
+# Settings in environment.json:
+#   log_segment_bytes       seal the active file past this size (default 16 MiB)
+#   log_segment_age         ...or once its first line is this old, seconds (default 1 day)
+#   log_retention_days      drop sealed segments older than this (default 90)
+#   log_retention_bytes     ...and keep each log's archive under this (default 512 MiB)
+#   history_retention_days  drop history segments older than this (default 365)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+MANIFEST_FILE = os.path.join(ARCHIVE_DIR, "manifest.json")
+
+DEFAULTS = {
+    "log_segment_bytes": 16 * 1024 * 1024,
+    "log_segment_age": 86400,
+    "log_retention_days": 90,
+    "log_retention_bytes": 512 * 1024 * 1024,
+    "history_retention_days": 365
+}
+
+# Bytes read from each end of a file to find its first / last timestamp
+EDGE_BYTES = 4096
+
+def setting(name: str) -> float:
+    try:
+        return max(float(config.get(name, DEFAULTS[name])), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULTS[name]
+
+def _epoch(text: str):
+    try:
+        dt = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def audit_time(line: str):
+    """[ISO] [LEVEL] Message -> epoch"""
+    if line.startswith("[") and "]" in line:
+        return _epoch(line[1:line.index("]")])
+    return None
+
+def alert_time(line: str):
+    """ISO,type,severity,message -> epoch"""
+    return _epoch(line.split(",", 1)[0])
+
+class Log:
+    """One segmented log: where it lives, how to seal it, how to date a line."""
+
+    def __init__(self, name, path, rotate, line_time, suffix):
+        self.name = name
+        self._path = path # Callable: writers may repoint their module path
+        self.rotate = rotate
+        self.line_time = line_time
+        self.suffix = suffix
+
+    @property
+    def path(self):
+        return self._path()
+
+    @property
+    def directory(self):
+        return os.path.join(ARCHIVE_DIR, self.name)
+
+LOGS = {
+    "audit": Log("audit", lambda: audit.LOG_FILE, audit.rotate, audit_time, ".log"),
+    "alerts": Log("alerts", lambda: alerts.ALERTS_FILE, alerts.rotate, alert_time, ".csv")
+}
+
+def edge_times(path, line_time):
+    """(first, last) line timestamps of a plain text file, reading only its ends."""
+    first = last = None
+    try:
+        with open(path, "rb") as f:
+            head = f.read(EDGE_BYTES)
+            for line in head.decode("utf-8", errors="replace").splitlines():
+                first = line_time(line)
+                if first is not None:
+                    break
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - EDGE_BYTES))
+            tail = f.read().decode("utf-8", errors="replace").splitlines()
+            for line in reversed(tail):
+                last = line_time(line)
+                if last is not None:
+                    break
+    except OSError:
+        pass
+    return first, last
+
+class Manifest:
+    """
+    {log: [segment, ...]} oldest first. A segment is
+    {"file", "start", "end", "bytes", "stored", "inode", "sealed"}
+    ("file" is relative to the archive dir and ends in .gz once compressed).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.doc = None
+        self.stamp = None
+
+    def _load(self):
+        stamp = fileio.file_stamp(self.path)
+        if self.doc is not None and stamp == self.stamp:
+            return
+        self.stamp = stamp
+        try:
+            with open(self.path, "r") as f:
+                self.doc = json.load(f)
+        except (OSError, ValueError):
+            self.doc = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fileio.atomic_write_json(self.path, self.doc)
+        self.stamp = fileio.file_stamp(self.path)
+
+    def segments(self, name):
+        with self.lock:
+            self._load()
+            return [dict(s) for s in self.doc.get(name, [])]
+
+    def add(self, name, segment):
+        with self.lock:
+            self._load()
+            self.doc.setdefault(name, []).append(segment)
+            self._save()
+
+    def update(self, name, current, **values):
+        with self.lock:
+            self._load()
+            for segment in self.doc.get(name, []):
+                if segment["file"] == current:
+                    segment.update(values)
+                    self._save()
+                    return True
+            return False
+
+    def remove(self, name, files):
+        with self.lock:
+            self._load()
+            self.doc[name] = [s for s in self.doc.get(name, []) if s["file"] not in files]
+            self._save()
+
+_manifest = Manifest(MANIFEST_FILE)
+_compress_queue = queue.Queue()
+_compressor = None
+_start_lock = threading.Lock()
+
+def segments(name, since=None, until=None):
+    """Sealed segments of a log overlapping [since, until), oldest first."""
+    out = []
+    for segment in _manifest.segments(name):
+        if since is not None and segment["end"] is not None and segment["end"] < since:
+            continue
+        if until is not None and segment["start"] is not None and segment["start"] >= until:
+            continue
+        out.append(segment)
+    return out
+
+def segment_path(segment):
+    return os.path.join(ARCHIVE_DIR, segment["file"])
+
+def open_segment(segment):
+    """Binary file object for a sealed segment (compressed or not)."""
+    path = segment_path(segment)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        # Compressed since the caller read the manifest
+        return gzip.open(path + ".gz", "rb")
+
+def sealed_by_inode(name, inode):
+    """The sealed segment that used to be the active file with this inode."""
+    for segment in reversed(_manifest.segments(name)):
+        if segment.get("inode") == inode:
+            return segment
+    return None
+
+def iter_lines(name, since=None, until=None):
+    """Raw lines (bytes) of a log, sealed segments overlapping the range first, then the active file."""
+    log = LOGS[name]
+    for segment in segments(name, since, until):
+        try:
+            with open_segment(segment) as f:
+                yield from f
+        except OSError:
+            continue # Removed by retention meanwhile
+    if until is None or (edge_times(log.path, log.line_time)[0] or 0) < until:
+        try:
+            with open(log.path, "rb") as f:
+                yield from f
+        except OSError:
+            pass
+
+def _next_name(log):
+    existing = _manifest.segments(log.name)
+    seq = 1
+    if existing:
+        seq = int(os.path.basename(existing[-1]["file"]).split("-")[1].split(".")[0]) + 1
+    return f"{log.name}-{seq:08d}{log.suffix}"
+
+def seal(log) -> bool:
+    """Move the active file into the archive now. Returns True if it was sealed."""
+    try:
+        if os.path.getsize(log.path) == 0:
+            return False
+    except OSError:
+        return False
+
+    os.makedirs(log.directory, exist_ok=True)
+    name = _next_name(log)
+    dest = os.path.join(log.directory, name)
+
+    def move():
+        # Under the writer lock: nothing can be appended between the stat
+        # and the move, and readers find the segment by inode as soon as
+        # the active file is new.
+        try:
+            st = os.stat(log.path)
+        except OSError:
+            return False
+        if st.st_size == 0:
+            return False
+        os.replace(log.path, dest)
+        start, end = edge_times(dest, log.line_time)
+        _manifest.add(log.name, {
+            "file": f"{log.name}/{name}",
+            "start": start,
+            "end": end,
+            "bytes": st.st_size,
+            "stored": st.st_size,
+            "inode": st.st_ino,
+            "sealed": time.time()
+        })
+        return True
+    if not log.rotate(move):
+        return False
+
+    _start_compressor()
+    _compress_queue.put((log.name, f"{log.name}/{name}"))
+    return True
+
+def should_seal(log, now: float) -> bool:
+    try:
+        size = os.path.getsize(log.path)
+    except OSError:
+        return False
+    if size == 0:
+        return False
+    if size >= setting("log_segment_bytes"):
+        return True
+    first, _ = edge_times(log.path, log.line_time)
+    return first is not None and now - first >= setting("log_segment_age")
+
+def compress(name, file):
+    """gzip one sealed segment next to itself, then swap the manifest entry over."""
+    src = os.path.join(ARCHIVE_DIR, file)
+    if not os.path.exists(src):
+        return
+    tmp = src + ".gz.part"
+    try:
+        with open(src, "rb") as fin, gzip.open(tmp, "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, src + ".gz")
+    except OSError as e:
+        audit.log(f"Segment compression failed for {file}: {str(e)}", "ERROR")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    _manifest.update(name, file, file=file + ".gz", stored=os.path.getsize(src + ".gz"))
+    os.remove(src)
+
+def _compress_loop():
+    while True:
+        name, file = _compress_queue.get()
+        try:
+            compress(name, file)
+        except Exception as e:
+            audit.log(f"Segment compression failed for {file}: {str(e)}", "ERROR")
+
+def _start_compressor():
+    global _compressor
+    with _start_lock:
+        if _compressor is not None:
+            return
+        _compressor = threading.Thread(target=_compress_loop, name="sentinelmesh-compress", daemon=True)
+        _compressor.start()
+        # Pick up segments sealed but not compressed before a restart
+        for name in LOGS:
+            for segment in _manifest.segments(name):
+                if not segment["file"].endswith(".gz"):
+                    _compress_queue.put((name, segment["file"]))
+
+def apply_retention(log, now: float) -> int:
+    """Drop the oldest sealed segments past the age / size limits."""
+    days = setting("log_retention_days")
+    budget = setting("log_retention_bytes")
+    existing = _manifest.segments(log.name)
+    total = sum(s["stored"] for s in existing)
+    doomed = []
+    for segment in existing:
+        # 0 disables a limit
+        too_old = bool(days) and segment["end"] is not None and segment["end"] < now - days * 86400
+        too_big = bool(budget) and total > budget
+        if not (too_old or too_big):
+            break
+        doomed.append(segment["file"])
+        total -= segment["stored"]
+    if not doomed:
+        return 0
+    _manifest.remove(log.name, set(doomed))
+    for file in doomed:
+        for path in (os.path.join(ARCHIVE_DIR, file), os.path.join(ARCHIVE_DIR, file) + ".gz"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return len(doomed)
+
+def maintain():
+    """Seal, compress and expire. Runs on the scheduler's maintenance tick."""
+    now = time.time()
+    _start_compressor()
+    for log in LOGS.values():
+        try:
+            if should_seal(log, now) and seal(log):
+                audit.log(f"Log segment sealed: {log.name}", "SYSTEM")
+            dropped = apply_retention(log, now)
+            if dropped:
+                audit.log(f"Retention removed {dropped} {log.name} segment(s)", "SYSTEM")
+        except Exception as e:
+            audit.log(f"Log maintenance failed for {log.name}: {str(e)}", "ERROR")
+
+    days = setting("history_retention_days")
+    if days:
+        dropped = series.get_store().drop_before(now - days * 86400)
+        if dropped:
+            audit.log(f"Retention removed {dropped} history segment(s)", "SYSTEM")
+
+def usage():
+    """Archive footprint per log (for /health)."""
+    out = {}
+    for name in LOGS:
+        existing = _manifest.segments(name)
+        out[name] = {
+            "segments": len(existing),
+            "bytes": sum(s["bytes"] for s in existing),
+            "stored": sum(s["stored"] for s in existing)
+        }
+    out["history"] = {"segments": len(series.get_store().segments()), "stored": series.get_store().size_bytes()}
+    return out
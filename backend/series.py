@@ -0,0 +1,304 @@
+import os
+import mmap
+import struct
+import datetime
+import threading
+from . import audit
+from . import metrics
+
+# Paths
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+SERIES_DIR = os.path.join(DATA_DIR, "history")
+LEGACY_CSV = os.path.join(DATA_DIR, "history.csv")
+
+# Segment file layout:
+#   header: magic "SMTS", version u16, record size u16, 8 bytes reserved
+#   records: timestamp f64 (epoch s), total u32, dns u16, score u8, anomalies u8
+# All little-endian, fixed width, sorted by timestamp (append-only).
+MAGIC = b"SMTS"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+RECORD = struct.Struct("<dIHBB")
+TIMESTAMP = struct.Struct("<d")
+
+# ~30 days at a 10s analysis interval (4MB per segment)
+SEGMENT_RECORDS = 262144
+
+CSV_HEADER = "timestamp,total,dns,risk,anomalies\n"
+
+def _clamp(value, top):
+    return max(0, min(int(value), top))
+
+def to_iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+class Segment:
+    """One append-only file of fixed-width records."""
+
+    def __init__(self, path):
+        self.path = path
+        self.start = int(os.path.basename(path).split(".")[0]) / 1000.0
+
+    def count(self) -> int:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        return max(0, (size - HEADER.size) // RECORD.size)
+
+    def open_map(self):
+        """Map the segment read-only. Returns (mmap or None, record count)."""
+        n = self.count()
+        if n == 0:
+            return None, 0
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mm, n
+
+    @staticmethod
+    def lower_bound(mm, n, ts) -> int:
+        """First record index with timestamp >= ts (binary search)."""
+        lo, hi = 0, n
+        unpack = TIMESTAMP.unpack_from
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if unpack(mm, HEADER.size + mid * RECORD.size)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def upper_bound(mm, n, ts) -> int:
+        """First record index with timestamp > ts."""
+        lo, hi = 0, n
+        unpack = TIMESTAMP.unpack_from
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if unpack(mm, HEADER.size + mid * RECORD.size)[0] <= ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def records(mm, i, j):
+        return list(RECORD.iter_unpack(mm[HEADER.size + i * RECORD.size:HEADER.size + j * RECORD.size]))
+
+class SeriesStore:
+    """
+    Segmented, append-only binary store for analyzer samples.
+    Reads mmap the segments and binary search on timestamp.
+    """
+
+    def __init__(self, root=SERIES_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self._segments = None
+        self._active = None # (Segment, file handle, record count)
+        self._last_ts = None
+
+    def segments(self):
+        if self._segments is None:
+            try:
+                names = sorted(n for n in os.listdir(self.root) if n.endswith(".seg"))
+            except OSError:
+                names = []
+            self._segments = [Segment(os.path.join(self.root, n)) for n in names]
+        return self._segments
+
+    def invalidate(self):
+        """Forget cached segment list (after retention / external changes)."""
+        with self.lock:
+            self._close_active()
+            self._segments = None
+            self._last_ts = None
+
+    def _close_active(self):
+        if self._active:
+            try:
+                self._active[1].close()
+            except Exception:
+                pass
+            self._active = None
+
+    def _new_segment(self, ts):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{int(ts * 1000):016d}.seg")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        segment = Segment(path)
+        self.segments().append(segment)
+        return segment
+
+    def _open_active(self, ts):
+        segments = self.segments()
+        if self._active is None and segments:
+            segment = segments[-1]
+            with open(segment.path, "rb") as f:
+                magic, version, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or size != RECORD.size:
+                raise ValueError(f"Unrecognized segment format: {segment.path}")
+            # Drop a torn trailing record left by a crash
+            n = segment.count()
+            valid = HEADER.size + n * RECORD.size
+            if os.path.getsize(segment.path) != valid:
+                os.truncate(segment.path, valid)
+            self._active = (segment, open(segment.path, "ab"), n)
+            if n:
+                with open(segment.path, "rb") as f:
+                    f.seek(HEADER.size + (n - 1) * RECORD.size)
+                    self._last_ts = TIMESTAMP.unpack(f.read(TIMESTAMP.size))[0]
+
+        if self._active is None or self._active[2] >= SEGMENT_RECORDS:
+            self._close_active()
+            segment = self._new_segment(ts)
+            self._active = (segment, open(segment.path, "ab"), 0)
+        return self._active
+
+    def append(self, ts, total, dns, score, anomalies):
+        with self.lock:
+            # Keep the file sorted even if the wall clock steps back
+            if self._last_ts is not None and ts <= self._last_ts:
+                ts = self._last_ts + 1e-6
+            segment, f, n = self._open_active(ts)
+            f.write(RECORD.pack(ts, _clamp(total, 0xFFFFFFFF), _clamp(dns, 0xFFFF), _clamp(score, 0xFF), _clamp(anomalies, 0xFF)))
+            f.flush()
+            metrics.io("history", written=RECORD.size) # One label for all segments
+            self._active = (segment, f, n + 1)
+            self._last_ts = ts
+
+    def range(self, since=None, until=None):
+        """Records with since <= ts < until, oldest first."""
+        return list(self.iter_range(since, until))
+
+    def iter_range(self, since=None, until=None, chunk=4096):
+        """Like range(), but yields records a chunk at a time (constant memory)."""
+        with self.lock:
+            segments = list(self.segments())
+        for i, segment in enumerate(segments):
+            # Segment i covers [start_i, start_i+1)
+            if until is not None and segment.start >= until:
+                break
+            if since is not None and i + 1 < len(segments) and segments[i + 1].start <= since:
+                continue
+            mm, n = segment.open_map()
+            if mm is None:
+                continue
+            try:
+                lo = Segment.lower_bound(mm, n, since) if since is not None else 0
+                hi = Segment.lower_bound(mm, n, until) if until is not None else n
+                for start in range(lo, hi, chunk):
+                    yield from Segment.records(mm, start, min(start + chunk, hi))
+            finally:
+                mm.close()
+
+    def read_after(self, ts):
+        """Records with timestamp strictly greater than ts (tailing)."""
+        with self.lock:
+            segments = list(self.segments())
+        out = []
+        for i in range(len(segments) - 1, -1, -1):
+            segment = segments[i]
+            mm, n = segment.open_map()
+            if mm is not None:
+                try:
+                    lo = Segment.upper_bound(mm, n, ts)
+                    out[:0] = Segment.records(mm, lo, n)
+                finally:
+                    mm.close()
+            if segment.start <= ts:
+                break
+        return out
+
+    def tail(self, count):
+        """The newest `count` records, oldest first."""
+        with self.lock:
+            segments = list(self.segments())
+        out = []
+        for segment in reversed(segments):
+            need = count - len(out)
+            if need <= 0:
+                break
+            mm, n = segment.open_map()
+            if mm is None:
+                continue
+            try:
+                out[:0] = Segment.records(mm, max(0, n - need), n)
+            finally:
+                mm.close()
+        return out
+
+    def size_bytes(self) -> int:
+        total = 0
+        for segment in self.segments():
+            try:
+                total += os.path.getsize(segment.path)
+            except OSError:
+                pass
+        return total
+
+    def drop_before(self, cutoff: float, max_bytes: int = None) -> int:
+        """
+        Retention: delete sealed segments that end before cutoff, then the
+        oldest ones while the store is over max_bytes. The active segment
+        is never touched. Returns segments removed.
+        """
+        removed = 0
+        with self.lock:
+            segments = self.segments()
+            total = self.size_bytes() if max_bytes else 0
+            # A sealed segment ends where the next one starts
+            while len(segments) > 1 and (segments[1].start <= cutoff or (max_bytes and total > max_bytes)):
+                segment = segments.pop(0)
+                try:
+                    total -= os.path.getsize(segment.path)
+                    os.remove(segment.path)
+                except OSError:
+                    pass
+                removed += 1
+        return removed
+
+    def iter_csv(self, since=None, until=None):
+        """CSV export view (same columns as the old history.csv)."""
+        yield CSV_HEADER
+        for ts, total, dns, score, anomalies in self.iter_range(since, until):
+            yield f"{to_iso(ts)},{total},{dns},{score},{anomalies}\n"
+
+    def import_csv(self, path) -> int:
+        """Append rows from a legacy history.csv. Returns rows imported."""
+        imported = 0
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                row = line.strip().split(",")
+                if len(row) < 5:
+                    continue
+                try:
+                    dt = datetime.datetime.fromisoformat(row[0])
+                    if dt.tzinfo is None:
+                        dt = dt.replace(tzinfo=datetime.timezone.utc)
+                    self.append(dt.timestamp(), int(row[1]), int(row[2]), float(row[3]), int(row[4]))
+                    imported += 1
+                except ValueError:
+                    continue # Header or damaged row
+        return imported
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> SeriesStore:
+    """Shared store. Imports a legacy history.csv once, on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = SeriesStore(SERIES_DIR)
+                if not store.segments() and os.path.exists(LEGACY_CSV):
+                    try:
+                        rows = store.import_csv(LEGACY_CSV)
+                        os.replace(LEGACY_CSV, LEGACY_CSV + ".migrated")
+                        audit.log(f"Imported {rows} history rows into binary store", "SYSTEM")
+                    except Exception as e:
+                        audit.log(f"History import failed: {str(e)}", "ERROR")
+                _store = store
+    return _store
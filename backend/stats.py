@@ -0,0 +1,253 @@
+import math
+import datetime
+
+# Constant-memory streaming statistics for the baseline.
+# Everything is O(1) per sample and serializes to small JSON lists.
+
+class RunningStats:
+    """Mean / variance via Welford's algorithm."""
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_list(self):
+        return [self.n, self.mean, self.m2]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(*data)
+
+class EWMA:
+    """Exponentially weighted mean and variance (keeps adapting)."""
+
+    def __init__(self, alpha=0.05, mean=0.0, var=0.0, ready=False):
+        self.alpha = alpha
+        self.mean = mean
+        self.var = var
+        self.ready = ready
+
+    def add(self, x):
+        if not self.ready:
+            self.mean, self.var, self.ready = float(x), 0.0, True
+            return
+        diff = x - self.mean
+        incr = self.alpha * diff
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + diff * incr)
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    def to_list(self):
+        return [self.alpha, self.mean, self.var, self.ready]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(*data)
+
+class P2Quantile:
+    """
+    Single quantile estimate in O(1) memory (P-square algorithm,
+    Jain & Chlamtac 1985). Five markers, no stored samples.
+    """
+
+    def __init__(self, p=0.95, q=None, n=None, np_=None, count=0):
+        self.p = p
+        self.q = q or []
+        self.n = n or [0, 1, 2, 3, 4]
+        self.np = np_ or [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+        self.count = count
+
+    def add(self, x):
+        self.count += 1
+        q, n = self.q, self.n
+        if self.count <= 5:
+            q.append(float(x))
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = float(x)
+            k = 0
+        elif x >= q[4]:
+            q[4] = float(x)
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        if not self.q:
+            return 0.0
+        if self.count <= 5:
+            return self.q[min(len(self.q) - 1, int(self.p * len(self.q)))]
+        return self.q[2]
+
+    def to_list(self):
+        return [self.p, self.q, self.n, self.np, self.count]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(*data)
+
+class MetricModel:
+    """Welford + EWMA + p95 sketch for one metric in one time bucket."""
+
+    def __init__(self, stats=None, ewma=None, p95=None):
+        self.stats = stats or RunningStats()
+        self.ewma = ewma or EWMA()
+        self.p95 = p95 or P2Quantile(0.95)
+
+    def add(self, x):
+        self.stats.add(x)
+        self.ewma.add(x)
+        self.p95.add(x)
+
+    def zscore(self, x, min_std=1.0):
+        """Distance from the adaptive (EWMA) mean in std units."""
+        std = max(self.ewma.std, min_std)
+        return (x - self.ewma.mean) / std
+
+    def summary(self):
+        return {
+            "n": self.stats.n,
+            "mean": round(self.stats.mean, 3),
+            "std": round(self.stats.std, 3),
+            "ewma": round(self.ewma.mean, 3),
+            "ewma_std": round(self.ewma.std, 3),
+            "p95": round(self.p95.value, 3)
+        }
+
+    def to_dict(self):
+        return {"w": self.stats.to_list(), "e": self.ewma.to_list(), "p": self.p95.to_list()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(RunningStats.from_list(data["w"]), EWMA.from_list(data["e"]), P2Quantile.from_list(data["p"]))
+
+HOURS_PER_WEEK = 168
+
+def hour_of_week(ts: float) -> int:
+    """0 = Monday 00:00-01:00 local time."""
+    dt = datetime.datetime.fromtimestamp(ts)
+    return dt.weekday() * 24 + dt.hour
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+def bucket_label(bucket: int) -> str:
+    return f"{DAYS[bucket // 24]} {bucket % 24:02d}:00"
+
+class StreamingBaseline:
+    """
+    Per-metric models, overall and per hour-of-week bucket.
+    Memory is bounded by metrics x 169 models, independent of uptime.
+    """
+
+    # Samples a bucket needs before it is trusted over the overall model
+    MIN_BUCKET_SAMPLES = 30
+
+    def __init__(self, metrics=None):
+        # {metric: {"all": MetricModel, "buckets": {int: MetricModel}}}
+        self.metrics = metrics or {}
+
+    def observe(self, values: dict, ts: float):
+        bucket = hour_of_week(ts)
+        for name, x in values.items():
+            entry = self.metrics.setdefault(name, {"all": MetricModel(), "buckets": {}})
+            entry["all"].add(x)
+            model = entry["buckets"].get(bucket)
+            if model is None:
+                model = entry["buckets"][bucket] = MetricModel()
+            model.add(x)
+
+    def model_for(self, name: str, ts: float):
+        """(model, label) for the matching hour-of-week bucket, or the overall model."""
+        entry = self.metrics.get(name)
+        if not entry:
+            return None, None
+        bucket = hour_of_week(ts)
+        model = entry["buckets"].get(bucket)
+        if model and model.stats.n >= self.MIN_BUCKET_SAMPLES:
+            return model, bucket_label(bucket)
+        if entry["all"].stats.n >= self.MIN_BUCKET_SAMPLES:
+            return entry["all"], "overall"
+        return None, None
+
+    def zscore(self, name: str, x, ts: float):
+        """(z, label) or (None, None) while there is too little data."""
+        model, label = self.model_for(name, ts)
+        if model is None:
+            return None, None
+        return model.zscore(x), label
+
+    def summary(self, ts: float):
+        out = {}
+        for name, entry in self.metrics.items():
+            model, label = self.model_for(name, ts)
+            out[name] = {
+                "overall": entry["all"].summary(),
+                "current_bucket": label,
+                "current": model.summary() if model else None
+            }
+        return out
+
+    def to_dict(self):
+        return {
+            name: {
+                "all": entry["all"].to_dict(),
+                "buckets": {str(b): m.to_dict() for b, m in entry["buckets"].items()}
+            }
+            for name, entry in self.metrics.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = {}
+        for name, entry in (data or {}).items():
+            metrics[name] = {
+                "all": MetricModel.from_dict(entry["all"]),
+                "buckets": {int(b): MetricModel.from_dict(m) for b, m in entry["buckets"].items()}
+            }
+        return cls(metrics)
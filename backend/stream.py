@@ -0,0 +1,190 @@
+import json
+import asyncio
+import threading
+from . import audit
+from . import series
+from . import history
+from . import timeline
+from . import baseline
+
+# Server-Sent Events fan-out.
+# The scheduler computes each delta once; the hub serializes it once and
+# hands the same bytes to every subscriber's bounded queue.
+
+# Per-client backlog. A client that falls this far behind is resynced
+# with a fresh snapshot instead of being sent every missed delta.
+QUEUE_SIZE = 64
+KEEPALIVE = 15.0 # seconds
+
+RESYNC = object()
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.lagging = False
+
+    def offer(self, message):
+        """Runs on the event loop. Never blocks the publisher."""
+        if self.lagging:
+            return # Resync already pending
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: drop its backlog and resync it
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.lagging = True
+
+class Hub:
+    def __init__(self):
+        self.loop = None
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def attach(self, loop):
+        """Bind to the server's event loop (lifespan startup)."""
+        self.loop = loop
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber()
+        with self.lock:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def publish(self, event: str, data):
+        """Thread-safe. Serializes once and broadcasts on the event loop."""
+        if self.loop is None or not self.subscribers:
+            return
+        message = format_event(event, data)
+        try:
+            self.loop.call_soon_threadsafe(self._broadcast, message)
+        except RuntimeError:
+            pass # Loop closed during shutdown
+
+    def _broadcast(self, message):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            sub.offer(message)
+
+hub = Hub()
+
+# Generation counter per dashboard section, bumped whenever a change is
+# detected (also used for /dashboard ETags)
+versions = {
+    "health": 0,
+    "devices": 0,
+    "timeline": 0,
+    "history": 0,
+    "environment": 0
+}
+
+# Serializes change detection (scheduler thread vs request threads)
+_detect_lock = threading.Lock()
+
+def _changed(section, data):
+    versions[section] += 1
+    hub.publish(section if section != "health" else "risk", data)
+
+# Last state sent, so only changes go out
+_last = {
+    "devices": {},
+    "risk": None,
+    "history_ts": None,
+    "timeline_cursor": None,
+    "environment": None
+}
+
+def _device_key(d):
+    # last_seen moves every scan; only fields the dashboard shows count as a change
+    return (d.get("mac"), d.get("status"), d.get("mac_vendor"), d.get("first_seen"))
+
+def on_devices(changed, count):
+    """Publish devices the last scan added or changed (the scan's change set)."""
+    fresh = []
+    for d in changed:
+        key = _device_key(d)
+        if _last["devices"].get(d["ip"]) != key:
+            _last["devices"][d["ip"]] = key
+            fresh.append(d)
+    if fresh:
+        _changed("devices", {"changed": fresh, "removed": [], "count": count})
+
+def on_health(health: dict):
+    """Publish the risk/health summary only when it changes."""
+    if health != _last["risk"]:
+        _last["risk"] = health
+        _changed("health", health)
+
+def on_history():
+    """Publish analyzer samples appended since the last call."""
+    store = series.get_store()
+    if _last["history_ts"] is None:
+        newest = store.tail(1)
+        _last["history_ts"] = newest[-1][0] if newest else 0.0
+        return
+    samples = store.read_after(_last["history_ts"])
+    if not samples:
+        return
+    _last["history_ts"] = samples[-1][0]
+    _changed("history", [
+        {"time": series.to_iso(ts), "total": total, "dns": dns, "risk": score}
+        for ts, total, dns, score, _ in samples
+    ])
+
+def on_timeline():
+    """Publish timeline events appended since the last call."""
+    fresh, _last["timeline_cursor"] = timeline.get_new_events(_last["timeline_cursor"])
+    if fresh:
+        _changed("timeline", fresh)
+
+def on_environment():
+    """Publish environment info when it changes (also called after a rename)."""
+    env = baseline.get_environment_info()
+    if env != _last["environment"]:
+        _last["environment"] = env
+        _changed("environment", env)
+
+def publish_tick(health: dict, devices=None, device_count=0):
+    """
+    Called by the scheduler after each pass (devices: the change set of a
+    scan, only after a scan).
+    Markers advance even with no subscribers, so a new client's snapshot
+    and the deltas that follow line up.
+    """
+    try:
+        with _detect_lock:
+            if devices is not None:
+                on_devices(devices, device_count)
+            on_health(health)
+            on_history()
+            on_timeline()
+            on_environment()
+    except Exception as e:
+        audit.log(f"Stream publish failed: {str(e)}", "ERROR")
+
+def environment_changed():
+    """Push a user-initiated environment change right away."""
+    try:
+        with _detect_lock:
+            on_environment()
+    except Exception as e:
+        audit.log(f"Stream publish failed: {str(e)}", "ERROR")
+
+def snapshot(health: dict, devices) -> str:
+    """Full state for a newly connected (or resynced) client."""
+    return format_event("snapshot", {
+        "health": health,
+        "devices": list(devices),
+        "timeline": timeline.get_events(limit=20),
+        "history": history.query(bucket=10, limit=20),
+        "environment": baseline.get_environment_info()
+    })
@@ -1,13 +1,243 @@
 import os
 import csv
 import re
+import heapq
+import itertools
+import threading
+from collections import deque
 from . import audit
+from . import metrics
+from . import series
+from . import segments
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 AUDIT_FILE = os.path.join(DATA_DIR, "audit.log")
 ALERTS_FILE = os.path.join(DATA_DIR, "alerts.csv")
-HISTORY_FILE = os.path.join(DATA_DIR, "history.csv")
+
+# Newest events kept in memory per source
+KEEP_PER_SOURCE = 1000
+
+# On first load only read this much of the audit log tail (it grows on every request)
+AUDIT_BACKFILL_BYTES = KEEP_PER_SOURCE * 1024
+
+# On first load only scan this many of the newest analyzer samples (~1 week at 10s)
+ANALYZER_BACKFILL_RECORDS = 60480
+
+# Inode placeholder: the file was rotated away and its replacement not created yet
+ROTATED = 0
+
+AUDIT_PATTERN = re.compile(r"^\[(.*?)\] \[(.*?)\] (.*)$")
+
+def parse_audit_line(line: str):
+    """Format: [ISO] [LEVEL] Message"""
+    match = AUDIT_PATTERN.match(line.strip())
+    if not match:
+        return None
+    return {
+        "timestamp": match.group(1),
+        "source": "audit",
+        "level": match.group(2),
+        "message": match.group(3)
+    }
+
+def parse_alert_line(line: str):
+    """Format: timestamp,type,severity,message"""
+    row = next(csv.reader([line]), [])
+    if len(row) < 4 or row[0] == "timestamp": # Skip header
+        return None
+    return {
+        "timestamp": row[0],
+        "source": "alert",
+        "level": row[2], # severity
+        "message": f"{row[1]}: {','.join(row[3:])}" # type: message
+    }
+
+def history_event(record):
+    """Analyzer sample (ts, total, dns, score, anomalies) -> event (Risk > 50 only)"""
+    ts, _, _, score, anomalies = record
+    if score < 50:
+        return None
+    return {
+        "timestamp": series.to_iso(ts),
+        "source": "analyzer",
+        "level": "High Risk",
+        "message": f"Risk Score {score} - {anomalies} anomalies"
+    }
+
+class SourceTail:
+    """
+    Follow one append-only file from a remembered byte offset.
+    Only newly appended, complete lines are parsed.
+    Keeps the newest `keep` events in arrival (= time) order.
+    `log` names the segmented log (segments.py) the file is rotated into,
+    so lines written just before a rotation are still picked up.
+    """
+
+    def __init__(self, path, parse, keep=KEEP_PER_SOURCE, backfill_bytes=None, log=None):
+        self.path = path
+        self.parse = parse
+        self.backfill_bytes = backfill_bytes
+        self.log = log
+        self.events = deque(maxlen=keep)
+        self.appended = 0 # Total events ever parsed (cursor for tailing)
+        self.offset = 0
+        self.inode = None
+        self.mid_line = False
+
+    def refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            # Not created yet, or sealed and not yet recreated; keep what we have
+            if self.inode and self.log:
+                self._finish_sealed()
+                self.inode, self.offset, self.mid_line = ROTATED, 0, False
+            return
+
+        if st.st_ino != self.inode:
+            if self.inode is not None and self.log:
+                self._finish_sealed()
+            # New file (first load or rotated): start from the top
+            start = 0
+            if self.inode is None and self.backfill_bytes and st.st_size > self.backfill_bytes:
+                start = st.st_size - self.backfill_bytes
+            self.inode = st.st_ino
+            self.offset = start
+            self.mid_line = start > 0
+        elif st.st_size < self.offset:
+            # Truncated in place: data was wiped
+            self.events.clear()
+            self.offset = 0
+
+        if st.st_size == self.offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        metrics.io(self.path, read=len(data))
+
+        if self.mid_line:
+            # Backfill started mid-line: drop the partial first line
+            first = data.find(b"\n") + 1
+            if first == 0:
+                return
+            self.offset += first
+            data = data[first:]
+            self.mid_line = False
+
+        self.offset += self._consume(data)
+
+    def _finish_sealed(self):
+        """Read what was appended to the previous file between our last look and its rotation."""
+        segment = segments.sealed_by_inode(self.log, self.inode)
+        if segment is None:
+            return
+        with segments.open_segment(segment) as f:
+            f.seek(self.offset)
+            data = f.read()
+        if self.mid_line:
+            data = data[data.find(b"\n") + 1:]
+        if data and not data.endswith(b"\n"):
+            data += b"\n" # Sealed: the last line is complete
+        self._consume(data)
+
+    def _consume(self, data) -> int:
+        """Parse complete lines; returns bytes consumed (a partial last line waits)."""
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            return 0
+        for line in data[:cut].decode("utf-8", errors="replace").splitlines():
+            event = self.parse(line)
+            if event:
+                self.events.append(event)
+                self.appended += 1
+        return cut
+
+    def newest_first(self):
+        return reversed(self.events)
+
+class SeriesTail:
+    """Follow the binary history store by last-seen timestamp."""
+
+    def __init__(self, keep=KEEP_PER_SOURCE, backfill_records=ANALYZER_BACKFILL_RECORDS):
+        self.events = deque(maxlen=keep)
+        self.appended = 0
+        self.backfill_records = backfill_records
+        self.last_ts = None
+
+    def refresh(self):
+        store = series.get_store()
+        if self.last_ts is None:
+            records = store.tail(self.backfill_records)
+        else:
+            records = store.read_after(self.last_ts)
+        for record in records:
+            event = history_event(record)
+            if event:
+                self.events.append(event)
+                self.appended += 1
+        if records:
+            self.last_ts = records[-1][0]
+
+    def newest_first(self):
+        return reversed(self.events)
+
+class TimelineIndex:
+    """Incremental, bounded index over every timeline source."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sources = {
+            "audit": SourceTail(AUDIT_FILE, parse_audit_line, backfill_bytes=AUDIT_BACKFILL_BYTES, log="audit"),
+            "alert": SourceTail(ALERTS_FILE, parse_alert_line, log="alerts"),
+            "analyzer": SeriesTail()
+        }
+
+    @metrics.timed("timeline.refresh")
+    def refresh(self):
+        for name, tail in self.sources.items():
+            try:
+                tail.refresh()
+            except Exception as e:
+                audit.log(f"Timeline refresh failed for {name}: {str(e)}", "ERROR")
+
+    def query(self, limit: int, source_filter: str = None):
+        with self.lock:
+            self.refresh()
+            if source_filter:
+                tail = self.sources.get(source_filter)
+                if not tail:
+                    return []
+                return list(itertools.islice(tail.newest_first(), limit))
+
+            # k-way merge of per-source newest-first streams
+            # Simple string compare works for ISO8601
+            merged = heapq.merge(
+                *(tail.newest_first() for tail in self.sources.values()),
+                key=lambda x: x["timestamp"],
+                reverse=True
+            )
+            return list(itertools.islice(merged, limit))
+
+    def since(self, cursor):
+        """Events appended after `cursor` ({source: count}), newest first, and the new cursor."""
+        with self.lock:
+            self.refresh()
+            fresh = []
+            new_cursor = {}
+            for name, tail in self.sources.items():
+                new_cursor[name] = tail.appended
+                if cursor is None:
+                    continue
+                count = min(tail.appended - cursor.get(name, 0), len(tail.events))
+                if count > 0:
+                    fresh.extend(itertools.islice(tail.newest_first(), count))
+            fresh.sort(key=lambda x: x["timestamp"], reverse=True)
+            return fresh, new_cursor
+
+_index = TimelineIndex()
 
 def get_events(limit: int = 100, source_filter: str = None):
     """
@@ -19,71 +249,14 @@ def get_events(limit: int = 100, source_filter: str = None):
         "level": "INFO" | "WARNING" | "CRITICAL" | etc,
         "message": string
     }
+    Sorted newest first. Only new lines are parsed on each call.
     """
-    events = []
-    
-    # 1. Parse Audit Log
-    # Format: [ISO] [LEVEL] Message
-    if os.path.exists(AUDIT_FILE):
-        try:
-            with open(AUDIT_FILE, "r", encoding="utf-8") as f:
-                pattern = re.compile(r"^\[(.*?)\] \[(.*?)\] (.*)$")
-                for line in f:
-                    match = pattern.match(line.strip())
-                    if match:
-                        events.append({
-                            "timestamp": match.group(1),
-                            "source": "audit",
-                            "level": match.group(2),
-                            "message": match.group(3)
-                        })
-        except:
-            pass
-
-    # 2. Parse Alerts CSV
-    # Format: timestamp,type,severity,message
-    if os.path.exists(ALERTS_FILE):
-        try:
-            with open(ALERTS_FILE, "r") as f:
-                reader = csv.reader(f)
-                header = next(reader, None) # Skip header
-                for row in reader:
-                    if len(row) >= 4:
-                        events.append({
-                            "timestamp": row[0],
-                            "source": "alert",
-                            "level": row[2], # severity
-                            "message": f"{row[1]}: {row[3]}" # type: message
-                        })
-        except:
-            pass
-
-    # 3. Parse History CSV (Risk > 50 only)
-    # Format: timestamp,total,dns,risk,anomalies
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                reader = csv.reader(f)
-                header = next(reader, None)
-                for row in reader:
-                    if len(row) >= 5:
-                        risk_score = float(row[3])
-                        if risk_score >= 50:
-                            events.append({
-                                "timestamp": row[0],
-                                "source": "analyzer",
-                                "level": "High Risk",
-                                "message": f"Risk Score {row[3]} - {row[4]} anomalies"
-                            })
-        except:
-            pass
-            
-    # Filter
-    if source_filter:
-        events = [e for e in events if e["source"] == source_filter]
-        
-    # Sort by timestamp descending (newest first)
-    # Simple string sort works for ISO8601
-    events.sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    return events[:limit]
+    limit = max(0, min(limit, KEEP_PER_SOURCE))
+    return _index.query(limit, source_filter)
+
+def get_new_events(cursor=None):
+    """
+    Events appended since `cursor` (from a previous call), newest first.
+    Returns (events, cursor). Pass None to just obtain a starting cursor.
+    """
+    return _index.since(cursor)
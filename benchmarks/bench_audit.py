@@ -0,0 +1,56 @@
+"""
+audit.log() throughput: the old open/append/close per call vs the
+buffered group-commit writer.
+
+    python -m benchmarks.bench_audit [calls]
+"""
+import os
+import sys
+import time
+import datetime
+import tempfile
+from backend import audit
+
+def legacy_log(path, event, level="INFO"):
+    """The pre-queue implementation: one open/append/close per entry."""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    entry = f"[{timestamp}] [{level}] {event}\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(entry)
+
+def run(label, fn, calls):
+    start = time.perf_counter()
+    fn(calls)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {calls / elapsed:>12,.0f} calls/s  ({elapsed * 1e6 / calls:.2f} us/call)")
+
+def main(calls=100000):
+    tmp = tempfile.mkdtemp()
+    legacy_path = os.path.join(tmp, "legacy.log")
+    audit.LOG_FILE = os.path.join(tmp, "audit.log")
+
+    def legacy(n):
+        for i in range(n):
+            legacy_log(legacy_path, f"Device scan started {i}", "SCANNER")
+
+    def buffered(n):
+        for i in range(n):
+            audit.log(f"Device scan started {i}", "SCANNER")
+
+    def buffered_durable(n):
+        buffered(n)
+        audit.flush(timeout=60)
+
+    print(f"audit.log: {calls} calls")
+    run("before (open/append/close)", legacy, calls)
+    run("after (enqueue only)", buffered, calls)
+    audit.flush(timeout=60)
+    run("after (incl. drain to disk)", buffered_durable, calls)
+    audit.close()
+
+    with open(audit.LOG_FILE, "rb") as f:
+        written = sum(1 for _ in f)
+    print(f"  lines on disk: {written} (expected {calls * 2}), dropped: {audit.dropped}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,76 @@
+"""
+A burst of concurrent /timeline, /export and /connections requests
+against synthetic data, while /status is polled. Reports /status
+latency under the burst, how many burst requests were served or shed
+(503) and how many identical requests shared one run.
+
+    python -m benchmarks.bench_burst [requests] [lines]
+"""
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import statistics
+import httpx
+from benchmarks import stubs
+from benchmarks import synth
+from benchmarks.suite import generate
+from backend import offload
+from backend.main import app
+
+BURST_URLS = [
+    "/timeline?limit=500",
+    "/export/audit?format=ndjson",
+    "/connections",
+    "/history?bucket=60&limit=500"
+]
+
+async def burst(count):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        runs = {"n": 0}
+        render = offload.render
+
+        def counted(fn, *args):
+            runs["n"] += 1
+            return render(fn, *args)
+        offload.render = counted
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(client.get(BURST_URLS[i % len(BURST_URLS)])) for i in range(count)]
+        status_ms = []
+        while not all(t.done() for t in tasks):
+            t0 = time.perf_counter()
+            response = await client.get("/status")
+            assert response.status_code == 200
+            status_ms.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(0.01)
+        results = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        offload.render = render
+
+    codes = {url: {} for url in BURST_URLS}
+    for i, response in enumerate(results):
+        url = codes[BURST_URLS[i % len(BURST_URLS)]]
+        url[response.status_code] = url.get(response.status_code, 0) + 1
+    status_ms.sort()
+    print(f"{count} burst requests in {elapsed:.2f} s")
+    for url, counts in codes.items():
+        print(f"  {url:<32} " + ", ".join(f"{n} x {code}" for code, n in sorted(counts.items())))
+    print(f"  JSON bodies rendered {runs['n']} times (identical requests share one run)")
+    print(f"  /status during burst: median {statistics.median(status_ms):.2f} ms, "
+          f"max {status_ms[-1]:.2f} ms over {len(status_ms)} polls")
+
+def main(count=200, lines=50000):
+    data_dir = tempfile.mkdtemp(prefix="sentinelmesh-bench-")
+    stubs.use_data_dir(data_dir)
+    present = generate(data_dir, lines, 1000)
+    try:
+        with stubs.Stubs(arp_text=synth.arp_output(present), conns=stubs.make_connections(2000)):
+            asyncio.run(burst(count))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,76 @@
+"""
+Device scan cost with many historical devices: the old load/rewrite of
+the whole devices.json (and aging pass over every device) vs the
+journaled device store with heap-driven aging.
+
+    python -m benchmarks.bench_devices [known_devices] [present]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import datetime
+from backend import audit
+from backend import scanner
+from backend import devicestore
+
+def make_devices(count, now):
+    old = (now - datetime.timedelta(days=30)).isoformat()
+    return [{
+        "ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+        "mac": f"02:00:{(i >> 24) & 255:02x}:{(i >> 16) & 255:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}",
+        "first_seen": old,
+        "last_seen": old,
+        "status": "archived"
+    } for i in range(count)]
+
+def legacy_scan(path, arp):
+    """The pre-store scan: load everything, merge, rewrite everything."""
+    with open(path, "r") as f:
+        known = {d["ip"]: d for d in json.load(f)}
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    for d in arp:
+        entry = known.setdefault(d["ip"], {"ip": d["ip"], "mac": d["mac"], "first_seen": now, "status": "active"})
+        entry["last_seen"] = now
+        entry["status"] = "active"
+    for device in known.values():
+        datetime.datetime.fromisoformat(device["last_seen"])
+    with open(path, "w") as f:
+        json.dump(list(known.values()), f, indent=2)
+
+def main(known=30000, present=1000, scans=20):
+    tmp = tempfile.mkdtemp()
+    audit.LOG_FILE = os.path.join(tmp, "audit.log")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    devices = make_devices(known, now)
+    arp = [{"ip": d["ip"], "mac": d["mac"]} for d in devices[:present]]
+
+    legacy_path = os.path.join(tmp, "legacy.json")
+    with open(legacy_path, "w") as f:
+        json.dump(devices, f, indent=2)
+
+    store = devicestore.DeviceStore(os.path.join(tmp, "devices.json"), os.path.join(tmp, "devices.journal"))
+    store.replace_all(devices)
+    devicestore._store = store
+    scanner.get_arp_table = lambda: arp
+
+    print(f"{known} known devices, {present} present, {scans} scans")
+    start = time.perf_counter()
+    for _ in range(scans):
+        legacy_scan(legacy_path, arp)
+    elapsed = time.perf_counter() - start
+    print(f"  before (rewrite devices.json): {elapsed * 1000 / scans:8.2f} ms/scan")
+
+    scanner.scan_devices() # First scan: the present devices come back from archived
+    start = time.perf_counter()
+    for _ in range(scans):
+        scanner.scan_devices()
+    elapsed = time.perf_counter() - start
+    print(f"  after  (journaled store):      {elapsed * 1000 / scans:8.2f} ms/scan, "
+          f"journal {os.path.getsize(store.journal_path)} bytes")
+    audit.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
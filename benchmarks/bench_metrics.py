@@ -0,0 +1,44 @@
+"""
+Per-call overhead of the instrumentation: @metrics.timed on an empty
+function and metrics.io(), disabled ("metrics_enabled": false) vs
+enabled, plus render() cost with every hot path populated.
+
+    python -m benchmarks.bench_metrics [calls]
+"""
+import sys
+import time
+from backend import metrics
+
+def noop():
+    pass
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) * 1e9 / calls
+
+def main(calls=1000000):
+    saved = metrics.ENABLED
+    try:
+        base = per_call_ns(noop, calls)
+        for enabled in (False, True):
+            metrics.ENABLED = enabled # timed() decides at decoration time
+            wrapped = metrics.timed("bench.noop")(noop)
+            timed_ns = per_call_ns(wrapped, calls) - base
+            io_ns = per_call_ns(lambda: metrics.io("audit.log", written=120), calls) - base
+            label = "enabled " if enabled else "disabled"
+            print(f"{label}: @timed +{timed_ns:7.1f} ns/call   io() +{io_ns:7.1f} ns/call")
+
+        for i in range(40):
+            fn = metrics.timed(f"bench.path{i}")(noop)
+            for _ in range(1000):
+                fn()
+        start = time.perf_counter()
+        text = metrics.render()
+        print(f"render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(text.splitlines())} lines")
+    finally:
+        metrics.ENABLED = saved
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,87 @@
+"""
+Per-scan cost of each neighbor-table source on a synthetic 10k-entry table.
+
+    python -m benchmarks.bench_neighbors [entries]
+
+The "arp" row includes a fork+exec (`cat` of the synthetic output) to
+mirror what the subprocess fallback pays on every scan.
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+from backend import neighbors
+
+def _entries(n):
+    for i in range(n):
+        ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        mac = bytes([0x02, 0, (i >> 24) & 255, (i >> 16) & 255, (i >> 8) & 255, i & 255])
+        yield ip, mac
+
+def make_proc_arp(n):
+    lines = ["IP address       HW type     Flags       HW address            Mask     Device"]
+    for ip, mac in _entries(n):
+        lines.append(f"{ip:<16} 0x1         0x2         {mac.hex(':')}     *        eth0")
+    return "\n".join(lines) + "\n"
+
+def make_arp_windows(n):
+    lines = ["Interface: 10.0.0.5 --- 0x10", "  Internet Address      Physical Address      Type"]
+    for ip, mac in _entries(n):
+        lines.append(f"  {ip:<21} {mac.hex('-')}     dynamic")
+    return "\n".join(lines) + "\n"
+
+def make_neigh_dump(n):
+    chunks = []
+    for seq, (ip, mac) in enumerate(_entries(n)):
+        attrs = neighbors.RTATTR.pack(8, neighbors.NDA_DST) + socket.inet_aton(ip)
+        attrs += neighbors.RTATTR.pack(10, neighbors.NDA_LLADDR) + mac + b"\0\0"
+        body = neighbors.NDMSG.pack(socket.AF_INET, 2, 0x02, 0, 1) + attrs
+        chunks.append(neighbors.NLMSGHDR.pack(neighbors.NLMSGHDR.size + len(body), neighbors.RTM_NEWNEIGH, 2, seq, 0) + body)
+    chunks.append(neighbors.NLMSGHDR.pack(neighbors.NLMSGHDR.size + 4, neighbors.NLMSG_DONE, 2, n, 0) + b"\0" * 4)
+    return b"".join(chunks)
+
+def timeit(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main(n=10000):
+    tmp = tempfile.mkdtemp()
+    proc_path = os.path.join(tmp, "arp")
+    arp_path = os.path.join(tmp, "arp.txt")
+    with open(proc_path, "w") as f:
+        f.write(make_proc_arp(n))
+    with open(arp_path, "w") as f:
+        f.write(make_arp_windows(n))
+    dump = make_neigh_dump(n)
+
+    def arp_subprocess():
+        output = subprocess.check_output(["cat", arp_path]).decode("utf-8", errors="ignore")
+        return neighbors.parse_arp_output(output)
+
+    rows = [
+        ("netlink (parse dump)", lambda: neighbors.parse_neigh_dump(dump)),
+        ("proc (read + parse)", lambda: neighbors.read_proc_arp(proc_path)),
+        ("arp -a (spawn + regex)", arp_subprocess),
+    ]
+    print(f"neighbor table: {n} entries")
+    for name, fn in rows:
+        elapsed, result = timeit(fn)
+        assert len(result) == n, (name, len(result))
+        print(f"  {name:<24} {elapsed * 1000:8.2f} ms/scan")
+
+    # Live table on this host, for reference
+    for name in neighbors.auto_order():
+        try:
+            elapsed, result = timeit(neighbors.SOURCES[name], repeat=5)
+            print(f"  live {name:<19} {elapsed * 1000:8.2f} ms/scan ({len(result)} entries)")
+        except Exception as e:
+            print(f"  live {name:<19} unavailable ({e})")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
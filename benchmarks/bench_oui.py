@@ -0,0 +1,76 @@
+"""
+Vendor enrichment of a large scan against a table the size of the full
+IEEE registries (synthetic MA-L / MA-M / MA-S rows): first-use load
+cost, then enrich() over devices spread across common vendors.
+
+    python -m benchmarks.bench_oui [devices] [vendors]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from backend import oui
+
+def make_registry(path, rng):
+    """~38k MA-L, ~5k MA-M and ~6k MA-S rows in IEEE CSV layout."""
+    rows = ["Registry,Assignment,Organization Name,Organization Address"]
+    ma_l = rng.sample(range(1 << 24), 38000)
+    for i, prefix in enumerate(ma_l):
+        rows.append(f'MA-L,{prefix:06X},"Vendor {i % 20000}, Inc.",')
+    for prefix in ma_l[:300]:
+        for sub in rng.sample(range(16), 16):
+            rows.append(f"MA-M,{prefix:06X}{sub:X},Small Vendor {prefix:06X}{sub:X},")
+    for prefix in ma_l[300:302]:
+        for sub in rng.sample(range(4096), 3000):
+            rows.append(f"MA-S,{prefix:06X}{sub:03X},Tiny Vendor {prefix:06X}{sub:03X},")
+    with open(path, "w") as f:
+        f.write("\n".join(rows) + "\n")
+    return ma_l
+
+def main(count=10000, vendors=200):
+    rng = random.Random(7)
+    tmp = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp, "registry.csv")
+    table_path = os.path.join(tmp, "oui.bin")
+    ma_l = make_registry(csv_path, rng)
+
+    start = time.perf_counter()
+    ranges = oui.build([csv_path], table_path)
+    print(f"build: {ranges} ranges, {os.path.getsize(table_path)} bytes in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # Mostly common MA-L vendors, plus some MA-M / MA-S and unknown MACs
+    prefixes = ma_l[:2] + ma_l[300:302] + ma_l[302:302 + vendors]
+    devices = []
+    for _ in range(count):
+        value = (rng.choice(prefixes) << 24) | rng.getrandbits(24)
+        if rng.random() < 0.05:
+            value = rng.getrandbits(48)
+        devices.append({"mac": ":".join(f"{b:02X}" for b in value.to_bytes(6, "big"))})
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = oui.OUITable(table_path)
+    opened = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"open (mmap): {opened * 1000:.2f} ms, {peak / 1024:.0f} KiB Python heap")
+
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        table.enrich(devices)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    known = sum(1 for d in devices if d["mac_vendor"])
+    print(f"enrich {count} devices ({vendors} vendors): {best * 1000:.2f} ms, {known} with a vendor")
+
+    start = time.perf_counter()
+    for d in devices:
+        table.lookup(d["mac"])
+    print(f"  per-MAC lookup, no block cache:  {(time.perf_counter() - start) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200)
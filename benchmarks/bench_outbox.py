@@ -0,0 +1,116 @@
+"""
+Alert dispatch against a local SMTP stand-in that answers slowly:
+log_alert() latency, SMTP connections opened and emails received,
+before (synchronous send per alert) vs after (outbox worker).
+
+    python -m benchmarks.bench_outbox [alerts] [server_delay_s]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import socketserver
+from backend import audit
+from backend import alerts
+from backend import config
+from backend import dedupe
+from backend import mailer
+from backend import outbox
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP (no TLS, no auth) to accept messages, like aiosmtpd's sink."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.delay = delay
+        self.connections = 0
+        self.messages = []
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        time.sleep(server.delay) # Slow greeting, like a remote relay
+        self.reply("220 stand-in ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode(errors="ignore").strip().split(" ")[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 stand-in")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    lines.append(data)
+                server.messages.append(b"".join(lines))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else: # MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+def main(count=20, delay=0.2):
+    tmp = tempfile.mkdtemp()
+    audit.LOG_FILE = os.path.join(tmp, "audit.log")
+    alerts.ALERTS_FILE = os.path.join(tmp, "alerts.csv")
+    outbox.OUTBOX_DIR = os.path.join(tmp, "outbox")
+    dedupe.STATE_FILE = os.path.join(tmp, "alert_state.json")
+    dedupe._limiter.path = dedupe.STATE_FILE
+    outbox.FAILED_DIR = os.path.join(outbox.OUTBOX_DIR, "failed")
+
+    server = SMTPStandIn(delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.ENV_FILE = os.path.join(tmp, "environment.json")
+    with open(config.ENV_FILE, "w") as f:
+        json.dump({
+            "email_enabled": True,
+            "smtp_server": "127.0.0.1",
+            "smtp_port": server.server_address[1],
+            "smtp_starttls": False,
+            "sender_email": "sentinel@localhost",
+            "recipient_email": "admin@localhost",
+            "alert_digest_window": 1
+        }, f)
+
+    print(f"{count} alerts, SMTP stand-in answering after {delay * 1000:.0f} ms")
+
+    # Before: one fresh SMTP session per alert, in the caller
+    start = time.perf_counter()
+    for i in range(count):
+        session = mailer.SMTPSession()
+        session.send(mailer.build_message(f"alert {i}", "body"))
+        session.close()
+    elapsed = time.perf_counter() - start
+    print(f"  before: {elapsed * 1000 / count:8.2f} ms/alert in caller, "
+          f"{server.connections} connections, {len(server.messages)} emails")
+
+    # After: log_alert only queues; the worker batches and reuses one session
+    server.connections, server.messages = 0, []
+    outbox.start()
+    start = time.perf_counter()
+    for i in range(count):
+        alerts.log_alert(f"burst-{i}", "Warning", "High connection count", f"Score: {i}")
+    elapsed = time.perf_counter() - start
+    outbox.drain(timeout=30)
+    outbox.stop()
+    print(f"  after:  {elapsed * 1000 / count:8.2f} ms/alert in caller, "
+          f"{server.connections} connections, {len(server.messages)} emails (digest window 1s)")
+    server.shutdown()
+    audit.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.2)
@@ -0,0 +1,40 @@
+"""
+Binary history store vs the old history.csv: disk size and range reads
+over a year of 10s samples.
+
+    python -m benchmarks.bench_series [samples]
+"""
+import os
+import sys
+import time
+import tempfile
+from backend import series
+
+def main(samples=3153600):
+    root = tempfile.mkdtemp()
+    store = series.SeriesStore(os.path.join(root, "history"))
+    start_ts = 1700000000.0
+
+    t = time.perf_counter()
+    for i in range(samples):
+        store.append(start_ts + i * 10, i % 500, i % 30, (i * 7) % 100, i % 3)
+    print(f"append {samples} samples: {time.perf_counter() - t:.1f}s")
+
+    csv_bytes = sum(len(line) for line in store.iter_csv())
+    print(f"disk: binary {store.size_bytes() / 1e6:.1f} MB vs CSV {csv_bytes / 1e6:.1f} MB")
+
+    end_ts = start_ts + samples * 10
+    for label, span in (("1 hour", 3600), ("1 day", 86400), ("1 week", 7 * 86400)):
+        since = end_ts - span * 3 # Not the newest data
+        t = time.perf_counter()
+        for _ in range(20):
+            records = store.range(since, since + span)
+        print(f"range {label:<7} ({len(records):>6} records): {(time.perf_counter() - t) / 20 * 1000:.2f} ms")
+
+    t = time.perf_counter()
+    for _ in range(100):
+        records = store.read_after(end_ts - 100)
+    print(f"tail read_after ({len(records)} records): {(time.perf_counter() - t) * 10:.3f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3153600)
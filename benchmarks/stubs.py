@@ -0,0 +1,133 @@
+"""
+Stand-ins for the OS: a scratch data/ directory for every backend module,
+a synthetic psutil connection table and canned subprocess output
+(`arp -a`, `ipconfig`). Benchmarks run the real code paths on top.
+"""
+import os
+import socket
+import random
+import subprocess
+from collections import namedtuple
+from backend import alerts
+from backend import audit
+from backend import baseline
+from backend import config
+from backend import connections
+from backend import coordinator
+from backend import dedupe
+from backend import devicestore
+from backend import exporter
+from backend import fingerprint
+from backend import health
+from backend import history
+from backend import neighbors
+from backend import oui
+from backend import outbox
+from backend import presence
+from backend import scanner
+from backend import segments
+from backend import series
+from backend import timeline
+
+def use_data_dir(data_dir):
+    """Point every module's files (and cached stores) at data_dir."""
+    audit.close()
+    os.makedirs(data_dir, exist_ok=True)
+    path = lambda *parts: os.path.join(data_dir, *parts)
+
+    audit.LOG_FILE = path("audit.log")
+    alerts.ALERTS_FILE = path("alerts.csv")
+    config.ENV_FILE = path("environment.json")
+    config._cache, config._stamp = {}, None
+    baseline.BASELINE_FILE = path("baseline.json")
+    baseline.STATS_FILE = path("baseline_stats.json")
+    baseline._state = baseline.BaselineState(baseline.BASELINE_FILE)
+    baseline._stats = baseline.StatsState(baseline.STATS_FILE)
+    coordinator.LOCK_FILE = path(".collector.lock")
+    coordinator.STATE_FILE = path("collector.json")
+    dedupe.STATE_FILE = path("alert_state.json")
+    dedupe._limiter = dedupe.AlertLimiter(dedupe.STATE_FILE)
+    devicestore.DEVICES_FILE = scanner.DEVICES_FILE = path("devices.json")
+    devicestore.JOURNAL_FILE = path("devices.journal")
+    devicestore._store = devicestore.DeviceStore(devicestore.DEVICES_FILE, devicestore.JOURNAL_FILE)
+    exporter.DATA_DIR = data_dir
+    health.DATA_DIR = data_dir
+    health.LOG_FILE = audit.LOG_FILE
+    oui.TABLE_FILE = path("oui.bin")
+    oui._table = None
+    outbox.OUTBOX_DIR = path("outbox")
+    outbox.FAILED_DIR = path("outbox", "failed")
+    outbox._pending = None
+    presence.PRESENCE_FILE = path("presence.bin")
+    presence._store = presence.PresenceStore(presence.PRESENCE_FILE)
+    segments.ARCHIVE_DIR = path("archive")
+    segments.MANIFEST_FILE = path("archive", "manifest.json")
+    segments._manifest = segments.Manifest(segments.MANIFEST_FILE)
+    series.SERIES_DIR = path("history")
+    series.LEGACY_CSV = path("history.csv")
+    series._store = None
+    timeline.AUDIT_FILE = audit.LOG_FILE
+    timeline.ALERTS_FILE = alerts.ALERTS_FILE
+    timeline._index = timeline.TimelineIndex()
+    history._index = history.HistoryIndex()
+    connections._snapshot = None
+    fingerprint.invalidate()
+    return data_dir
+
+# --- psutil ---
+
+Addr = namedtuple("addr", ["ip", "port"])
+Conn = namedtuple("sconn", ["fd", "family", "type", "laddr", "raddr", "status", "pid"])
+
+def make_connections(count, seed=6):
+    """A psutil.net_connections()-shaped list: listeners, web, DNS and idle sockets."""
+    rng = random.Random(seed)
+    conns = []
+    for i in range(count):
+        roll = rng.random()
+        laddr = Addr("10.0.0.5", 30000 + i % 30000)
+        if roll < 0.05:
+            conns.append(Conn(-1, socket.AF_INET, socket.SOCK_STREAM, Addr("0.0.0.0", rng.choice((22, 80, 443, 8000))), (), "LISTEN", None))
+        elif roll < 0.15:
+            conns.append(Conn(-1, socket.AF_INET, socket.SOCK_DGRAM, laddr, Addr("10.0.0.1", 53), "NONE", None))
+        else:
+            remote = Addr(f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}", rng.choice((443, 443, 80, 993, 5222)))
+            conns.append(Conn(-1, socket.AF_INET, socket.SOCK_STREAM, laddr, remote, rng.choice(("ESTABLISHED", "ESTABLISHED", "TIME_WAIT")), None))
+    return conns
+
+class Stubs:
+    """
+    Install the stand-ins; restore the real functions on exit.
+    arp_text: what `arp -a` prints. conns: what psutil.net_connections returns.
+    """
+
+    def __init__(self, arp_text="", conns=(), gateway="10.0.0.1"):
+        self.arp_text = arp_text
+        self.conns = list(conns)
+        self.gateway = gateway
+        self.saved = []
+
+    def _patch(self, owner, name, value):
+        self.saved.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def check_output(self, args, **kwargs):
+        command = args if isinstance(args, str) else " ".join(args)
+        if command.startswith("arp"):
+            return self.arp_text.encode()
+        if command.startswith("ipconfig"):
+            return f"   Default Gateway . . . . . . . . . : {self.gateway}\n".encode()
+        raise subprocess.CalledProcessError(1, args)
+
+    def __enter__(self):
+        self._patch(connections.psutil, "net_connections", lambda kind="inet": self.conns)
+        self._patch(neighbors.subprocess, "check_output", self.check_output)
+        # Force the subprocess paths: neighbor source "arp", no /proc/net/route
+        self._patch(fingerprint.FingerprintProvider, "_read_route", lambda provider: None)
+        self._patch(neighbors, "get_neighbors", neighbors.read_arp_command)
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, value in reversed(self.saved):
+            setattr(owner, name, value)
+        self.saved = []
@@ -0,0 +1,239 @@
+"""
+Benchmark suite: every hot path and endpoint against synthetic data at a
+chosen scale, with psutil and subprocess stubbed out. Prints a table and
+writes JSON results that can be compared across commits.
+
+    python -m benchmarks.suite [--scale small|medium|large] [--lines N] [--devices N]
+                               [--repeat N] [--only name,...] [--out results.json]
+                               [--compare previous.json]
+
+Scales (log lines / devices): small 10k / 100, medium 1M / 10k,
+large 10M / 100k. --lines (1k-10M) and --devices (10-100k) override.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+import httpx
+try:
+    import resource # Unix only
+except ImportError:
+    resource = None
+from benchmarks import stubs
+from benchmarks import synth
+from backend import analyzer
+from backend import audit
+from backend import baseline
+from backend import devicestore
+from backend import exporter
+from backend import scanner
+from backend import series
+from backend import timeline
+from backend.main import app
+
+SCALES = {
+    "small": {"lines": 10000, "devices": 100},
+    "medium": {"lines": 1000000, "devices": 10000},
+    "large": {"lines": 10000000, "devices": 100000}
+}
+
+# Connections in the stubbed psutil table
+CONNECTIONS = 2000
+
+ENDPOINTS = [
+    "/health",
+    "/devices",
+    "/devices?status=active&limit=100",
+    "/timeline?limit=100",
+    "/history",
+    "/dashboard",
+    "/connections",
+    "/baseline/stats",
+    "/export/audit?format=csv&compress=gzip&since={day_ago}",
+    "/export/history?format=ndjson&since={day_ago}"
+]
+
+def timed(fn, repeat, setup=None, warmup=True):
+    """Milliseconds per run over `repeat` runs (after one warm-up unless it is a one-shot)."""
+    if warmup:
+        if setup:
+            setup()
+        fn()
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    runs.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(runs[0], 3),
+        "median_ms": round(statistics.median(runs), 3),
+        "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(runs), 3)
+    }
+
+def drain(response) -> int:
+    """Consume an export response like a client would. Returns bytes."""
+    if hasattr(response, "path"): # FileResponse
+        return os.path.getsize(response.path)
+
+    async def consume():
+        size = 0
+        async for chunk in response.body_iterator:
+            size += len(chunk)
+        return size
+    return asyncio.run(consume())
+
+def generate(data_dir, lines, devices):
+    """Synthetic data/ at the requested scale. Returns the neighbor entries present now."""
+    start = time.perf_counter()
+    synth.audit_log(os.path.join(data_dir, "audit.log"), lines)
+    synth.alerts_csv(os.path.join(data_dir, "alerts.csv"), max(lines // 10, 100))
+    synth.history_csv(os.path.join(data_dir, "history.csv"), lines)
+    known = synth.devices_json(os.path.join(data_dir, "devices.json"), devices)
+    with open(os.path.join(data_dir, "environment.json"), "w") as f:
+        json.dump({"connections_ttl": 0, "neighbor_source": "arp"}, f)
+    present = [{"ip": d["ip"], "mac": d["mac"]} for d in known if d["status"] == "active"]
+    print(f"generated {lines} log lines, {devices} devices in {time.perf_counter() - start:.1f} s ({data_dir})")
+    return present
+
+def cases(repeat):
+    """(name, fn, setup, repeat) for every path; repeat None = one cold run."""
+    day_ago = time.time() - 86400
+
+    def new_timeline():
+        timeline._index = timeline.TimelineIndex()
+
+    def new_device_store():
+        devicestore._store = devicestore.DeviceStore(devicestore.DEVICES_FILE, devicestore.JOURNAL_FILE)
+
+    def export(name, **options):
+        return lambda: drain(exporter.get_file(name, exporter.ExportOptions(**options)))
+
+    return [
+        ("history.import_csv", lambda: series.get_store(), None, None),
+        ("timeline.get_events.cold", lambda: timeline.get_events(100), new_timeline, repeat),
+        ("timeline.get_events.warm", lambda: timeline.get_events(100), None, repeat),
+        ("devicestore.load", lambda: devicestore.get_store().all(), new_device_store, repeat),
+        ("scanner.scan_devices", scanner.scan_devices, None, repeat),
+        ("baseline.update", lambda: baseline.update(scanner.load_devices()), None, repeat),
+        ("analyzer.analyze", analyzer.analyze, None, repeat),
+        ("exporter.audit.raw", export("audit"), None, max(1, repeat // 4)),
+        ("exporter.audit.csv_gzip_day", export("audit", since=day_ago, format="csv", compress="gzip"), None, repeat),
+        ("exporter.alerts.ndjson", export("alerts", format="ndjson"), None, max(1, repeat // 4)),
+        ("exporter.history.csv", export("history"), None, max(1, repeat // 4)),
+        ("exporter.devices", export("devices"), None, repeat)
+    ]
+
+def endpoint_cases(repeat):
+    """Endpoints through an in-process ASGI client (no sockets, no lifespan/scheduler)."""
+    day_ago = int(time.time() - 86400)
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    def get(url):
+        def fn():
+            response = loop.run_until_complete(client.get(url))
+            if response.status_code >= 400:
+                raise RuntimeError(f"{url}: HTTP {response.status_code}")
+            return len(response.content)
+        return fn
+
+    out = [(f"GET {url.format(day_ago='...')}", get(url.format(day_ago=day_ago)), None, repeat) for url in ENDPOINTS]
+    return out, lambda: (loop.run_until_complete(client.aclose()), loop.close())
+
+def _commit():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nvs {previous.get('commit')} ({previous_path}):")
+    for name, result in results.items():
+        old = previous.get("results", {}).get(name)
+        if not old or not old.get("median_ms"):
+            continue
+        ratio = result["median_ms"] / old["median_ms"]
+        print(f"  {name:<44} {old['median_ms']:10.2f} -> {result['median_ms']:10.2f} ms  x{ratio:.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SentinelMesh benchmark suite")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--lines", type=int, help="audit.log / history lines (1k-10M)")
+    parser.add_argument("--devices", type=int, help="known devices (10-100k)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--only", help="comma list of name prefixes")
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data dir")
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    if args.lines:
+        scale["lines"] = min(max(args.lines, 1000), 10000000)
+    if args.devices:
+        scale["devices"] = min(max(args.devices, 10), 100000)
+
+    data_dir = tempfile.mkdtemp(prefix="sentinelmesh-bench-")
+    stubs.use_data_dir(data_dir)
+    present = generate(data_dir, scale["lines"], scale["devices"])
+    only = [p.strip() for p in args.only.split(",")] if args.only else None
+
+    results = {}
+    with stubs.Stubs(arp_text=synth.arp_output(present), conns=stubs.make_connections(CONNECTIONS)):
+        endpoints, close = endpoint_cases(args.repeat)
+        try:
+            for name, fn, setup, repeat in cases(args.repeat) + endpoints:
+                if only and not any(name.startswith(p) or name.startswith(f"GET {p}") for p in only):
+                    continue
+                try:
+                    results[name] = timed(fn, repeat or 1, setup, warmup=repeat is not None)
+                except Exception as e:
+                    results[name] = {"error": str(e)}
+                row = results[name]
+                if "error" in row:
+                    print(f"  {name:<44} ERROR {row['error']}")
+                else:
+                    print(f"  {name:<44} median {row['median_ms']:10.2f} ms  p95 {row['p95_ms']:10.2f} ms  ({row['runs']} runs)")
+        finally:
+            close()
+            audit.close()
+
+    report = {
+        "suite": "sentinelmesh",
+        "version": 1,
+        "commit": _commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": dict(scale, name=args.scale, connections=CONNECTIONS),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "results": results
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results: {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    if not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
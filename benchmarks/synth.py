@@ -0,0 +1,161 @@
+"""
+Synthetic data at configurable scale, in the formats the backend reads:
+audit.log, alerts.csv, history.csv (legacy) or history/*.seg, devices.json
+and neighbor table / `arp -a` output.
+
+Everything is deterministic for a given seed and written in chunks, so
+10M-line files are generated with flat memory.
+"""
+import os
+import json
+import random
+import datetime
+from backend import oui
+from backend import series
+
+CHUNK_LINES = 50000
+
+# Realistic mix of what audit.log and alerts.csv contain
+AUDIT_MESSAGES = [
+    ("SCANNER", "Device scan started"),
+    ("SCANNER", "Device scan complete. Found {n} active devices ({c} changed)."),
+    ("SCANNER", "Device status changed: {c} active -> idle"),
+    ("SYSTEM", "Collection scheduler started"),
+    ("SYSTEM", "Log segment sealed: audit"),
+    ("USER", "Timeline accessed (filter: None)"),
+    ("USER", "Data exported: history"),
+    ("INFO", "Health self-check initiated"),
+    ("ERROR", "ARP scan failed: [Errno 1] Operation not permitted"),
+    ("ALERT", "High Risk (Warning): Score: {n}")
+]
+ALERT_TYPES = [
+    ("High Risk", "Warning", "Connection count {n} is {c}x the learned average"),
+    ("High Risk", "Critical", "DNS queries {n} far above baseline"),
+    ("New Device", "Info", "Unknown device 10.0.{c}.{n} joined"),
+    ("suppressed", "Info", "{n} suppressed: High Risk (Warning)")
+]
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+def _times(count, start, span):
+    """count evenly spread, increasing timestamps over [start, start + span)."""
+    step = span / max(count, 1)
+    return (start + i * step for i in range(count))
+
+def _write_lines(path, lines, header=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if header:
+            f.write(header)
+        buf = []
+        for line in lines:
+            buf.append(line)
+            if len(buf) >= CHUNK_LINES:
+                f.write("".join(buf))
+                buf = []
+        f.write("".join(buf))
+    return path
+
+def audit_log(path, lines, start=None, span=30 * 86400, seed=1):
+    """audit.log: '[ISO] [LEVEL] message' lines, oldest first."""
+    rng = random.Random(seed)
+    start = start if start is not None else _now() - span
+
+    def generate():
+        for ts in _times(lines, start, span):
+            level, message = rng.choice(AUDIT_MESSAGES)
+            yield f"[{_iso(ts)}] [{level}] {message.format(n=rng.randint(1, 500), c=rng.randint(0, 20))}\n"
+    return _write_lines(path, generate())
+
+def alerts_csv(path, rows, start=None, span=30 * 86400, seed=2):
+    """alerts.csv: header + 'ISO,type,severity,message' rows, oldest first."""
+    rng = random.Random(seed)
+    start = start if start is not None else _now() - span
+
+    def generate():
+        for ts in _times(rows, start, span):
+            kind, severity, message = rng.choice(ALERT_TYPES)
+            yield f"{_iso(ts)},{kind},{severity},{message.format(n=rng.randint(1, 500), c=rng.randint(2, 9))}\n"
+    return _write_lines(path, generate(), header="timestamp,type,severity,message\n")
+
+def _samples(count, start, span, seed):
+    rng = random.Random(seed)
+    total = 40
+    for ts in _times(count, start, span):
+        total = max(0, total + rng.randint(-3, 3))
+        dns = rng.randint(0, 6)
+        score = min(100, max(0, int(rng.gauss(15, 12))))
+        yield ts, total, dns, score, 1 if score >= 50 else 0
+
+def history_csv(path, rows, start=None, span=None, seed=3):
+    """Legacy history.csv (imported into the binary store on first use). 10s samples by default."""
+    span = span or rows * 10.0
+    start = start if start is not None else _now() - span
+    lines = (f"{_iso(ts)},{total},{dns},{score},{anomalies}\n" for ts, total, dns, score, anomalies in _samples(rows, start, span, seed))
+    return _write_lines(path, lines, header=series.CSV_HEADER)
+
+def history_store(root, rows, start=None, span=None, seed=3):
+    """history/*.seg written directly (what the analyzer would have appended)."""
+    span = span or rows * 10.0
+    start = start if start is not None else _now() - span
+    store = series.SeriesStore(root)
+    for sample in _samples(rows, start, span, seed):
+        store.append(*sample)
+    store.invalidate()
+    return store
+
+def _vendor_prefixes():
+    """MA-L prefixes from the bundled seed, so devices get realistic vendors."""
+    return [start >> 24 for start, _, _ in oui.read_registry(oui.SEED_FILE) if (start >> 24) != 0x70B3D5]
+
+def neighbors(count, seed=4):
+    """[{'ip', 'mac'}] spread over 10.0.0.0/8 with seed-vendor MACs."""
+    rng = random.Random(seed)
+    prefixes = _vendor_prefixes()
+    out = []
+    for i in range(1, count + 1):
+        prefix = rng.choice(prefixes) if rng.random() < 0.9 else 0x020000 | rng.getrandbits(16)
+        mac = ((prefix << 24) | rng.getrandbits(24)).to_bytes(6, "big").hex(":").upper()
+        out.append({"ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", "mac": mac})
+    return out
+
+def devices_json(path, count, present=None, seed=5):
+    """
+    devices.json with `count` known devices. The first `present` (default
+    10%) were seen just now, the rest over the last 30 days.
+    """
+    rng = random.Random(seed)
+    present = count // 10 if present is None else present
+    now = _now()
+    devices = []
+    for i, entry in enumerate(neighbors(count, seed)):
+        if i < present:
+            last = now - rng.uniform(0, 60)
+        else:
+            last = now - rng.uniform(600, 30 * 86400)
+        age = now - last
+        status = "active" if age < 300 else ("idle" if age < 7 * 86400 else "archived")
+        devices.append(dict(entry, first_seen=_iso(last - rng.uniform(0, 90 * 86400)), last_seen=_iso(last), status=status))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(devices, f, indent=2)
+    return devices
+
+def arp_output(entries, style="unix"):
+    """`arp -a` text for neighbor entries ('unix' or 'windows' layout)."""
+    if style == "windows":
+        lines = ["Interface: 10.0.0.5 --- 0x10", "  Internet Address      Physical Address      Type"]
+        lines += [f"  {e['ip']:<21} {e['mac'].replace(':', '-').lower()}     dynamic" for e in entries]
+    else:
+        lines = [f"? ({e['ip']}) at {e['mac'].lower()} [ether] on eth0" for e in entries]
+    return "\n".join(lines) + "\n"
+
+def proc_arp(entries):
+    """/proc/net/arp text."""
+    lines = ["IP address       HW type     Flags       HW address            Mask     Device"]
+    lines += [f"{e['ip']:<16} 0x1         0x2         {e['mac'].lower()}     *        eth0" for e in entries]
+    return "\n".join(lines) + "\n"
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).timestamp()
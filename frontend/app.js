@@ -16,42 +16,112 @@ async function safeFetch(url, options = {}) {
 
 // State
 let charts = { risk: null, conn: null };
+let pollTimer = null;
+let live = { devices: new Map(), timeline: [], history: [] };
 
 // Init
 document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('save-env-btn').addEventListener('click', saveEnvironmentName);
-    fetchData();
-    setInterval(fetchData, 10000); // 10s poll
+    startStream();
 });
 
-async function fetchData() {
-    try {
-        // Use Promise.all checking or just sequential - keeping sequential as per original structure,
-        // but failures in one shouldn't crash all if possible, or maybe catch all?
-        // User said: "If fetch fails: show text: 'Backend reachable but no data yet'"
-        // If I limit the catch block:
+// Live updates: one SSE connection, falls back to 10s polling
+function startStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
 
-        await fetchHealth();
-        await fetchDevices();
-        await fetchTimeline();
-        await fetchHistory();
-        await fetchEnvironment();
+    const es = new EventSource(`${API_URL}/stream`);
+    let opened = false;
 
-        // If we reach here, at least one success? 
-        // Actually fetchHealth throws if safeFetch fails.
+    es.onopen = () => {
+        opened = true;
+        stopPolling();
+    };
+    es.onerror = () => {
+        if (!opened) {
+            // Stream not supported by this backend: poll instead
+            es.close();
+            startPolling();
+        } else {
+            updateBanner("Live stream interrupted, reconnecting...", "warning");
+        }
+    };
 
+    es.addEventListener('snapshot', e => {
+        const snap = JSON.parse(e.data);
+        renderHealth(snap.health);
+        live.devices = new Map(snap.devices.map(d => [d.ip, d]));
+        renderDevices([...live.devices.values()]);
+        live.timeline = snap.timeline;
+        renderTimeline(live.timeline);
+        live.history = historyPoints(snap.history);
+        updateCharts(live.history);
+        renderEnvironment(snap.environment);
+    });
+    es.addEventListener('risk', e => renderHealth(JSON.parse(e.data)));
+    es.addEventListener('devices', e => {
+        const delta = JSON.parse(e.data);
+        delta.removed.forEach(ip => live.devices.delete(ip));
+        delta.changed.forEach(d => live.devices.set(d.ip, d));
+        renderDevices([...live.devices.values()]);
+    });
+    es.addEventListener('timeline', e => {
+        live.timeline = JSON.parse(e.data).concat(live.timeline).slice(0, 20);
+        renderTimeline(live.timeline);
+    });
+    es.addEventListener('history', e => {
+        live.history = live.history.concat(JSON.parse(e.data)).slice(-20);
+        updateCharts(live.history);
+    });
+    es.addEventListener('environment', e => renderEnvironment(JSON.parse(e.data)));
+}
+
+function startPolling() {
+    if (pollTimer) return;
+    fetchData();
+    pollTimer = setInterval(fetchData, 10000); // 10s poll
+}
+
+function stopPolling() {
+    if (!pollTimer) return;
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
+// Polling fallback: one conditional request per poll, sections refetched only when their version moved
+let dashboardTag = null;
+let seenVersions = {};
+
+async function fetchData() {
+    try {
+        const headers = dashboardTag ? { 'If-None-Match': dashboardTag } : {};
+        const res = await safeFetch(`${API_URL}/dashboard?sections=versions`, { headers });
+        if (res.status === 304) return; // Nothing changed
+        if (!res.ok) throw new Error(`Dashboard returned ${res.status}`);
+        const tag = res.headers.get('ETag');
+        const { versions } = await res.json();
+
+        const stale = Object.keys(versions).filter(s => versions[s] !== seenVersions[s]);
+        if (stale.length > 0) {
+            const snap = await (await safeFetch(`${API_URL}/dashboard?sections=${stale.join(',')}`)).json();
+            if (snap.health) renderHealth(snap.health);
+            if (snap.devices) renderDevices(snap.devices);
+            if (snap.timeline) renderTimeline(snap.timeline);
+            if (snap.history) updateCharts(historyPoints(snap.history));
+            if (snap.environment) renderEnvironment(snap.environment);
+            stale.forEach(s => { seenVersions[s] = snap.versions[s]; });
+        }
+        dashboardTag = tag;
     } catch (e) {
         updateBanner("Backend reachable but no data yet", "warning"); // User requested specific text
         console.error(e);
-        // Ensure no eternal loading state if any
     }
 }
 
 // 1. Health & Risk
-async function fetchHealth() {
-    const res = await safeFetch(`${API_URL}/`);
-    const data = await res.json();
-
+function renderHealth(data) {
     // Header
     const mode = data.mode ? data.mode.toUpperCase() : "UNKNOWN";
     document.getElementById('env-mode').textContent = mode;
@@ -92,10 +162,7 @@ async function fetchHealth() {
 }
 
 // 2. Devices
-async function fetchDevices() {
-    const res = await safeFetch(`${API_URL}/devices`);
-    const devices = await res.json();
-
+function renderDevices(devices) {
     // Update count
     document.getElementById('count-devices').textContent = devices.length;
 
@@ -145,32 +212,33 @@ async function fetchDevices() {
 async function fetchEnvironment() {
     try {
         const res = await safeFetch(`${API_URL}/environment`);
-        const env = await res.json();
-
-        // Update Label
-        const label = document.getElementById('env-mode');
-        // If we have a name, show it. Else show "Unnamed"
-        if (env.name) {
-            label.textContent = env.name.toUpperCase();
-            label.classList.add('text-green');
-        } else {
-            label.textContent = "UNNAMED ENVIRONMENT";
-            label.classList.remove('text-green');
-        }
-
-        // Check user prompt
-        const modal = document.getElementById('env-modal');
-        if (env.needs_name && !localStorage.getItem('env_prompt_dismissed')) {
-            modal.classList.remove('hidden');
-        } else {
-            modal.classList.add('hidden');
-        }
-
+        renderEnvironment(await res.json());
     } catch (e) {
         console.error("Env fetch failed", e);
     }
 }
 
+function renderEnvironment(env) {
+    // Update Label
+    const label = document.getElementById('env-mode');
+    // If we have a name, show it. Else show "Unnamed"
+    if (env.name) {
+        label.textContent = env.name.toUpperCase();
+        label.classList.add('text-green');
+    } else {
+        label.textContent = "UNNAMED ENVIRONMENT";
+        label.classList.remove('text-green');
+    }
+
+    // Check user prompt
+    const modal = document.getElementById('env-modal');
+    if (env.needs_name && !localStorage.getItem('env_prompt_dismissed')) {
+        modal.classList.remove('hidden');
+    } else {
+        modal.classList.add('hidden');
+    }
+}
+
 async function saveEnvironmentName() {
     const input = document.getElementById('env-name-input');
     const name = input.value.trim();
@@ -193,15 +261,8 @@ async function saveEnvironmentName() {
     }
 }
 
-// 3. Timeline
-async function fetchTimeline() {
-    const res = await safeFetch(`${API_URL}/timeline?source=audit`); // Get all? Timeline endpoint does filtering
-    // Actually main.py endpoint takes ?source param but default is None (all).
-    // Let's verify backend... yes, calling without param gets all but limit 100.
-
-    const resAll = await safeFetch(`${API_URL}/timeline`); // Get unified
-    const events = await resAll.json();
-
+// 3. Timeline (unified, newest first)
+function renderTimeline(events) {
     const container = document.getElementById('timeline-feed');
     container.innerHTML = '';
 
@@ -223,24 +284,14 @@ async function fetchTimeline() {
     }
 }
 
-// 4. History (CSV Parsing for Charts)
-async function fetchHistory() {
-    const res = await safeFetch(`${API_URL}/export/history`);
-    if (!res.ok) return;
-
-    const text = await res.text();
-    const rows = text.trim().split('\n').slice(1); // skip header
-    const data = rows.map(r => {
-        const cols = r.split(',');
-        return {
-            time: cols[0],
-            total: parseInt(cols[1]),
-            dns: parseInt(cols[2]),
-            risk: parseInt(cols[3])
-        };
-    }).slice(-20); // Last 20 points
-
-    updateCharts(data);
+// 4. History: 20 buckets of 10s (one analysis tick each), aggregated by the backend
+function historyPoints(body) {
+    return body.points.map(p => ({
+        time: p.time,
+        total: Math.round(p.total.avg),
+        dns: Math.round(p.dns.avg),
+        risk: p.risk.max
+    }));
 }
 
 function updateCharts(data) {